@@ -1,7 +1,26 @@
-from geopy.distance import geodesic
+from functools import lru_cache
+from typing import TYPE_CHECKING
 
-from geopy.geocoders import Nominatim
 from .api_exceptions import CoordsFetchError
+from .async_client import get_async_client
+from cheapdrive_website.metrics import track_api_call
+
+if TYPE_CHECKING:
+    from geopy.geocoders import Nominatim
+
+NOMINATIM_URL = "https://nominatim.openstreetmap.org"
+
+
+@lru_cache(maxsize=None)
+def get_geolocator() -> "Nominatim":
+    """
+    Returns the process-wide Nominatim geocoder, built on first use (or by the startup warm-up).
+    geopy is imported here, as only the synchronous geocoding paths use it.
+    """
+    from geopy.geocoders import Nominatim
+
+    return Nominatim(user_agent="cheapdrive")
+
 
 def get_coordinates(address: str, param: str = None) -> tuple:
     """
@@ -18,10 +37,41 @@ def get_coordinates(address: str, param: str = None) -> tuple:
         CoordsFetchError: If the coordinates cannot be retrieved.
     """
 
-    geolocator = Nominatim(user_agent="cheapdrive")
-    location = geolocator.geocode(address)
+    geolocator = get_geolocator()
+    with track_api_call("nominatim"):
+        location = geolocator.geocode(address)
     if location:
         # Return in (longitude, latitude) order for compatibility with GIS Points.
         return location.longitude, location.latitude
     else:
         raise CoordsFetchError(param or address)
+
+
+async def get_coordinates_async(address: str, param: str = None) -> tuple:
+    """
+    Async variant of get_coordinates querying the Nominatim search endpoint on the client of the current async_client_scope.
+
+    Args:
+        address (str): The address to geocode.
+        param (str, optional): An optional parameter used in error messages.
+
+    Returns:
+        tuple: A tuple (longitude, latitude) if the address is found.
+
+    Raises:
+        CoordsFetchError: If the coordinates cannot be retrieved.
+    """
+    try:
+        with track_api_call("nominatim"):
+            response = await get_async_client().get(
+                f"{NOMINATIM_URL}/search", params={"q": address, "format": "json", "limit": 1}
+            )
+        response.raise_for_status()
+        results = response.json()
+    except Exception:
+        raise CoordsFetchError(param or address)
+    if results:
+        # Return in (longitude, latitude) order for compatibility with GIS Points.
+        return float(results[0]["lon"]), float(results[0]["lat"])
+    else:
+        raise CoordsFetchError(param or address)
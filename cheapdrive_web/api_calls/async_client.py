@@ -0,0 +1,47 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
+
+import httpx
+
+# The client of the innermost async_client_scope. An httpx.AsyncClient cannot outlive its event
+# loop, and sync callers using async_to_sync run on a fresh loop per call, so every client is
+# created and closed by the async code that uses it.
+_client: ContextVar[Optional[httpx.AsyncClient]] = ContextVar("async_client", default=None)
+
+
+@asynccontextmanager
+async def async_client_scope() -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Opens an httpx.AsyncClient for the duration of the block and closes it (and its pooled
+    connections) on exit. The async API helpers called within the block share it.
+
+    Yields:
+        httpx.AsyncClient: A client with connection pooling.
+    """
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(10.0),
+        headers={"User-Agent": "cheapdrive"},
+        limits=httpx.Limits(max_connections=50, max_keepalive_connections=10),
+    ) as client:
+        token = _client.set(client)
+        try:
+            yield client
+        finally:
+            _client.reset(token)
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Returns the httpx.AsyncClient of the current async_client_scope.
+
+    Returns:
+        httpx.AsyncClient: The client used by all async API helpers.
+
+    Raises:
+        RuntimeError: If called outside of an async_client_scope.
+    """
+    client = _client.get()
+    if client is None:
+        raise RuntimeError("Async API helpers must run within async_client_scope().")
+    return client
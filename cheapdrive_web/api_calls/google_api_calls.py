@@ -2,8 +2,59 @@
 import googlemaps 
 import os
 from .api_exceptions import AddressError
+from .async_client import get_async_client
+from cheapdrive_website.metrics import track_api_call
 import requests
 
+DISTANCE_MATRIX_URL = "https://maps.googleapis.com/maps/api/distancematrix/json"
+
+
+def _get_api_key() -> str:
+    """
+    Returns the Google API key from the environment.
+
+    Raises:
+        ValueError: If the GOOGLE_API_KEY environment variable is not set.
+    """
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY environment variable not set.")
+    return api_key
+
+
+def _format_location(location) -> str:
+    """
+    Formats an address or a (latitude, longitude) pair the way the Distance Matrix API expects it.
+    """
+    if isinstance(location, (tuple, list)):
+        return f"{location[0]},{location[1]}"
+    return str(location)
+
+
+async def _distance_matrix_async(origin, destination) -> dict:
+    """
+    Calls the Google Maps Distance Matrix API for one origin-destination pair on the client of the current async_client_scope.
+
+    Raises:
+        AddressError: If the request fails or the API rejects it.
+    """
+    params = {
+        "origins": _format_location(origin),
+        "destinations": _format_location(destination),
+        "mode": "driving",
+        "key": _get_api_key(),
+    }
+    try:
+        with track_api_call("google_distance_matrix"):
+            response = await get_async_client().get(DISTANCE_MATRIX_URL, params=params)
+        response.raise_for_status()
+        result = response.json()
+    except Exception as e:
+        raise AddressError(f"Google Maps API request failed: {e}")
+    if result.get("status") != "OK":
+        raise AddressError(f"Google Maps API request failed: {result.get('status')}")
+    return result
+
 def address_validation_and_distance(origin: str, destination: str) -> tuple:
     """
     Validates the provided origin and destination addresses using the Google Maps Distance Matrix API 
@@ -20,13 +71,38 @@ def address_validation_and_distance(origin: str, destination: str) -> tuple:
         ValueError: If the GOOGLE_API_KEY environment variable is not set.
         AddressError: If the API returns an error for the addresses.
     """
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set.")
-    
-    gmaps = googlemaps.Client(key=api_key)
-    result = gmaps.distance_matrix(origins=origin, destinations=destination, mode="driving")
-    
+    gmaps = googlemaps.Client(key=_get_api_key())
+    with track_api_call("google_distance_matrix"):
+        result = gmaps.distance_matrix(origins=origin, destinations=destination, mode="driving")
+    return _parse_validation_result(result)
+
+
+async def address_validation_and_distance_async(origin: str, destination: str) -> tuple:
+    """
+    Async variant of address_validation_and_distance using the client of the current async_client_scope.
+
+    Args:
+        origin (str): The starting address.
+        destination (str): The destination address.
+
+    Returns:
+        tuple: A tuple (distance_km, duration_min, corrected_origin, corrected_destination).
+
+    Raises:
+        ValueError: If the GOOGLE_API_KEY environment variable is not set.
+        AddressError: If the API returns an error for the addresses.
+    """
+    result = await _distance_matrix_async(origin, destination)
+    return _parse_validation_result(result)
+
+
+def _parse_validation_result(result: dict) -> tuple:
+    """
+    Extracts distance, duration and corrected addresses from a Distance Matrix response.
+
+    Raises:
+        AddressError: If the response reports invalid addresses or no route.
+    """
     # Extract the corrected addresses from the API response.
     corrected_origin = result.get("origin_addresses", [None])[0]
     corrected_destination = result.get("destination_addresses", [None])[0]
@@ -69,17 +145,43 @@ def distance_gmaps(origin: str, destination: str) -> tuple:
         ValueError: If the GOOGLE_API_KEY environment variable is not set.
         AddressError: If no valid route is found between the addresses.
     """
-    api_key = os.environ.get("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY environment variable not set.")
-
-    gmaps = googlemaps.Client(key=api_key)
+    gmaps = googlemaps.Client(key=_get_api_key())
     
     try:
-        result = gmaps.distance_matrix(origins=origin, destinations=destination, mode="driving")
+        with track_api_call("google_distance_matrix"):
+            result = gmaps.distance_matrix(origins=origin, destinations=destination, mode="driving")
     except Exception as e:
         raise AddressError(f"Google Maps API request failed: {e}")
 
+    return _parse_distance_result(result)
+
+
+async def distance_gmaps_async(origin, destination) -> tuple:
+    """
+    Async variant of distance_gmaps using the client of the current async_client_scope.
+
+    Args:
+        origin: The starting address or a (latitude, longitude) pair.
+        destination: The destination address or a (latitude, longitude) pair.
+
+    Returns:
+        tuple: A tuple (distance_km, duration_min).
+
+    Raises:
+        ValueError: If the GOOGLE_API_KEY environment variable is not set.
+        AddressError: If no valid route is found between the addresses.
+    """
+    result = await _distance_matrix_async(origin, destination)
+    return _parse_distance_result(result)
+
+
+def _parse_distance_result(result: dict) -> tuple:
+    """
+    Extracts distance and duration from a Distance Matrix response.
+
+    Raises:
+        AddressError: If the response is malformed or reports no route.
+    """
     # Validate API response structure
     if "rows" not in result or not result["rows"] or "elements" not in result["rows"][0] or not result["rows"][0]["elements"]:
         raise AddressError("Invalid API response: Missing distance data.")
@@ -101,3 +203,30 @@ def distance_gmaps(origin: str, destination: str) -> tuple:
 
     raise AddressError(f"Unable to retrieve distance. API status: {status}")
 
+
+def route_polyline(origin, destination) -> list:
+    """
+    Retrieves the simplified driving route between two locations using the Google Maps Directions API.
+
+    Args:
+        origin: The starting address or a (latitude, longitude) pair.
+        destination: The destination address or a (latitude, longitude) pair.
+
+    Returns:
+        list: The route vertices as (latitude, longitude) pairs.
+
+    Raises:
+        ValueError: If the GOOGLE_API_KEY environment variable is not set.
+        AddressError: If the request fails or no route is found.
+    """
+    gmaps = googlemaps.Client(key=_get_api_key())
+    try:
+        with track_api_call("google_directions"):
+            result = gmaps.directions(origin, destination, mode="driving")
+    except Exception as e:
+        raise AddressError(f"Google Maps API request failed: {e}")
+    if not result:
+        raise AddressError("No valid route found between the given addresses.")
+
+    points = googlemaps.convert.decode_polyline(result[0]["overview_polyline"]["points"])
+    return [(point["lat"], point["lng"]) for point in points]
@@ -1,11 +1,8 @@
-from multiprocessing import Value
-from geopy.geocoders import Nominatim
 from api_calls.api_exceptions import AddressError,CoordsFetchError
-import os
-import openrouteservice
 import requests
-from bs4 import BeautifulSoup
-from .api_calculations import get_coordinates
+from .api_calculations import get_coordinates, get_geolocator, NOMINATIM_URL
+from .async_client import get_async_client
+from cheapdrive_website.metrics import track_api_call
 
 from django.contrib.gis.geos import Point
 from entry.models import Station, StationPrices
@@ -34,7 +31,8 @@ def retrieve_stations_overpass(brand_names: list, limit: int = 50000) -> list:
     """
 
     try:
-        response = requests.post(overpass_url, data={"data": query}, timeout=10)
+        with track_api_call("overpass"):
+            response = requests.post(overpass_url, data={"data": query}, timeout=10)
         response.raise_for_status()  # Raises an exception for HTTP errors (e.g., 500, 404)
         data = response.json()
     except requests.RequestException as e:
@@ -75,8 +73,11 @@ def scrape_prices(brand_name: str) -> tuple:
     url = f"https://www.autocentrum.pl/stacje-paliw/{brand_name}"
     
     try:
-        response = requests.get(url, timeout=10)
+        with track_api_call("autocentrum"):
+            response = requests.get(url, timeout=10)
         response.raise_for_status()  # Ensure response is successful
+        # Imported here: only the price refresh parses HTML, web workers never do.
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, "html.parser")
     except requests.RequestException as e:
         raise ValueError(f"Failed to fetch fuel prices: {e}")
@@ -110,6 +111,7 @@ def scrape_prices(brand_name: str) -> tuple:
     return pb95_price, pb98_price, diesel_price, lpg_price
 
 import time
+import asyncio
 
 def get_address_from_coords(lat: float, lon: float, retries: int = 3) -> str:
     """
@@ -123,14 +125,41 @@ def get_address_from_coords(lat: float, lon: float, retries: int = 3) -> str:
     Returns:
         str: The address if found; otherwise, returns "Address not found".
     """
-    geolocator = Nominatim(user_agent="cheapdrive")
+    geolocator = get_geolocator()
     
     for attempt in range(retries):
         try:
-            location = geolocator.reverse((lat, lon), language="en")
+            with track_api_call("nominatim"):
+                location = geolocator.reverse((lat, lon), language="en")
             return location.address if location else "Address not found"
         except Exception as e:
             if attempt < retries - 1:
                 time.sleep(1)  # Wait before retrying
             else:
                 return f"Error retrieving address: {e}"
+
+
+async def get_address_from_coords_async(lat: float, lon: float, retries: int = 3) -> str:
+    """
+    Async variant of get_address_from_coords querying the Nominatim reverse endpoint on the client of the current async_client_scope.
+
+    Args:
+        lat (float): Latitude.
+        lon (float): Longitude.
+        retries (int): Number of retries if API fails due to rate limits.
+
+    Returns:
+        str: The address if found; otherwise, returns "Address not found".
+    """
+    params = {"lat": lat, "lon": lon, "format": "json", "accept-language": "en"}
+    for attempt in range(retries):
+        try:
+            with track_api_call("nominatim"):
+                response = await get_async_client().get(f"{NOMINATIM_URL}/reverse", params=params)
+            response.raise_for_status()
+            return response.json().get("display_name") or "Address not found"
+        except Exception as e:
+            if attempt < retries - 1:
+                await asyncio.sleep(1)  # Wait before retrying
+            else:
+                return f"Error retrieving address: {e}"
@@ -1,4 +1,8 @@
+from datetime import timedelta
+
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.utils import timezone
 from .models import Cache
 
 def get_from_cache(key: str):
@@ -42,3 +46,76 @@ def set_cache(key: str, value: dict, timeout: int = 3600):
         defaults={'value': value, 'timeout': timeout},
     )
     return cache_entry
+
+def delete_cache(key: str) -> None:
+    """
+    Remove a cache entry, if present.
+
+    Args:
+        key (str): The key of the cache entry to be removed.
+
+    Returns:
+        None
+    """
+
+    Cache.objects.filter(key=key).delete()
+
+def get_many_from_cache(keys: list) -> dict:
+    """
+    Retrieve several non-expired cache entries with a single query.
+
+    Args:
+        keys (list): The keys of the cache entries to be retrieved.
+
+    Returns:
+        dict: Maps each found, non-expired key to its cached value. Missing keys are omitted.
+    """
+
+    return {
+        entry.key: entry.value
+        for entry in Cache.objects.filter(key__in=keys)
+        if not entry.is_expired()
+    }
+
+def set_many_cache(values: dict, timeout: int = 3600) -> None:
+    """
+    Set several values in the cache with a single upsert query. Existing keys are updated.
+
+    Args:
+        values (dict): Maps cache keys to the values to be stored.
+        timeout (int, optional): The timeout for cache expiry in seconds. Defaults to 3600 seconds (1 hour).
+
+    Returns:
+        None
+    """
+
+    Cache.objects.bulk_create(
+        [Cache(key=key, value=value, timeout=timeout) for key, value in values.items()],
+        update_conflicts=True,
+        unique_fields=['key'],
+        update_fields=['value', 'timeout', 'updated_at'],
+    )
+
+def purge_expired_cache(prefix: str = "", batch_size: int = 1000) -> int:
+    """
+    Delete expired cache entries, optionally only those whose key starts with a prefix.
+    Entries are otherwise only deleted when read, so never-read keys would accumulate.
+    Rows are deleted in batches to keep each statement short.
+
+    Args:
+        prefix (str, optional): Only purge keys starting with this prefix. Defaults to all keys.
+        batch_size (int, optional): Rows deleted per statement. Defaults to 1000.
+
+    Returns:
+        int: The number of deleted entries.
+    """
+
+    expired = Cache.objects.filter(key__startswith=prefix).annotate(
+        expires_at=ExpressionWrapper(F('updated_at') + F('timeout') * timedelta(seconds=1), output_field=DateTimeField())
+    ).filter(expires_at__lt=timezone.now())
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Cache.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,69 @@
+"""
+Database connection lifecycle for threads started outside the request cycle.
+
+Django closes (or returns to the pool) the connections of request threads when a request ends,
+but a thread started by the planner keeps the connection it opened until the thread dies or the
+server drops it. Long-running work submitted to such threads is wrapped with `releasing_connections`;
+pools running many short tasks use `releasing_executor`, which releases each thread's connections
+once, when the pool shuts down.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+import threading
+from typing import Callable, Iterator
+
+from django.db import connections
+
+
+def release_thread_connections() -> None:
+    """
+    Closes the database connections the calling thread opened. Pooled connections go back to the pool.
+    """
+    connections.close_all()
+
+
+def releasing_connections(function: Callable) -> Callable:
+    """
+    Wraps a function run on a worker thread so that the thread's connections are released when it returns.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        finally:
+            release_thread_connections()
+    return wrapper
+
+
+@contextmanager
+def releasing_executor(max_workers: int, thread_name_prefix: str = "") -> Iterator[ThreadPoolExecutor]:
+    """
+    A ThreadPoolExecutor whose threads keep their connections across tasks and release them when
+    the block exits. Releasing after every task would make each task open a new connection unless
+    pooling (DB_POOL) is enabled.
+
+    Args:
+        max_workers: Number of worker threads.
+        thread_name_prefix: Name prefix of the worker threads.
+
+    Yields:
+        ThreadPoolExecutor: The executor; it is shut down (waiting for its tasks) on exit.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix) as executor:
+        try:
+            yield executor
+        finally:
+            # One release task per thread: each waits at the barrier until every thread has taken one.
+            barrier = threading.Barrier(max_workers)
+
+            def release() -> None:
+                try:
+                    barrier.wait(timeout=10)
+                except threading.BrokenBarrierError:
+                    # A thread may then release twice; harmless, and it cannot hang the shutdown.
+                    pass
+                release_thread_connections()
+
+            for future in [executor.submit(release) for _ in range(max_workers)]:
+                future.result()
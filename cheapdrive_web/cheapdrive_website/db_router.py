@@ -0,0 +1,99 @@
+"""
+Read replica routing.
+
+When a "replica" database is configured, station and price reads, and the trip history queries,
+go to it; everything else uses the primary. A session that has just written a trip is pinned to
+the primary for REPLICA_STICKY_SECONDS, so that it reads its own writes despite replication lag.
+"""
+from contextvars import ContextVar
+import time
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpRequest, HttpResponse
+
+REPLICA_ALIAS = "replica"
+# Models read from the replica.
+REPLICA_MODELS = {"entry.station", "entry.stationprices"}
+# Models whose writes pin the session to the primary.
+STICKY_WRITE_MODELS = {"refill.trip", "refill.tripnode"}
+STICKY_SESSION_KEY = "_db_primary_until"
+
+
+class _RoutingState:
+    """
+    Routing state of one request, shared with the threads it propagates its context to.
+    """
+
+    def __init__(self, pinned: bool) -> None:
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state: ContextVar[Optional[_RoutingState]] = ContextVar("db_routing_state", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+def read_alias() -> str:
+    """
+    Returns the database alias read-only queries should use in the current context.
+    """
+    state = _state.get()
+    if not replica_configured() or (state is not None and state.pinned):
+        return DEFAULT_DB_ALIAS
+    return REPLICA_ALIAS
+
+
+class ReplicaRouter:
+    """
+    Sends REPLICA_MODELS reads to read_alias(); writes and other models use the primary.
+    """
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        if model._meta.label_lower in REPLICA_MODELS:
+            return read_alias()
+        return None
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        state = _state.get()
+        if state is not None and model._meta.label_lower in STICKY_WRITE_MODELS:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # The replica holds the same rows as the primary.
+        if {obj1._state.db, obj2._state.db} <= {DEFAULT_DB_ALIAS, REPLICA_ALIAS}:
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name: Optional[str] = None, **hints) -> Optional[bool]:
+        # The replica receives its schema through replication.
+        return False if db == REPLICA_ALIAS else None
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Pins a session to the primary for REPLICA_STICKY_SECONDS after it writes a trip.
+    Must come after SessionMiddleware.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        state = _RoutingState(pinned=request.session.get(STICKY_SESSION_KEY, 0) > time.time())
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            request.session[STICKY_SESSION_KEY] = time.time() + getattr(settings, "REPLICA_STICKY_SECONDS", 30)
+        return response
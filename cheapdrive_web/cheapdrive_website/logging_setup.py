@@ -0,0 +1,66 @@
+import atexit
+import logging
+import logging.config
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from typing import Any, Dict, List
+
+# Listeners started by configure_logging, stopped (and flushed) at interpreter exit.
+_listeners: List[QueueListener] = []
+
+
+def configure_logging(logging_settings: Dict[str, Any]) -> None:
+    """
+    Django LOGGING_CONFIG callable: applies the LOGGING dict, then moves the handlers of every
+    configured logger behind a queue. Logging calls only enqueue the record; a listener thread
+    formats it and does the blocking I/O of the console and file handlers.
+
+    Args:
+        logging_settings: The LOGGING setting (a dictConfig dictionary).
+    """
+    if not logging_settings:
+        return
+    logging.config.dictConfig(logging_settings)
+
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
+
+    for name in logging_settings.get("loggers", {}):
+        logger = logging.getLogger(name)
+        handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+        if not handlers:
+            continue
+        queue: SimpleQueue = SimpleQueue()
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(QueueHandler(queue))
+        # Handler levels still apply on the listener side.
+        listener = QueueListener(queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners.append(listener)
+
+
+def stop_logging_listeners() -> None:
+    """
+    Drains the logging queues and stops the listener threads.
+    """
+    for listener in _listeners:
+        listener.stop()
+    _listeners.clear()
+
+
+def restart_logging_listeners() -> None:
+    """
+    Starts fresh listener threads on the existing queues. Call in a forked child process: threads
+    do not survive a fork, so records would otherwise pile up in the queues unwritten.
+    """
+    listeners = [
+        QueueListener(listener.queue, *listener.handlers, respect_handler_level=True) for listener in _listeners
+    ]
+    _listeners[:] = listeners
+    for listener in listeners:
+        listener.start()
+
+
+atexit.register(stop_logging_listeners)
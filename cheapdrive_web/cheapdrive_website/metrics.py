@@ -0,0 +1,185 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Metrics are kept per process; with several server workers, each worker reports its own values
+(scrape every worker, or aggregate them in Prometheus).
+"""
+from contextlib import contextmanager
+from functools import wraps
+import inspect
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse, HttpResponseForbidden
+
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """
+    A monotonically increasing value per label combination.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._values.items())
+            ]
+
+
+INF_LABEL = 'le="+Inf"'
+
+
+class Histogram:
+    """
+    Observations counted in cumulative buckets per label combination, with their sum and count.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float], labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            # Per-bucket counts followed by the +Inf count and the sum.
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 1) + [0.0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state):
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+                total = state[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, INF_LABEL)} {total}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-1])}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {total}")
+        return lines
+
+
+EXTERNAL_API_CALLS = Counter(
+    "cheapdrive_external_api_calls_total",
+    "Calls to external APIs by service and outcome (ok or the exception name).",
+    ["service", "status"],
+)
+EXTERNAL_API_LATENCY = Histogram(
+    "cheapdrive_external_api_latency_seconds",
+    "Latency of external API calls.",
+    [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+    ["service"],
+)
+SEGMENT_CACHE_REQUESTS = Counter(
+    "cheapdrive_segment_cache_requests_total",
+    "Route segment distance lookups by cache layer (memory or db) and result (hit or miss).",
+    ["layer", "result"],
+)
+PLANNING_ATTEMPTS = Histogram(
+    "cheapdrive_planning_attempts",
+    "Planning attempts used per plan, by outcome (found or not_found).",
+    [1, 2, 3],
+    ["outcome"],
+)
+
+REGISTRY = [EXTERNAL_API_CALLS, EXTERNAL_API_LATENCY, SEGMENT_CACHE_REQUESTS, PLANNING_ATTEMPTS]
+
+
+@contextmanager
+def track_api_call(service: str) -> Iterator[None]:
+    """
+    Counts and times one external API request; an exception raised in the block is recorded
+    as the call's status and re-raised.
+
+    Args:
+        service: Name of the API (e.g. "google_distance_matrix", "nominatim", "overpass").
+    """
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        EXTERNAL_API_LATENCY.observe(time.perf_counter() - start, service=service)
+        EXTERNAL_API_CALLS.inc(service=service, status=status)
+
+
+def tracked_api_call(service: str) -> Callable:
+    """
+    Decorator applying track_api_call to every call of a (sync or async) function.
+    """
+    def decorator(function: Callable) -> Callable:
+        if inspect.iscoroutinefunction(function):
+            @wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                with track_api_call(service):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with track_api_call(service):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render_metrics() -> str:
+    """
+    Renders every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Serves the metrics for scraping. If METRICS_TOKEN is set, requests must send it as a bearer token.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
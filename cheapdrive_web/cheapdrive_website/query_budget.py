@@ -0,0 +1,150 @@
+"""
+Per-view SQL query budgets.
+
+Views declare the most queries one request may issue with the `query_budget` decorator.
+QueryBudgetMiddleware records the queries of every request and, depending on QUERY_BUDGET_MODE,
+logs ("warn") or raises ("raise") when a view exceeds its budget; the report lists the query
+shapes that were executed more than once, which is what an N+1 pattern looks like.
+`assert_max_queries` applies the same check to a block of code in tests.
+"""
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+import re
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpRequest, HttpResponse
+import logging
+
+logger = logging.getLogger("my_logger")
+
+BUDGET_ATTRIBUTE = "query_budget"
+MODES = ("off", "warn", "raise")
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+class QueryBudgetExceeded(Exception):
+    """
+    Raised in "raise" mode when a request issues more queries than its view declared.
+    """
+
+
+def query_budget(max_queries: int) -> Callable:
+    """
+    Declares the query budget of a view. Apply it as the outermost decorator so that the
+    attribute is set on the function the URLconf resolves to.
+
+    Args:
+        max_queries: The most SQL queries one request to the view may issue, sessions and auth included.
+    """
+    def decorator(view: Callable) -> Callable:
+        setattr(view, BUDGET_ATTRIBUTE, max_queries)
+        return view
+    return decorator
+
+
+def get_query_budget(view: Callable) -> Optional[int]:
+    """
+    Returns the budget declared on a view, or None if it has none.
+    """
+    return getattr(view, BUDGET_ATTRIBUTE, None)
+
+
+def query_shape(sql: str) -> str:
+    """
+    Normalizes a query so that executions differing only in literals or IN-list length compare equal.
+    """
+    shape = _PLACEHOLDER_LIST.sub("(%s, ...)", sql)
+    shape = _STRING_LITERAL.sub("?", shape)
+    return _NUMBER_LITERAL.sub("?", shape)
+
+
+def duplicate_shapes(queries: List[str]) -> List[Tuple[str, int]]:
+    """
+    Lists the query shapes executed more than once, most repeated first.
+    """
+    counts = Counter(query_shape(sql) for sql in queries)
+    return [(shape, count) for shape, count in counts.most_common() if count > 1]
+
+
+def budget_report(label: str, budget: int, queries: List[str]) -> str:
+    """
+    Describes a budget overrun, with the duplicated query shapes.
+    """
+    lines = [f"{label} issued {len(queries)} queries, budget is {budget}."]
+    duplicates = duplicate_shapes(queries)
+    if duplicates:
+        lines.append("Duplicated query shapes:")
+        lines.extend(f"  {count}x {shape}" for shape, count in duplicates)
+    return "\n".join(lines)
+
+
+class QueryRecorder:
+    """
+    Records the SQL of every query executed on this thread's database connections while installed.
+    """
+
+    def __init__(self) -> None:
+        self.queries: List[str] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def installed(self) -> Iterator["QueryRecorder"]:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+@contextmanager
+def assert_max_queries(max_queries: int, label: str = "Block") -> Iterator[QueryRecorder]:
+    """
+    Test helper: fails with the duplicated query shapes if the block issues more than `max_queries` queries.
+    """
+    recorder = QueryRecorder()
+    with recorder.installed():
+        yield recorder
+    if len(recorder.queries) > max_queries:
+        raise AssertionError(budget_report(label, max_queries, recorder.queries))
+
+
+class QueryBudgetMiddleware:
+    """
+    Checks every request against the budget of the view that handled it (see QUERY_BUDGET_MODE).
+    Keep it first in MIDDLEWARE so that session and auth queries are counted too.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request: HttpRequest) -> HttpResponse:
+        # Read per request so that tests can switch the mode with override_settings.
+        mode = getattr(settings, "QUERY_BUDGET_MODE", "off")
+        if mode == "off":
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with recorder.installed():
+            response = self.get_response(request)
+
+        budget: Optional[int] = getattr(request, "_query_budget", None)
+        if budget is not None and len(recorder.queries) > budget:
+            report = budget_report(f"{request.method} {request.path}", budget, recorder.queries)
+            if mode == "raise":
+                raise QueryBudgetExceeded(report)
+            logger.warning(report)
+        return response
+
+    def process_view(self, request: HttpRequest, view_func: Callable, view_args, view_kwargs) -> None:
+        request._query_budget = get_query_budget(view_func)
+        return None
@@ -54,8 +54,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'cheapdrive_website.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'cheapdrive_website.db_router.ReplicaStickinessMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -91,6 +93,11 @@ WSGI_APPLICATION = 'cheapdrive_website.wsgi.application'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
 
+# Connections are either kept open per thread for DB_CONN_MAX_AGE seconds, or, with DB_POOL,
+# borrowed from a psycopg pool of at most DB_POOL_MAX_SIZE connections per process (pooling
+# requires DB_CONN_MAX_AGE=0). Planner threads release theirs when their work ends; segment
+# distance threads reuse one connection each and release it when their pool shuts down.
+DB_POOL = env.bool('DB_POOL', default=False)
 DATABASES = {
     'default': {
         'ENGINE': 'django.contrib.gis.db.backends.postgis',  # Use PostGIS for geospatial support
@@ -99,10 +106,32 @@ DATABASES = {
         'NAME': env('DB_NAME'),
         'USER': env('DB_USER'),
         'PASSWORD': env('DB_PASSWORD'),
-
+        'CONN_MAX_AGE': 0 if DB_POOL else env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+                'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+                'timeout': env.float('DB_POOL_TIMEOUT', default=10.0),
+            },
+        } if DB_POOL else {},
     }
     
 }
+# Optional read replica for station, price and trip history reads (see cheapdrive_website.db_router).
+# Sessions that wrote a trip read from the primary for REPLICA_STICKY_SECONDS. In tests the
+# replica mirrors the test database.
+DB_REPLICA_HOST = env('DB_REPLICA_HOST', default='')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': env('DB_REPLICA_PORT', default='5432'),
+        'NAME': env('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['cheapdrive_website.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=30)
 
 
 AUTH_USER_MODEL = 'entry.User'
@@ -151,6 +180,41 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'), 
 ]
 SESSION_COOKIE_AGE = int(env('SESSION_COOKIE_AGE'))
+
+# Session storage used by the refill wizard: "db" (default), "cached_db" or "signed_cookies".
+# "cached_db" serves session reads from CACHES, "signed_cookies" keeps the session out of the database entirely.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_MODE = env('SESSION_MODE', default='db')
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+# Route planning runs in an in-process worker pool; jobs that stop progressing for
+# PLANNING_JOB_TIMEOUT seconds are considered lost: they are marked as failed and resubmitted
+# when the trip is polled (choose_option) or planned again.
+PLANNING_WORKERS = env.int('PLANNING_WORKERS', default=2)
+PLANNING_JOB_TIMEOUT = env.int('PLANNING_JOB_TIMEOUT', default=300)
+# Evaluate all range adjustment factors of a plan concurrently instead of one after another.
+PARALLEL_PLANNING_ATTEMPTS = env.bool('PARALLEL_PLANNING_ATTEMPTS', default=False)
+# Threads fetching the segment distances of one candidate route; each may hold a connection.
+DISTANCE_WORKERS = env.int('DISTANCE_WORKERS', default=4)
+# Lifetime (seconds) of persisted route prefix validation outcomes; 0 disables the memo.
+PREFIX_MEMO_TIMEOUT = env.int('PREFIX_MEMO_TIMEOUT', default=2 * 3600)
+# Filter candidate stations against the driving route (Directions API polyline) instead of the
+# straight origin-destination line; stations up to ROUTE_CORRIDOR_WIDTH_KM away from it are kept.
+ROUTE_CORRIDOR_FILTER = env.bool('ROUTE_CORRIDOR_FILTER', default=False)
+ROUTE_CORRIDOR_WIDTH_KM = env.float('ROUTE_CORRIDOR_WIDTH_KM', default=10.0)
+# Bearer token required by the /metrics endpoint; empty leaves it open (restrict it at the proxy instead).
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+# Per-view SQL query budgets (see cheapdrive_website.query_budget): "off", "warn" logs overruns,
+# "raise" turns them into errors (used by the test suite).
+QUERY_BUDGET_MODE = env('QUERY_BUDGET_MODE', default='off')
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 import os
@@ -164,6 +228,12 @@ GEOS_LIBRARY_PATH = env('GEOS_LIBRARY_PATH',default="")
 LOGGING_DIR = os.path.join(BASE_DIR, "logs")  # Create logs directory
 if not os.path.exists(LOGGING_DIR):
     os.makedirs(LOGGING_DIR)
+# Records below LOG_LEVEL are dropped before formatting; handlers run on a background
+# listener thread (see cheapdrive_website.logging_setup). Every gunicorn worker appends to the
+# same files, so they are rotated externally (e.g. logrotate): WatchedFileHandler reopens a
+# file once it has been moved, which in-process rotation cannot do safely across processes.
+LOG_LEVEL = env('LOG_LEVEL', default='DEBUG' if DEBUG else 'INFO')
+LOGGING_CONFIG = 'cheapdrive_website.logging_setup.configure_logging'
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -183,37 +253,37 @@ LOGGING = {
         # File handler to log exceptions at the ERROR level.
         "exception_file": {
             "level": "ERROR",  
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.WatchedFileHandler",
             "filename": os.path.join(LOGGING_DIR, "exception.log"),
             "formatter": "verbose",
         },
         "django_debug_file": {
             "level": "DEBUG",
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.WatchedFileHandler",
             "filename": os.path.join(LOGGING_DIR, "django_debug.log"),
             "formatter": "verbose",
         },
         "debug_file": {
             "level": "DEBUG",
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.WatchedFileHandler",
             "filename": os.path.join(LOGGING_DIR, "debug.log"),
             "formatter": "verbose",
         },
         "info_file": {
             "level": "INFO",
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.WatchedFileHandler",
             "filename": os.path.join(LOGGING_DIR, "info.log"),
             "formatter": "verbose",
         },
         "error_file": {
             "level": "ERROR",
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.WatchedFileHandler",
             "filename": os.path.join(LOGGING_DIR, "error.log"),
             "formatter": "verbose",
         },
         "warning_file": {
             "level": "WARNING",
-            "class": "logging.FileHandler",
+            "class": "logging.handlers.WatchedFileHandler",
             "filename": os.path.join(LOGGING_DIR, "warning.log"),
             "formatter": "verbose",
         },
@@ -228,7 +298,7 @@ LOGGING = {
                 "warning_file",
                 "exception_file"
             ],
-            "level": "DEBUG",
+            "level": LOG_LEVEL,
             "propagate": True,
         },
         "my_logger": {
@@ -240,7 +310,7 @@ LOGGING = {
                 "warning_file",
                 "exception_file"
             ],
-            "level": "DEBUG",
+            "level": LOG_LEVEL,
             "propagate": False,
         },
     },
@@ -5,10 +5,13 @@ from django.urls import include,path
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('',
     include("entry.urls")),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('', include('refill.urls', namespace='refill')),
     #path("refill/",
     #include("refill.urls")),
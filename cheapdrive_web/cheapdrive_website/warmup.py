@@ -0,0 +1,126 @@
+"""
+Startup warm-up.
+
+Work that every server process would otherwise do lazily on its first requests: importing the
+views (and with them GeoDjango, numpy and the API clients), loading GDAL and GEOS, compiling the
+URL patterns, building the geocoder, and loading the station index and the price snapshot. Run
+in the gunicorn master before workers are forked (see gunicorn.conf.py), its results are shared
+by every worker.
+"""
+import time
+from typing import Callable, Dict, List, Tuple
+
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+import logging
+
+logger = logging.getLogger("my_logger")
+
+
+def _compile_url_patterns(resolver: URLResolver) -> int:
+    """
+    Compiles the regular expression of every URL pattern, which Django otherwise does on first match.
+    """
+    compiled = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        compiled += 1
+        if isinstance(pattern, URLResolver):
+            compiled += _compile_url_patterns(pattern)
+    return compiled
+
+
+def warm_urls() -> None:
+    # Resolving the URLconf imports every view module.
+    resolver = get_resolver()
+    resolver.reverse_dict
+    _compile_url_patterns(resolver)
+
+
+def warm_gis() -> None:
+    from django.contrib.gis import gdal, geos
+
+    gdal.gdal_version()
+    geos.geos_version()
+    # The first transformation builds the PROJ objects for the WGS 84 SRID used by stations.
+    geos.Point(19.0, 51.0, srid=4326).transform(3857, clone=True)
+
+
+def warm_geocoder() -> None:
+    from api_calls.api_calculations import get_geolocator
+
+    get_geolocator()
+
+
+# The GiST index of the station locations, whatever its name: Django names the one it creates
+# after the field (entry_station_location_id), migration 0008 creates entry_station_location_gist.
+LOCATION_INDEX_QUERY = """
+SELECT c.oid::regclass::text
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_am am ON am.oid = c.relam
+JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+WHERE i.indrelid = %s::regclass
+  AND am.amname = 'gist'
+  AND a.attname = 'location'
+"""
+
+
+def warm_station_index() -> None:
+    """
+    Loads the station table and its GiST index(es) into the database cache, with pg_prewarm when
+    the extension is installed and with a spatial sample query otherwise.
+    """
+    from django.contrib.gis.geos import Point
+    from entry.models import Station
+
+    connection = connections[Station.objects.db]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_prewarm'")
+        if cursor.fetchone():
+            cursor.execute(LOCATION_INDEX_QUERY, [Station._meta.db_table])
+            relations = [Station._meta.db_table] + [index for index, in cursor.fetchall()]
+            for relation in relations:
+                cursor.execute("SELECT pg_prewarm(%s::regclass)", [relation])
+            return
+    list(Station.objects.filter(location__dwithin=(Point(19.0, 52.0, srid=4326), 50_000)).values_list("id")[:100])
+
+
+def warm_price_snapshot() -> None:
+    from entry.prices import average_fuel_prices
+
+    average_fuel_prices(refresh=True)
+
+
+WARM_UP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("urls", warm_urls),
+    ("gis", warm_gis),
+    ("geocoder", warm_geocoder),
+    ("station_index", warm_station_index),
+    ("price_snapshot", warm_price_snapshot),
+]
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    Runs the warm-up steps, then closes the database connections they opened so that forked
+    workers do not share them. A failing step is logged and skipped; it never prevents startup.
+
+    Returns:
+        dict: Milliseconds spent in each step.
+    """
+    timings = {}
+    for name, step in WARM_UP_STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception("Warm-up step %s failed:", name)
+        timings[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+        # A psycopg pool runs threads, which do not survive a fork; workers open their own.
+        if hasattr(connection, "close_pool"):
+            connection.close_pool()
+    return timings
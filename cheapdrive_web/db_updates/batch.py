@@ -0,0 +1,207 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import hashlib
+import json
+import time
+from typing import Any, Iterator, List, Optional, Sequence
+import zlib
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+
+from cache.cache_utils import delete_cache, get_from_cache, set_cache
+import logging
+
+logger = logging.getLogger("my_logger")
+
+# Checkpoints of interrupted runs are kept this long (seconds); a later run resumes from them.
+CHECKPOINT_TIMEOUT = 24 * 3600
+
+
+def _lock_key(name: str) -> int:
+    # pg advisory locks take a signed 64-bit key; crc32 keeps it stable across processes.
+    return zlib.crc32(f"cheapdrive:{name}".encode())
+
+
+@contextmanager
+def advisory_lock(name: str, using: str = DEFAULT_DB_ALIAS) -> Iterator[bool]:
+    """
+    Holds a PostgreSQL session advisory lock for the duration of the block, without waiting for it.
+    The lock is released when the block exits, or by the server if the process dies.
+
+    Args:
+        name: Name of the job the lock protects.
+        using: Database alias.
+
+    Yields:
+        bool: Whether the lock was acquired; False means another run holds it.
+    """
+    key = _lock_key(name)
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connections[using].cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+
+
+@contextmanager
+def short_transaction(lock_timeout_ms: int, statement_timeout_ms: int, using: str = DEFAULT_DB_ALIAS) -> Iterator[None]:
+    """
+    A transaction that gives up (raises) instead of queueing behind user traffic: waits for row
+    locks at most lock_timeout_ms and runs each statement at most statement_timeout_ms.
+    """
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute("SELECT set_config('lock_timeout', %s, true)", [f"{lock_timeout_ms}ms"])
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [f"{statement_timeout_ms}ms"])
+        yield
+
+
+def chunked(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def fingerprint(data: Any) -> str:
+    """
+    Returns a digest of JSON-serializable input data, used to tell whether a checkpoint belongs to it.
+    """
+    return hashlib.md5(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _checkpoint_key(job: str) -> str:
+    return f"batch_checkpoint_{job}"
+
+
+def load_checkpoint(job: str, data_fingerprint: str) -> Optional[List[Any]]:
+    """
+    Returns the key of the last item an interrupted run of the job committed, if that run
+    worked on the same input data.
+    """
+    checkpoint: Optional[dict] = get_from_cache(_checkpoint_key(job))
+    if checkpoint and checkpoint.get("fingerprint") == data_fingerprint:
+        return checkpoint["after"]
+    return None
+
+
+def save_checkpoint(job: str, data_fingerprint: str, after: List[Any]) -> None:
+    set_cache(_checkpoint_key(job), {"fingerprint": data_fingerprint, "after": after}, timeout=CHECKPOINT_TIMEOUT)
+
+
+def clear_checkpoint(job: str) -> None:
+    delete_cache(_checkpoint_key(job))
+
+
+def format_changes(changes: List[str], limit: int) -> str:
+    """
+    Formats a change list for a dry-run report, eliding everything past `limit` entries.
+    """
+    lines = changes[:limit]
+    if len(changes) > limit:
+        lines.append(f"... and {len(changes) - limit} more")
+    return "\n".join(lines)
+
+
+class RefreshCommand(BaseCommand, ABC):
+    """
+    Base of the batch refresh commands. Subclasses fetch the input items (sorted by item_key),
+    diff them against the database and apply the changes (sorted the same way, keyed by change_key).
+
+    A run holds an advisory lock, so overlapping runs exit immediately. Changes are applied in
+    chunks, each in a short transaction with lock and statement timeouts, with a pause between
+    chunks so that user requests are not starved. After each chunk the key of its last change is
+    checkpointed; a run that stops midway is resumed by the next run on the same input.
+    """
+
+    job = ""
+
+    @abstractmethod
+    def fetch(self) -> List[Any]:
+        """
+        Returns the input items, sorted by item_key.
+        """
+
+    @abstractmethod
+    def item_key(self, item: Any) -> List[Any]:
+        """
+        Returns the sort key of an input item, compared with checkpoints when resuming.
+        """
+
+    @abstractmethod
+    def diff(self, items: List[Any]) -> List[Any]:
+        """
+        Returns the changes the items make to the database, sorted by change_key.
+        """
+
+    @abstractmethod
+    def change_key(self, change: Any) -> List[Any]:
+        """
+        Returns the key of a change, in the same form as item_key; it is saved as the checkpoint.
+        """
+
+    def prepare(self, changes: Sequence[Any]) -> Any:
+        """
+        Work done for a chunk before its transaction opens (e.g. slow API lookups).
+        """
+        return None
+
+    @abstractmethod
+    def apply(self, changes: Sequence[Any], prepared: Any) -> None:
+        """
+        Writes a chunk of changes; runs inside the chunk's short transaction.
+        """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without writing them.")
+        parser.add_argument("--chunk-size", type=int, default=100, help="Changes written per transaction.")
+        parser.add_argument("--pause", type=float, default=0.2, help="Seconds to sleep between chunks.")
+        parser.add_argument("--lock-timeout-ms", type=int, default=2000,
+                            help="Give up on a chunk that waits longer than this for row locks.")
+        parser.add_argument("--statement-timeout-ms", type=int, default=30000,
+                            help="Give up on a chunk statement running longer than this.")
+        parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an interrupted run.")
+        parser.add_argument("--show", type=int, default=50, help="Changes listed by --dry-run.")
+
+    def handle(self, *args, **options):
+        if options["dry_run"]:
+            changes = self.diff(self.fetch())
+            self.stdout.write(f"{len(changes)} changes (dry run, nothing written).")
+            if changes:
+                self.stdout.write(format_changes([str(change) for change in changes], options["show"]))
+            return
+
+        with advisory_lock(self.job) as acquired:
+            if not acquired:
+                self.stdout.write(self.style.WARNING(f"Another {self.job} run is in progress; skipping."))
+                return
+            self.refresh(options)
+
+    def refresh(self, options: dict) -> None:
+        items = self.fetch()
+        data_fingerprint = fingerprint(items)
+        after = None if options["restart"] else load_checkpoint(self.job, data_fingerprint)
+        if after is not None:
+            items = [item for item in items if self.item_key(item) > after]
+            self.stdout.write(f"Resuming an interrupted run after {after}.")
+
+        changes = self.diff(items)
+        written = 0
+        for chunk in chunked(changes, options["chunk_size"]):
+            prepared = self.prepare(chunk)
+            try:
+                with short_transaction(options["lock_timeout_ms"], options["statement_timeout_ms"]):
+                    self.apply(chunk, prepared)
+            except DatabaseError as e:
+                raise CommandError(
+                    f"Chunk failed after {written} of {len(changes)} changes ({e}); the next run resumes from there."
+                )
+            written += len(chunk)
+            save_checkpoint(self.job, data_fingerprint, self.change_key(chunk[-1]))
+            logger.info("%s: %d/%d changes written", self.job, written, len(changes))
+            time.sleep(options["pause"])
+        clear_checkpoint(self.job)
+        self.stdout.write(self.style.SUCCESS(f"{written} changes written."))
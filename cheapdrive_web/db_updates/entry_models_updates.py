@@ -1,105 +1,268 @@
-from http.client import HTTPSConnection
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from django.contrib.gis.geos import Point
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
 from api_calls.other_api_calls import scrape_prices,retrieve_stations_overpass,get_address_from_coords
 from entry.models import StationPrices,Station
+from entry.prices import PRICE_FIELDS
 from formatters.string_format import format_address
-from django.contrib.gis.geos import Point
 import logging
 logger=logging.getLogger("my_logger")
-def update_brand_prices() -> None:
+
+# Brand slugs on the price website.
+PRICE_BRANDS = [
+    "circle-k-statoil", "orlen", "shell", "amic", "lotos", "lotos-optima", "bp",
+    "moya", "auchan", "tesco", "carrefour", "olkop", "leclerc", "intermarche",
+     "huzar", "total"
+]
+# Brand names matched against the OpenStreetMap brand tag of stations.
+STATION_BRANDS = [
+    "circle k", "orlen", "shell", "amic", "lotos", "lotos-optima", "bp", "moya",
+    "auchan", "tesco", "carrefour", "olkop", "leclerc", "intermarche",
+    "huzar", "total"
+]
+# Decimal places used to match Overpass coordinates with stored station locations (~10 cm).
+COORDINATE_PRECISION = 6
+
+
+def normalize_price_brand(brand: str) -> str:
     """
-    Update or create StationPrices objects for a predefined list of fuel station brands by scraping their prices
-    from an external website.
+    Maps a price website brand slug to the brand name stored in StationPrices. Station brands
+    (STATION_BRANDS) go through it too, so that stations match their prices.
+    """
+    if brand == "circle-k-statoil":
+        return "circle k"
+    if brand == "lotos-optima":
+        return "lotos optima"
+    return brand
 
-    Args:
-        None
-    
-    Returns:
-        None
 
-    Raises:
-        Exception: If an error occurs while updating the prices for any station brand.
+def parse_price(value: Any) -> Optional[Decimal]:
     """
-    brands = [
-        "circle-k-statoil", "orlen", "shell", "amic", "lotos", "lotos-optima", "bp",
-        "moya", "auchan", "tesco", "carrefour", "olkop", "leclerc", "intermarche",
-         "huzar", "total"
-    ]
-    for brand in brands:
-        pb95_price, pb98_price, diesel_price, lpg_price = scrape_prices(brand)
-        logger.debug('brand')
-        # Normalize brand name for database consistency.
-        normalized_brand = brand
-        if brand == "circle-k-statoil":
-            normalized_brand = "circle k"
-        elif brand == "lotos-optima":
-            normalized_brand = "lotos optima"
-        
-        # Convert prices from string to float if available; treat "0" or None as missing.
-        price_mapping = {
-            "pb95_price": None if pb95_price in (0, None) else float(str(pb95_price).replace(",", ".")),
-            "pb98_price": None if pb98_price in (0, None) else float(str(pb98_price).replace(",", ".")),
-            "diesel_price": None if diesel_price in (0, None) else float(str(diesel_price).replace(",", ".")),
-            "lpg_price": None if lpg_price in (0, None) else float(str(lpg_price).replace(",", "."))
-        }
-        
+    Converts a scraped price ("6,49") to a Decimal; "0", empty and unparsable values are missing prices.
+    """
+    if value in (0, None, ""):
+        return None
+    try:
+        price = Decimal(str(value).replace(",", "."))
+    except InvalidOperation:
+        return None
+    return price.quantize(Decimal("0.01")) if price else None
+
+
+def fetch_brand_prices() -> List[Dict[str, Any]]:
+    """
+    Scrapes the current prices of every brand in PRICE_BRANDS. Brands whose page cannot be
+    fetched are logged and left out.
+
+    Returns:
+        list: One {"brand_name": ..., <price field>: Decimal or None, ...} dictionary per brand.
+    """
+    prices = []
+    for brand in PRICE_BRANDS:
         try:
-            StationPrices.objects.update_or_create(
-                brand_name=normalized_brand,
-                defaults={
-                    "pb95_price": price_mapping["pb95_price"],
-                    "pb98_price": price_mapping["pb98_price"],
-                    "diesel_price": price_mapping["diesel_price"],
-                    "lpg_price": price_mapping["lpg_price"],
-                }
-            )
-        except Exception as e:
-            # Log the error (here using print for simplicity).
-            print(f"Error updating prices for {normalized_brand}: {e}")
-
-
-def update_station_objects() -> list:
-    """
-    Retrieve fuel station data from the Overpass API and update/create corresponding Station objects in the database. 
-    Estimated address is taken from an API-based function get_address_from_coords.
-
-    Args:
-        None
-    
+            pb95_price, pb98_price, diesel_price, lpg_price = scrape_prices(brand)
+        except ValueError:
+            logger.warning("Could not scrape prices for %s", brand, exc_info=True)
+            continue
+        prices.append({
+            "brand_name": normalize_price_brand(brand),
+            "pb95_price": parse_price(pb95_price),
+            "pb98_price": parse_price(pb98_price),
+            "diesel_price": parse_price(diesel_price),
+            "lpg_price": parse_price(lpg_price),
+        })
+    return prices
+
+
+class PriceChange(NamedTuple):
+    brand_name: str
+    prices: Dict[str, Optional[Decimal]]
+    # The stored row, or None for a brand without one.
+    current: Optional[StationPrices]
+
+    def __str__(self) -> str:
+        if self.current is None:
+            return f"+ {self.brand_name}: " + ", ".join(f"{field}={value}" for field, value in self.prices.items())
+        changed = [
+            f"{field} {getattr(self.current, field)} -> {value}"
+            for field, value in self.prices.items() if getattr(self.current, field) != value
+        ]
+        return f"~ {self.brand_name}: " + ", ".join(changed)
+
+
+def diff_brand_prices(scraped: List[Dict[str, Any]]) -> List[PriceChange]:
+    """
+    Compares scraped prices with the stored StationPrices rows (one query).
+
     Returns:
-        list: A list of Station objects that were created or updated.
+        list: A PriceChange per brand that is new or has at least one different price.
+    """
+    current = {
+        prices.brand_name: prices
+        for prices in StationPrices.objects.using(DEFAULT_DB_ALIAS).filter(
+            brand_name__in=[item["brand_name"] for item in scraped]
+        )
+    }
+    changes = []
+    for item in scraped:
+        prices = {field: item[field] for field in PRICE_FIELDS}
+        row = current.get(item["brand_name"])
+        if row is None or any(getattr(row, field) != value for field, value in prices.items()):
+            changes.append(PriceChange(item["brand_name"], prices, row))
+    return changes
 
-    Raises:
-        StationPrices.DoesNotExist: If the station price for a brand is not found.
+
+def apply_price_changes(changes: List[PriceChange]) -> None:
+    """
+    Writes price changes with one bulk insert and one bulk update. Call inside a transaction.
     """
+    now = timezone.now()
+    new_rows = [StationPrices(brand_name=change.brand_name, **change.prices) for change in changes if change.current is None]
+    updated_rows = []
+    for change in changes:
+        if change.current is not None:
+            for field, value in change.prices.items():
+                setattr(change.current, field, value)
+            # bulk_update does not apply auto_now.
+            change.current.updated_at = now
+            updated_rows.append(change.current)
+    StationPrices.objects.bulk_create(new_rows)
+    StationPrices.objects.bulk_update(updated_rows, list(PRICE_FIELDS) + ["updated_at"])
 
-    brand_names = [
-        "circle k", "orlen", "shell", "amic", "lotos", "lotos-optima", "bp", "moya",
-        "auchan", "tesco", "carrefour", "olkop", "leclerc", "intermarche",
-        "huzar", "total"
+
+def update_brand_prices() -> List[PriceChange]:
+    """
+    Scrapes the prices of every brand and stores the ones that changed.
+
+    Returns:
+        list: The applied changes.
+    """
+    changes = diff_brand_prices(fetch_brand_prices())
+    apply_price_changes(changes)
+    return changes
+
+
+def fetch_stations() -> List[Dict[str, Any]]:
+    """
+    Retrieves the fuel stations of the tracked brands from the Overpass API, in a stable order.
+
+    Returns:
+        list: {"lat", "lon", "brand_name"} dictionaries sorted by location, with brand names as
+        stored in StationPrices.
+    """
+    stations = [
+        {**station, "brand_name": normalize_price_brand(station["brand_name"])}
+        for station in retrieve_stations_overpass(STATION_BRANDS)
     ]
-    created_stations = []
-    stations_data = retrieve_stations_overpass(brand_names)
-    logger.debug(len(stations_data))
-    
-    for data in stations_data:
-        brand = data.get("brand_name")
-        lat = data.get("lat")
-        lon = data.get("lon")
-        # Create a GIS Point (expects parameters as (longitude, latitude)).
-        location = Point(lon, lat)
-        logger.debug(get_address_from_coords(lat,lon))
-        address=format_address(get_address_from_coords(lat,lon))
-        logger.debug(address)
-       
-        try:
-            station_prices = StationPrices.objects.get(brand_name=brand)
-            station_obj, created = Station.objects.get_or_create(
-                location=location,
-                station_prices=station_prices,
-                address=address
-            )
-            created_stations.append(station_obj)
-        except StationPrices.DoesNotExist:
-            logger.debug(f"StationPrices for brand '{brand}' not found. Skipping station.")
-    
-    return created_stations
+    return sorted(stations, key=lambda station: (station["lon"], station["lat"], station["brand_name"]))
+
+
+def _location_key(lon: float, lat: float) -> Tuple[float, float]:
+    return round(lon, COORDINATE_PRECISION), round(lat, COORDINATE_PRECISION)
+
+
+class StationChange(NamedTuple):
+    lon: float
+    lat: float
+    brand_name: str
+    # The stored station and its current brand, or None for a new station.
+    station_id: Optional[int]
+    current_brand: Optional[str]
+
+    def __str__(self) -> str:
+        if self.station_id is None:
+            return f"+ {self.brand_name} station at {self.lat:.5f}, {self.lon:.5f}"
+        return f"~ station {self.station_id}: brand {self.current_brand} -> {self.brand_name}"
+
+
+def diff_stations(stations_data: List[Dict[str, Any]]) -> List[StationChange]:
+    """
+    Compares Overpass stations with the stored ones, matched by location (one query).
+    Stations that disappeared upstream are kept: trips reference them.
+
+    Returns:
+        list: A StationChange per new station and per station whose brand changed.
+    """
+    # Station counts are in the thousands: matching in memory is one query.
+    current = {
+        _location_key(location.x, location.y): (station_id, brand_name)
+        for station_id, location, brand_name in Station.objects.using(DEFAULT_DB_ALIAS).values_list(
+            "id", "location", "station_prices__brand_name"
+        )
+    }
+
+    changes = []
+    for station in stations_data:
+        match = current.get(_location_key(station["lon"], station["lat"]))
+        if match is None:
+            changes.append(StationChange(station["lon"], station["lat"], station["brand_name"], None, None))
+        elif match[1] != station["brand_name"]:
+            changes.append(StationChange(station["lon"], station["lat"], station["brand_name"], match[0], match[1]))
+    return changes
+
+
+def geocode_new_stations(changes: List[StationChange]) -> Dict[Tuple[float, float], str]:
+    """
+    Looks up the address of every new station. Done outside of any transaction: reverse geocoding
+    is rate limited and slow.
+
+    Returns:
+        dict: Maps the location key of each new station to its formatted address.
+    """
+    return {
+        _location_key(change.lon, change.lat): format_address(get_address_from_coords(change.lat, change.lon))
+        for change in changes if change.station_id is None
+    }
+
+
+def apply_station_changes(changes: List[StationChange], addresses: Dict[Tuple[float, float], str]) -> int:
+    """
+    Writes station changes: one bulk insert for new stations and one update per brand for rebranded
+    ones. Stations of brands without StationPrices are skipped. Call inside a transaction.
+
+    Returns:
+        int: The number of skipped changes.
+    """
+    price_ids = dict(
+        StationPrices.objects.using(DEFAULT_DB_ALIAS)
+        .filter(brand_name__in={change.brand_name for change in changes})
+        .values_list("brand_name", "id")
+    )
+    new_stations = []
+    rebranded: Dict[int, List[int]] = {}
+    skipped = 0
+    for change in changes:
+        prices_id = price_ids.get(change.brand_name)
+        if prices_id is None:
+            logger.debug("StationPrices for brand '%s' not found. Skipping station.", change.brand_name)
+            skipped += 1
+        elif change.station_id is None:
+            new_stations.append(Station(
+                # A GIS Point expects (longitude, latitude).
+                location=Point(change.lon, change.lat, srid=4326),
+                address=addresses.get(_location_key(change.lon, change.lat)),
+                station_prices_id=prices_id,
+            ))
+        else:
+            rebranded.setdefault(prices_id, []).append(change.station_id)
+    Station.objects.bulk_create(new_stations)
+    for prices_id, station_ids in rebranded.items():
+        Station.objects.filter(id__in=station_ids).update(station_prices_id=prices_id)
+    return skipped
+
+
+def update_station_objects() -> List[StationChange]:
+    """
+    Retrieves fuel stations from the Overpass API and stores new and rebranded ones. The address of
+    new stations is estimated with get_address_from_coords.
+
+    Returns:
+        list: The detected changes (changes of brands without StationPrices are not applied).
+    """
+    changes = diff_stations(fetch_stations())
+    apply_station_changes(changes, geocode_new_stations(changes))
+    return changes
@@ -1,9 +1,11 @@
 
 from django.shortcuts import get_object_or_404
+from django.http import Http404
+from django.db import transaction
 from decimal import Decimal
 from entry.models import Station
-from refill.models import Trip,TripNode,VehicleData
-from refill.create_models import create_node
+from entry.history import invalidate_trip_history
+from refill.models import Trip,TripNode,VehicleData,estimate_fuel_left
 import logging
 
 logger = logging.getLogger("my_logger")
@@ -11,6 +13,10 @@ def update_trip(trip_id: int, vehicle_id: int, tank_size: float, selected_route:
     """
     Update an existing trip with new route nodes based on a selected route.
 
+    All stations of the route are loaded (with their prices) in a single query, the refilled fuel
+    amounts are computed in memory from running totals of the chain, and the new TripNodes are
+    written with one bulk_create followed by one bulk_update linking the chain, inside a transaction.
+
     Args:
         trip_id (int): The ID of the trip to update.
         vehicle_id (int): The ID of the vehicle associated with the trip.
@@ -28,53 +34,71 @@ def update_trip(trip_id: int, vehicle_id: int, tank_size: float, selected_route:
     if not trip_id or not selected_route.get("station_ids") or not vehicle_id:
         raise ValueError("Missing required trip_id, vehicle_id, or station_ids in selected_route.")
     
-    trip = get_object_or_404(Trip, id=trip_id)
+    trip = get_object_or_404(Trip.objects.select_related("first_trip_node"), id=trip_id)
     vehicle = get_object_or_404(VehicleData, id=vehicle_id)
     
     station_ids = selected_route["station_ids"]
     distances = selected_route["distances"]
     durations = selected_route["durations"]
     
-    # Helper function to retrieve a station object by its ID.
-    def get_station(station_id: int) -> Station:
-        return get_object_or_404(Station, id=station_id)
+    # Load every station of the route together with its prices in one query.
+    stations = Station.objects.select_related("station_prices").in_bulk(station_ids)
+    missing_ids = [station_id for station_id in station_ids if station_id not in stations]
+    if missing_ids:
+        raise Http404(f"Stations not found: {missing_ids}")
     
-    current_node = trip.first_trip_node
-    final_destination = current_node.destination
+    first_node = trip.first_trip_node
+    final_destination = first_node.destination
     logger.debug(final_destination.y)
     # Process the first station: update the first trip node.
-    first_station = get_station(station_ids[0])
-    current_node.destination = first_station.location
-    current_node.distance = Decimal(distances[0])
-    current_node.duration = Decimal(durations[0])
-    current_node.save()
+    first_node.destination = stations[station_ids[0]].location
+    first_node.distance = Decimal(distances[0])
+    first_node.duration = Decimal(durations[0])
+    
+    # Running totals of the chain built so far, used in place of walking it with trip.fuel_left().
+    total_refilled = first_node.fuel_refilled
+    total_distance = first_node.distance
+    total_duration = first_node.duration
     
-    # Process intermediate stations and link new TripNodes.
+    # Build the intermediate TripNodes in memory.
+    new_nodes = []
+    origin = first_node.destination
     for i in range(1, len(station_ids) + 1):
-        station = get_station(station_ids[i - 1])
+        station = stations[station_ids[i - 1]]
+        is_last = i == len(station_ids)
         # Calculate the amount of fuel needed; if not the last station, use the difference between tank size and fuel left.
-        fuel_amount = Decimal(tank_size) - trip.fuel_left() if i < len(station_ids) else Decimal(0)
+        fuel_amount = Decimal(0) if is_last else Decimal(tank_size) - estimate_fuel_left(
+            total_refilled, total_distance, total_duration, vehicle.fuel_consumption_per_100km
+        )
         # Determine the next destination: next station or the final destination.
-        next_destination = get_station(station_ids[i]).location if i < len(station_ids) else final_destination
+        next_destination = final_destination if is_last else stations[station_ids[i]].location
         
-        # Create a new TripNode linking the current destination to the next destination.
-        current_node.next_trip= create_node(
-            origin=current_node.destination,
+        node = TripNode(
+            origin=origin,
             destination=next_destination,
-            distance=Decimal(distances[i])  if i < len(station_ids) else Decimal(0),
-            duration=Decimal(durations[i]) if i < len(station_ids) else Decimal(0),
+            distance=Decimal(0) if is_last else Decimal(distances[i]),
+            duration=Decimal(0) if is_last else Decimal(durations[i]),
             currency=station.station_prices.currency,
-            price=vehicle.get_fuel_price_for_station(station),
+            bought_gas_price=vehicle.get_fuel_price_for_station(station),
             fuel_refilled=fuel_amount,
             station_id=station.id
         )
-        
-        current_node.next_trip.save()
-        
-        current_node.save()
-        current_node = current_node.next_trip
+        new_nodes.append(node)
+        total_refilled += node.fuel_refilled
+        total_distance += node.distance
+        total_duration += node.duration
+        origin = next_destination
+    
+    with transaction.atomic():
+        TripNode.objects.bulk_create(new_nodes)
+        # Link the chain now that every new node has a primary key.
+        chain = [first_node] + new_nodes
+        for node, next_node in zip(chain, new_nodes):
+            node.next_trip = next_node
+        TripNode.objects.bulk_update(chain, ["destination", "distance", "duration", "next_trip"])
+    invalidate_trip_history(trip.user_id)
     
-    return current_node.id
+    return new_nodes[-1].id
 
 
 def finish_updating(fuel_quantity: Decimal, last_node_id: int, last_distance: Decimal, last_duration: Decimal) -> None:
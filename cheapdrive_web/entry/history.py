@@ -0,0 +1,154 @@
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connections
+
+from cache.cache_utils import delete_cache, get_from_cache, set_cache
+from cheapdrive_website.db_router import read_alias
+from refill.models import Trip, TripNode, VehicleData
+import logging
+
+logger = logging.getLogger("my_logger")
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_CACHE_TIMEOUT = 600
+
+# Aggregates every TripNode chain of the given trips in one round-trip.
+# The speed factor mirrors estimate_fuel_consumption with its default coefficients.
+TRIP_TOTALS_SQL = """
+WITH RECURSIVE chain AS (
+    SELECT t.id AS trip_id, n.next_trip_id, 0 AS depth,
+           n.distance, n.duration, n.bought_gas_price, n.fuel_refilled,
+           COALESCE(v.fuel_consumption_per_100km, 0) AS consumption
+    FROM {trip} t
+    JOIN {node} n ON n.id = t.first_trip_node_id
+    LEFT JOIN {vehicle} v ON v.id = t.vehicle_id
+    WHERE t.id = ANY(%s)
+  UNION ALL
+    SELECT c.trip_id, n.next_trip_id, c.depth + 1,
+           n.distance, n.duration, n.bought_gas_price, n.fuel_refilled,
+           c.consumption
+    FROM chain c
+    JOIN {node} n ON n.id = c.next_trip_id
+),
+segments AS (
+    SELECT *, CASE WHEN duration > 0 THEN distance / duration * 60 ELSE 0 END AS speed
+    FROM chain
+)
+SELECT trip_id,
+       SUM(distance),
+       SUM(duration),
+       ROUND(SUM(CASE WHEN depth > 0
+                      THEN COALESCE(bought_gas_price, 0) * COALESCE(fuel_refilled, 0)
+                      ELSE 0 END), 2),
+       ROUND(SUM(distance * consumption / 100 * COALESCE(bought_gas_price, 0) *
+                 CASE WHEN speed < 60 THEN 1 + 1.6 * (speed - 60) * (speed - 60) / 3600
+                      WHEN speed > 70 THEN 1 + 0.9 * (speed - 70) * (speed - 70) / 4900
+                      ELSE 1 END), 2)
+FROM segments
+GROUP BY trip_id
+"""
+
+
+def _history_cache_key(user_id: int) -> str:
+    return f"trip_history_{user_id}"
+
+
+def compute_trip_totals(trip_ids: List[int], using: Optional[str] = None) -> Dict[int, Tuple[Decimal, Decimal, Decimal, Decimal]]:
+    """
+    Computes distance, duration, price bought and price used for several trips with a single
+    recursive CTE instead of walking each TripNode chain in Python.
+
+    Args:
+        trip_ids: IDs of the trips to aggregate.
+        using: Database alias to query; defaults to read_alias() (the replica, if configured).
+
+    Returns:
+        dict: Maps trip ID to a tuple (total_distance, total_duration, price_bought, price_used).
+    """
+    if not trip_ids:
+        return {}
+    sql = TRIP_TOTALS_SQL.format(
+        trip=Trip._meta.db_table,
+        node=TripNode._meta.db_table,
+        vehicle=VehicleData._meta.db_table,
+    )
+    with connections[using or read_alias()].cursor() as cursor:
+        cursor.execute(sql, [list(trip_ids)])
+        return {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+
+def fetch_trip_history_page(user_id: int, before: Optional[int] = None,
+                            page_size: int = HISTORY_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Retrieves one page of a user's trip history, newest first, using keyset pagination
+    on the first_trip_node_id column. Reads go to read_alias().
+
+    Args:
+        user_id: The ID of the user whose trips are listed.
+        before: Only trips whose first_trip_node_id is lower than this value are returned.
+        page_size: The maximum number of trips on the page.
+
+    Returns:
+        tuple: (trip_data, next_before) where next_before is the keyset cursor of the next
+        page, or None if this is the last page.
+    """
+    alias = read_alias()
+    trips = Trip.objects.using(alias).filter(user_id=user_id).select_related("first_trip_node")
+    if before is not None:
+        trips = trips.filter(first_trip_node_id__lt=before)
+    trips = list(trips.order_by("-first_trip_node_id")[:page_size + 1])
+
+    next_before = trips[page_size - 1].first_trip_node_id if len(trips) > page_size else None
+    trips = trips[:page_size]
+    totals = compute_trip_totals([trip.id for trip in trips], using=alias)
+
+    trip_data = []
+    for trip in trips:
+        total_distance, total_duration, _, price_used = totals[trip.id]
+        trip_data.append({
+            'origin_address': trip.origin_address,
+            'destination_address': trip.destination_address,
+            'total_distance': str(total_distance),
+            'total_duration': str(total_duration),
+            'total_price': str(price_used),
+            'currency': trip.main_currency(),
+            'trip_id': trip.id,
+        })
+    return trip_data, next_before
+
+
+def get_trip_history_page(user_id: int, before: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Returns a page of trip history, serving the first page from the per-user cache when possible.
+
+    Args:
+        user_id: The ID of the user whose trips are listed.
+        before: Keyset cursor of the requested page (None for the first page).
+
+    Returns:
+        tuple: (trip_data, next_before) as returned by fetch_trip_history_page.
+    """
+    if before is not None:
+        return fetch_trip_history_page(user_id, before)
+
+    cache_key = _history_cache_key(user_id)
+    cached = get_from_cache(cache_key)
+    if cached:
+        logger.debug("Cache hit for %s", cache_key)
+        return cached["trip_data"], cached["next_before"]
+
+    trip_data, next_before = fetch_trip_history_page(user_id)
+    set_cache(cache_key, {"trip_data": trip_data, "next_before": next_before}, timeout=HISTORY_CACHE_TIMEOUT)
+    return trip_data, next_before
+
+
+def invalidate_trip_history(user_id: Optional[int]) -> None:
+    """
+    Drops the cached trip history summary of a user. Call whenever one of their trips changes.
+
+    Args:
+        user_id: The ID of the user, or None for guest trips (nothing is cached for guests).
+    """
+    if user_id is not None:
+        delete_cache(_history_cache_key(user_id))
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Django creates a GiST index for spatial fields, but databases restored from dumps or
+# created with spatial_index disabled may lack it; every station search relies on it.
+CREATE_LOCATION_INDEX = """
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = 'entry_station'::regclass
+          AND am.amname = 'gist'
+          AND a.attname = 'location'
+    ) THEN
+        CREATE INDEX entry_station_location_gist ON entry_station USING GIST (location);
+    END IF;
+END
+$$;
+ANALYZE entry_station;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('entry', '0007_alter_stationprices_brand_name'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_LOCATION_INDEX,
+            reverse_sql="DROP INDEX IF EXISTS entry_station_location_gist;",
+        ),
+    ]
@@ -0,0 +1,38 @@
+from decimal import Decimal
+import threading
+import time
+from typing import Dict, Optional
+
+from django.db.models import Avg
+
+from .models import StationPrices
+
+PRICE_FIELDS = ("diesel_price", "lpg_price", "pb95_price", "pb98_price")
+# Lifetime (seconds) of the in-process snapshot of average fuel prices.
+PRICE_SNAPSHOT_TIMEOUT = 600
+
+_snapshot: Dict[str, Optional[Decimal]] = {}
+_snapshot_expires = 0.0
+_snapshot_lock = threading.Lock()
+
+
+def average_fuel_prices(refresh: bool = False) -> Dict[str, Optional[Decimal]]:
+    """
+    Returns the average price of every fuel type across all stations, rounded to two decimals.
+    The averages are computed in one query and kept in process for PRICE_SNAPSHOT_TIMEOUT seconds.
+
+    Args:
+        refresh: Recompute the snapshot even if it has not expired.
+
+    Returns:
+        dict: Maps each price field name to its average price, or None if no station has that price.
+    """
+    global _snapshot, _snapshot_expires
+    with _snapshot_lock:
+        if refresh or time.monotonic() >= _snapshot_expires:
+            averages = StationPrices.objects.aggregate(**{field: Avg(field) for field in PRICE_FIELDS})
+            _snapshot = {
+                field: round(value, 2) if value is not None else None for field, value in averages.items()
+            }
+            _snapshot_expires = time.monotonic() + PRICE_SNAPSHOT_TIMEOUT
+        return _snapshot
@@ -1,3 +1,135 @@
-from django.test import TestCase
+from decimal import Decimal
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cheapdrive_website.db_router import ReplicaRouter, ReplicaStickinessMiddleware, STICKY_SESSION_KEY
+from cheapdrive_website.query_budget import duplicate_shapes, get_query_budget
+from entry.models import Station, StationPrices
+from entry.prices import average_fuel_prices
+from entry.urls import urlpatterns as entry_urlpatterns
+from refill.models import Trip
+from refill.urls import urlpatterns as refill_urlpatterns
+
+
+class SessionEngineLoadTests(TestCase):
+    """
+    Compares the number of django_session queries issued by the configurable session modes
+    over a burst of session-writing requests.
+    """
+    n_requests = 10
+
+    def count_session_queries(self) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(self.n_requests):
+                self.client.get(reverse('entry:guest_access'))
+        return sum(1 for query in queries.captured_queries if 'django_session' in query['sql'])
+
+    def test_cached_db_and_signed_cookies_issue_fewer_session_queries(self):
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.db'):
+            db_queries = self.count_session_queries()
+        self.client.cookies.clear()
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db'):
+            cached_db_queries = self.count_session_queries()
+        self.client.cookies.clear()
+        with override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies'):
+            signed_cookies_queries = self.count_session_queries()
+
+        self.assertLess(cached_db_queries, db_queries)
+        self.assertEqual(signed_cookies_queries, 0)
+
+
+class GuestIdTests(TestCase):
+    """
+    Guest trips are owned by a short random id kept in the session, stable across session changes.
+    """
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_guest_id_is_short_and_stable_with_signed_cookies(self):
+        self.client.get(reverse('entry:guest_access'))
+        guest_id = self.client.session['guest_id']
+        self.assertEqual(len(guest_id), 32)
+
+        session = self.client.session
+        session['planning_job_id'] = 1
+        session.save()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = session.session_key
+        self.client.get(reverse('entry:guest_access'))
+        self.assertEqual(self.client.session['guest_id'], guest_id)
+
+
+class ViewQueryBudgetTests(TestCase):
+    """
+    Every entry and refill view declares a query budget, and the middleware enforces it.
+    """
+
+    def test_every_view_declares_a_budget(self):
+        for pattern in entry_urlpatterns + refill_urlpatterns:
+            with self.subTest(view=pattern.name):
+                self.assertIsNotNone(get_query_budget(pattern.callback))
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_entry_pages_stay_within_budget(self):
+        for name in ('entry:visit', 'entry:login', 'entry:register', 'entry:guest_access'):
+            with self.subTest(view=name):
+                self.assertIn(self.client.get(reverse(name)).status_code, (200, 302))
+
+    def test_duplicate_shapes_ignore_literals_and_in_lists(self):
+        queries = [
+            'SELECT * FROM "entry_station" WHERE "id" = 1',
+            'SELECT * FROM "entry_station" WHERE "id" = 2',
+            'SELECT * FROM "entry_station" WHERE "id" IN (%s, %s)',
+            'SELECT * FROM "entry_station" WHERE "id" IN (%s, %s, %s)',
+            'SELECT * FROM "refill_trip"',
+        ]
+        self.assertEqual([count for _, count in duplicate_shapes(queries)], [2, 2])
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """
+    Station reads go to the replica, except for a session that has just written a trip.
+    """
+
+    def test_session_reads_its_own_trip_writes_from_primary(self):
+        router = ReplicaRouter()
+        request = RequestFactory().get('/')
+        request.session = {}
+
+        def update_trip_view(request):
+            router.db_for_write(Trip)
+            return HttpResponse()
+
+        def station_view(request):
+            reads.append(router.db_for_read(Station))
+            return HttpResponse()
+
+        reads = []
+        with mock.patch('cheapdrive_website.db_router.replica_configured', return_value=True):
+            self.assertIsNone(router.db_for_read(Trip))
+            ReplicaStickinessMiddleware(station_view)(request)
+            ReplicaStickinessMiddleware(update_trip_view)(request)
+            self.assertGreater(request.session[STICKY_SESSION_KEY], time.time())
+            ReplicaStickinessMiddleware(station_view)(request)
+        self.assertEqual(reads, ['replica', 'default'])
+
+
+class PriceSnapshotTests(TestCase):
+    """
+    Average fuel prices are computed in one query and then served from the in-process snapshot.
+    """
+
+    def test_averages_are_computed_once(self):
+        StationPrices.objects.create(brand_name="bp", pb95_price=Decimal("6.00"))
+        StationPrices.objects.create(brand_name="moya", pb95_price=Decimal("7.00"))
+
+        with self.assertNumQueries(1):
+            average_fuel_prices(refresh=True)
+            prices = average_fuel_prices()
+        self.assertEqual(prices["pb95_price"], Decimal("6.50"))
+        self.assertIsNone(prices["lpg_price"])
@@ -1,5 +1,4 @@
 
-from turtle import update
 from django.http import HttpRequest, HttpResponse
 from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect
@@ -8,14 +7,16 @@ from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 
-from refill.models import Trip
+from cheapdrive_website.query_budget import query_budget
+from refill.create_models import get_guest_id
 from .forms import UserRegistrationForm  
-from api_calls.other_api_calls import get_address_from_coords
+from .history import get_trip_history_page
 import logging
 from refill.calculate_consumption import calculate_form_fuel_consumption
 
 logger = logging.getLogger("my_logger")
 
+@query_budget(6)
 def register(request: HttpRequest) -> HttpResponse:
     """
     Handles user registration by displaying the registration form, validating 
@@ -39,6 +40,7 @@ def register(request: HttpRequest) -> HttpResponse:
         form = UserRegistrationForm()
     return render(request, 'entry/register.html', {'form': form})
 
+@query_budget(3)
 def visit(request: HttpRequest) -> HttpResponse:
     """
     Renders the 'visit' page.
@@ -51,6 +53,7 @@ def visit(request: HttpRequest) -> HttpResponse:
     """
     return render(request, 'entry/visit.html')
 
+@query_budget(8)
 def login_view(request: HttpRequest) -> HttpResponse:
     """
     Handles user authentication and login. If the user is authenticated, 
@@ -92,6 +95,7 @@ def login_view(request: HttpRequest) -> HttpResponse:
     response['Expires'] = '0'
     return response
 
+@query_budget(5)
 def logout_view(request: HttpRequest) -> HttpResponse:
     """
     Logs out the user and redirects them to the visit page with a success message.
@@ -106,10 +110,11 @@ def logout_view(request: HttpRequest) -> HttpResponse:
     messages.success(request, 'You have been logged out successfully.')
     return redirect('entry:visit')
 
+@query_budget(4)
 def guest_access(request: HttpRequest) -> HttpResponse:
     """
-    Grants guest access by setting a session flag and redirects to a guest 
-    data loading page.
+    Grants guest access by setting a session flag and a guest identifier (which
+    owns the guest's trips), and redirects to a guest data loading page.
     
     Args:
         request (HttpRequest): The HTTP request object.
@@ -118,8 +123,10 @@ def guest_access(request: HttpRequest) -> HttpResponse:
         HttpResponse: A redirect to the guest data page.
     """
     request.session['is_guest'] = True
+    get_guest_id(request.session)
     return redirect(f"{reverse('refill:load_data')}?vehicle_id=none&trip_id=none")
 
+@query_budget(4)
 @login_required(login_url='/login/')
 def logged_view(request: HttpRequest) -> HttpResponse:
     """
@@ -149,12 +156,13 @@ def logged_view(request: HttpRequest) -> HttpResponse:
     
     return render(request, 'entry/logged.html')
 
+@query_budget(6)
 @login_required(login_url='/login/')
 def trip_history_view(request: HttpRequest) -> HttpResponse:
     """
-    Displays the trip history for the logged-in user. It retrieves trips from 
-    the database and renders them with information such as distance, duration, 
-    and price.
+    Displays the trip history for the logged-in user. Trips are listed newest first, one page 
+    at a time, with distance, duration and price aggregated in the database. The `before` 
+    query parameter is the keyset cursor of the requested page.
     
     Args:
         request (HttpRequest): The HTTP request object.
@@ -162,23 +170,18 @@ def trip_history_view(request: HttpRequest) -> HttpResponse:
     Returns:
         HttpResponse: The rendered trip history page.
     """
-    trips = Trip.objects.filter(user=request.user).order_by('-first_trip_node_id')
-    
-    trip_data = [
-        {
-            'origin_address': trip.origin_address,
-            'destination_address': trip.destination_address,
-            'total_distance': trip.total_distance(),
-            'total_duration': trip.total_duration(),
-            'total_price': trip.total_price_bought_and_used()[1],
-            'currency': trip.main_currency(),
-            'trip_id': trip.id,
-        }
-        for trip in trips
-    ]
+    before_param = request.GET.get('before')
+    before = int(before_param) if before_param and before_param.isdigit() else None
+
+    trip_data, next_before = get_trip_history_page(request.user.id, before)
     
-    return render(request, 'entry/trip_history.html', {'trip_data': trip_data})
+    return render(request, 'entry/trip_history.html', {
+        'trip_data': trip_data,
+        'next_before': next_before,
+        'is_first_page': before is None,
+    })
 
+@query_budget(4)
 @login_required(login_url='/login/')
 def user_vehicles_view(request: HttpRequest) -> HttpResponse:
     """
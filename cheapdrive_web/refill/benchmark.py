@@ -0,0 +1,304 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+import numpy as np
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.db.backends.signals import connection_created
+
+from api_calls import api_calculations, google_api_calls
+from cache.models import Cache
+from entry.models import Station
+from .create_models import create_trip_async, create_vehicle
+from .gas_station_looker import calculate_distance
+from .models import Trip
+from .trip_planner import plan_routes
+import logging
+
+logger = logging.getLogger("my_logger")
+
+BENCHMARK_DATA_DIR = os.path.join(os.path.dirname(__file__), "benchmark_data")
+CORPUS_PATH = os.path.join(BENCHMARK_DATA_DIR, "corpus.json")
+FIXTURES_PATH = os.path.join(BENCHMARK_DATA_DIR, "api_fixtures.json")
+BASELINE_PATH = os.path.join(BENCHMARK_DATA_DIR, "baseline.json")
+
+# Road model used to synthesize responses that were never recorded.
+ROAD_FACTOR = 1.25
+FAKE_SPEED_KMH = 85.0
+
+
+def load_corpus(path: str = CORPUS_PATH) -> Dict[str, Any]:
+    """
+    Loads the benchmark corpus: city coordinates, city pairs, vehicle profiles and the station grid.
+    """
+    with open(path, encoding="utf-8") as corpus_file:
+        return json.load(corpus_file)
+
+
+def seed_stations(grid: Dict[str, float]) -> int:
+    """
+    Fills the station table with a regular grid of stations, so that plans do not depend on live data.
+
+    Args:
+        grid: Bounding box (min_lon, max_lon, min_lat, max_lat) and step in degrees.
+
+    Returns:
+        int: The number of created stations.
+    """
+    lons = np.arange(grid["min_lon"], grid["max_lon"], grid["step"])
+    lats = np.arange(grid["min_lat"], grid["max_lat"], grid["step"])
+    stations = [
+        Station(address=f"Benchmark station {lat:.2f} {lon:.2f}", location=Point(float(lon), float(lat), srid=4326))
+        for lon in lons for lat in lats
+    ]
+    Station.objects.bulk_create(stations, batch_size=1000)
+    return len(stations)
+
+
+class ReplayAPI:
+    """
+    Serves the external API calls of trip creation and planning from recorded responses.
+
+    Responses missing from the fixtures are fetched from the real API and recorded when `record` is set,
+    and synthesized from straight-line geometry (ROAD_FACTOR, FAKE_SPEED_KMH) otherwise. Calls are
+    counted per service, synthesized responses in `synthesized`.
+    """
+
+    def __init__(self, cities: Dict[str, List[float]], fixtures_path: str = FIXTURES_PATH, record: bool = False):
+        self.cities = cities
+        self.fixtures_path = fixtures_path
+        self.record = record
+        self.calls: Counter = Counter()
+        self.synthesized = 0
+        self._lock = threading.Lock()
+        self._responses: Dict[str, Any] = {}
+        if os.path.exists(fixtures_path):
+            with open(fixtures_path, encoding="utf-8") as fixtures_file:
+                self._responses = json.load(fixtures_file)
+
+    def save(self) -> None:
+        """
+        Writes the recorded responses back to the fixtures file.
+        """
+        with open(self.fixtures_path, "w", encoding="utf-8") as fixtures_file:
+            json.dump(self._responses, fixtures_file, indent=1, sort_keys=True)
+
+    def _lat_lon(self, location: Any) -> Tuple[float, float]:
+        """
+        Resolves a city name or a (latitude, longitude) pair to a (latitude, longitude) pair.
+        """
+        if isinstance(location, (tuple, list)):
+            return float(location[0]), float(location[1])
+        lon, lat = self.cities[location]
+        return lat, lon
+
+    def _fake_distance(self, origin: Any, destination: Any) -> List[float]:
+        (origin_lat, origin_lon), (dest_lat, dest_lon) = self._lat_lon(origin), self._lat_lon(destination)
+        distance = calculate_distance(origin_lat, origin_lon, dest_lat, dest_lon) * ROAD_FACTOR
+        return [round(distance, 3), round(distance / FAKE_SPEED_KMH * 60, 3)]
+
+    def _fake_validation(self, origin: str, destination: str) -> List[Any]:
+        return self._fake_distance(origin, destination) + [origin, destination]
+
+    def _fake_geocode(self, address: str, param: str = None) -> List[float]:
+        return list(self.cities[address])
+
+    def _fake_polyline(self, origin: Any, destination: Any) -> List[List[float]]:
+        (origin_lat, origin_lon), (dest_lat, dest_lon) = self._lat_lon(origin), self._lat_lon(destination)
+        return [
+            [origin_lat + (dest_lat - origin_lat) * step / 10, origin_lon + (dest_lon - origin_lon) * step / 10]
+            for step in range(11)
+        ]
+
+    def _lookup(self, service: str, args: Tuple[Any, ...]) -> Tuple[str, Any]:
+        key = json.dumps([service] + [list(arg) if isinstance(arg, tuple) else arg for arg in args])
+        with self._lock:
+            self.calls[service] += 1
+            return key, self._responses.get(key)
+
+    def _store(self, key: str, response: Any) -> Any:
+        response = json.loads(json.dumps(response))
+        with self._lock:
+            if self.record:
+                self._responses[key] = response
+            else:
+                self.synthesized += 1
+        return response
+
+    def _replay(self, service: str, real: Callable, fake: Callable) -> Callable:
+        """
+        Builds the stand-in for one external API function.
+        """
+        def call(*args):
+            key, response = self._lookup(service, args)
+            if response is not None:
+                return response
+            return self._store(key, real(*args) if self.record else fake(*args))
+        return call
+
+    def _replay_async(self, service: str, real: Callable, fake: Callable) -> Callable:
+        """
+        Builds the stand-in for one async external API function; it shares fixtures with the sync one.
+        """
+        async def call(*args):
+            key, response = self._lookup(service, args)
+            if response is not None:
+                return response
+            return self._store(key, await real(*args) if self.record else fake(*args))
+        return call
+
+    @contextmanager
+    def patched(self) -> Iterator["ReplayAPI"]:
+        """
+        Replaces the Google and Nominatim calls made by trip creation (the async path used by the
+        views) and planning with replayed responses.
+        """
+        async_targets = [
+            ("refill.create_models.address_validation_and_distance_async", "google_distance_matrix",
+             google_api_calls.address_validation_and_distance_async, self._fake_validation),
+            ("refill.create_models.get_coordinates_async", "nominatim_search",
+             api_calculations.get_coordinates_async, self._fake_geocode),
+        ]
+        targets = [
+            ("refill.route_choice.distance_gmaps", "google_distance_matrix",
+             google_api_calls.distance_gmaps, self._fake_distance),
+            ("refill.route_corridor.route_polyline", "google_directions",
+             google_api_calls.route_polyline, self._fake_polyline),
+        ]
+        with ExitStack() as stack:
+            for target, service, real, fake in async_targets:
+                stack.enter_context(mock.patch(target, new=self._replay_async(service, real, fake)))
+            for target, service, real, fake in targets:
+                stack.enter_context(mock.patch(target, new=self._replay(service, real, fake)))
+            yield self
+
+
+class QueryCounter:
+    """
+    Counts the SQL queries executed on every database connection, including the ones opened by
+    worker threads while the counter is installed.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def installed(self) -> Iterator["QueryCounter"]:
+        def on_connection_created(sender, connection, **kwargs):
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+        connection_created.connect(on_connection_created, weak=False)
+        try:
+            with connection.execute_wrapper(self):
+                yield self
+        finally:
+            connection_created.disconnect(on_connection_created)
+
+
+def run_scenario(api: ReplayAPI, origin: str, destination: str, vehicle: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Creates a trip the way the load data view does (create_trip_async) and plans its refuelling
+    routes once, starting from an empty segment cache.
+
+    Args:
+        api: The ReplayAPI whose patches are active.
+        origin: Origin city name.
+        destination: Destination city name.
+        vehicle: Vehicle profile from the corpus.
+
+    Returns:
+        dict: Elapsed seconds, executed queries, external calls and whether routes were found.
+    """
+    Cache.objects.all().delete()
+    counter = QueryCounter()
+    calls_before = sum(api.calls.values())
+
+    start = time.perf_counter()
+    with counter.installed():
+        vehicle_id = create_vehicle(
+            vehicle["tank_size"], vehicle["fuel_type"], vehicle["driving_conditions"], Decimal(str(vehicle["fuel_consumption"]))
+        )
+        trip_id = async_to_sync(create_trip_async)(
+            origin, destination, "PLN", None, "benchmark", vehicle_id, Decimal(str(vehicle["cur_fuel"])), Decimal("6.50")
+        )
+        trip = Trip.objects.select_related("first_trip_node", "vehicle").get(id=trip_id)
+        result = plan_routes(trip, trip.vehicle)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seconds": elapsed,
+        "queries": counter.count,
+        "external_calls": sum(api.calls.values()) - calls_before,
+        "routes_found": result is not None,
+    }
+
+
+def benchmark_scenario(
+    api: ReplayAPI, origin: str, destination: str, vehicle: Dict[str, Any], repeat: int
+) -> Dict[str, Any]:
+    """
+    Runs a scenario `repeat` times for latency and once more under tracemalloc for peak memory.
+
+    Returns:
+        dict: p50/p95 latency (ms), query and external call counts, peak traced memory (KiB), routes_found.
+    """
+    runs = [run_scenario(api, origin, destination, vehicle) for _ in range(repeat)]
+    latencies_ms = np.array([run["seconds"] for run in runs]) * 1000
+
+    tracemalloc.start()
+    try:
+        run_scenario(api, origin, destination, vehicle)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 2),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 2),
+        "queries": max(run["queries"] for run in runs),
+        "external_calls": max(run["external_calls"] for run in runs),
+        "peak_kib": round(peak / 1024, 1),
+        "routes_found": all(run["routes_found"] for run in runs),
+    }
+
+
+def compare_with_baseline(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float
+) -> List[str]:
+    """
+    Lists the regressions of `results` against a saved baseline. Latency and memory may grow by
+    `tolerance` (a fraction); query and external call counts may not grow at all.
+
+    Returns:
+        list: Human-readable descriptions of the regressions.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference: Optional[Dict[str, Any]] = baseline.get(name)
+        if reference is None:
+            continue
+        for metric in ("p95_ms", "peak_kib"):
+            if result[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {result[metric]} > {reference[metric]} (+{tolerance:.0%})")
+        for metric in ("queries", "external_calls"):
+            if result[metric] > reference[metric]:
+                regressions.append(f"{name}: {metric} {result[metric]} > {reference[metric]}")
+        if reference["routes_found"] and not result["routes_found"]:
+            regressions.append(f"{name}: no routes found")
+    return regressions
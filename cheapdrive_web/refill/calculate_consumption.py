@@ -1,4 +1,149 @@
 from decimal import Decimal
+from functools import lru_cache
+import math
+from typing import List
+
+import numpy as np
+
+
+class ConsumptionCurve:
+    """
+    Speed to fuel consumption adjustment factor curve of one coefficient set (vehicle profile).
+
+    The piecewise quadratic is tabulated once at integer km/h buckets up to `max_speed`; factors are
+    read from the table with linear interpolation, which is exact at the optimal speed thresholds.
+    Between buckets the interpolation error is at most alpha / (4 * v_optimal ** 2), about 1.1e-4 for
+    the default coefficients. Faster speeds fall back to the formula. Use get_consumption_curve to share instances.
+    """
+
+    def __init__(
+        self,
+        v_optimal_1: float = 60,
+        v_optimal_2: float = 70,
+        alpha_1: float = 1.6,
+        alpha_2: float = 0.9,
+        max_speed: int = 250
+    ) -> None:
+        self.v_optimal_1 = v_optimal_1
+        self.v_optimal_2 = v_optimal_2
+        self.alpha_1 = alpha_1
+        self.alpha_2 = alpha_2
+        self.max_speed = max_speed
+        self.table: np.ndarray = self._formula(np.arange(max_speed + 1, dtype=float))
+        self._values: List[float] = self.table.tolist()
+
+    def _formula(self, speeds: np.ndarray) -> np.ndarray:
+        """
+        Evaluates the piecewise quadratic directly.
+
+        Args:
+            speeds (np.ndarray): Speeds of the vehicle (any shape).
+
+        Returns:
+            np.ndarray: The adjustment factors, with the same shape as `speeds`.
+        """
+        below = 1 + self.alpha_1 * (speeds - self.v_optimal_1) ** 2 / self.v_optimal_1 ** 2
+        above = 1 + self.alpha_2 * (speeds - self.v_optimal_2) ** 2 / self.v_optimal_2 ** 2
+        return np.where(speeds < self.v_optimal_1, below, np.where(speeds > self.v_optimal_2, above, 1.0))
+
+    def factor(self, v: float) -> float:
+        """
+        Returns the adjustment factor for a single speed.
+
+        Args:
+            v (float): The current speed of the vehicle.
+
+        Returns:
+            float: The fuel consumption adjustment factor; NaN if the speed is not finite.
+        """
+        v = float(v)
+        if not math.isfinite(v):
+            return math.nan
+        v = max(v, 0.0)
+        if v >= self.max_speed:
+            return 1 + self.alpha_2 * (v - self.v_optimal_2) ** 2 / self.v_optimal_2 ** 2
+        bucket = int(v)
+        low = self._values[bucket]
+        return low + (self._values[bucket + 1] - low) * (v - bucket)
+
+    def factors(self, speeds: np.ndarray) -> np.ndarray:
+        """
+        Returns the adjustment factors of many speeds at once.
+
+        Args:
+            speeds (np.ndarray): Speeds of the vehicle (any shape).
+
+        Returns:
+            np.ndarray: The adjustment factors, with the same shape as `speeds`; NaN where the speed
+            is not finite, as in `factor`.
+        """
+        speeds = np.asarray(speeds, dtype=float)
+        factors = np.interp(speeds, np.arange(self.max_speed + 1), self.table)
+        factors = np.where(speeds > self.max_speed, self._formula(speeds), factors)
+        return np.where(np.isfinite(speeds), factors, np.nan)
+
+
+@lru_cache(maxsize=32)
+def get_consumption_curve(
+    v_optimal_1: float = 60,
+    v_optimal_2: float = 70,
+    alpha_1: float = 1.6,
+    alpha_2: float = 0.9
+) -> ConsumptionCurve:
+    """
+    Returns the shared ConsumptionCurve of a coefficient set, building its table on first use.
+
+    Args:
+        v_optimal_1 (float, optional): Lower optimal speed threshold. Defaults to 60.
+        v_optimal_2 (float, optional): Upper optimal speed threshold. Defaults to 70.
+        alpha_1 (float, optional): Adjustment coefficient for speeds below v_optimal_1. Defaults to 1.6.
+        alpha_2 (float, optional): Adjustment coefficient for speeds above v_optimal_2. Defaults to 0.9.
+
+    Returns:
+        ConsumptionCurve: The cached curve.
+    """
+    return ConsumptionCurve(v_optimal_1, v_optimal_2, alpha_1, alpha_2)
+
+def estimate_fuel_consumption_factor(
+    v: float,
+    v_optimal_1: float = 60,
+    v_optimal_2: float = 70,
+    alpha_1: float = 1.6,
+    alpha_2: float = 0.9
+) -> float:
+    """
+    Float version of estimate_fuel_consumption, used by the planning engine.
+
+    Args:
+        v (float): The current speed of the vehicle.
+        v_optimal_1 (float, optional): Lower optimal speed threshold. Defaults to 60.
+        v_optimal_2 (float, optional): Upper optimal speed threshold. Defaults to 70.
+        alpha_1 (float, optional): Adjustment coefficient for speeds below v_optimal_1. Defaults to 1.6.
+        alpha_2 (float, optional): Adjustment coefficient for speeds above v_optimal_2. Defaults to 0.9.
+    
+    Returns:
+        float: The fuel consumption adjustment factor.
+    """
+    return get_consumption_curve(v_optimal_1, v_optimal_2, alpha_1, alpha_2).factor(v)
+
+def estimate_fuel_consumption_array(
+    speeds: np.ndarray,
+    v_optimal_1: float = 60,
+    v_optimal_2: float = 70,
+    alpha_1: float = 1.6,
+    alpha_2: float = 0.9
+) -> np.ndarray:
+    """
+    Vectorized estimate_fuel_consumption_factor: computes the adjustment factors of many speeds at once.
+
+    Args:
+        speeds (np.ndarray): Speeds of the vehicle (any shape).
+        v_optimal_1, v_optimal_2, alpha_1, alpha_2: See estimate_fuel_consumption_factor.
+
+    Returns:
+        np.ndarray: The adjustment factors, with the same shape as `speeds`.
+    """
+    return get_consumption_curve(v_optimal_1, v_optimal_2, alpha_1, alpha_2).factors(speeds)
 
 def estimate_fuel_consumption(
     v: float,
@@ -10,6 +155,7 @@ def estimate_fuel_consumption(
     """
     Estimate the fuel consumption adjustment factor based on the speed of the vehicle.
     The adjustment factor depends on whether the current speed is below, within, or above the optimal speed range.
+    This Decimal version is meant for model arithmetic; the planning engine uses estimate_fuel_consumption_factor.
 
     Args:
         v (float): The current speed of the vehicle.
@@ -21,16 +167,8 @@ def estimate_fuel_consumption(
     Returns:
         Decimal: The fuel consumption adjustment factor.
     """
-    # Ensure the speed is a float.
-    v = float(v)
-    if v < v_optimal_1:
-        adjustment_factor = 1 + alpha_1 * ((abs(v - v_optimal_1)) ** 2 / v_optimal_1 ** 2)
-        return Decimal(adjustment_factor)
-    elif v > v_optimal_2:
-        adjustment_factor = 1 + alpha_2 * ((abs(v - v_optimal_2)) ** 2 / v_optimal_2 ** 2)
-        return Decimal(adjustment_factor)
-    else:
-        return Decimal("1.0")
+    factor = get_consumption_curve(v_optimal_1, v_optimal_2, alpha_1, alpha_2).factor(v)
+    return Decimal("1.0") if factor == 1.0 else Decimal(factor)
 
 def calculate_real_fuel_consumption(driving_conditions: str, fuel_consumption: float) -> float:
     """
@@ -1,16 +1,40 @@
-from api_calls.google_api_calls import address_validation_and_distance
+import asyncio
+from asgiref.sync import sync_to_async
+from api_calls.google_api_calls import address_validation_and_distance, address_validation_and_distance_async
 from api_calls.api_exceptions import AddressError
-from api_calls.api_calculations import get_coordinates
+from api_calls.api_calculations import get_coordinates, get_coordinates_async
+from api_calls.async_client import async_client_scope
 from .calculate_consumption import calculate_real_fuel_consumption
 from .models import VehicleData, Trip, TripNode
+from entry.history import invalidate_trip_history
 from django.core.exceptions import ValidationError
 from django.contrib.gis.geos import Point
 from django.db import transaction
 import logging
 from decimal import Decimal
+from uuid import uuid4
 
 logger = logging.getLogger("my_logger")
 
+GUEST_ID_SESSION_KEY = 'guest_id'
+
+
+def get_guest_id(session) -> str:
+    """
+    Returns the guest identifier stored in the session, creating it on first use.
+    The session key itself is not used: with signed cookie sessions it is the whole cookie
+    payload, which changes whenever the session data does.
+
+    Args:
+        session: The request session.
+
+    Returns:
+        str: A random 32-character identifier, stable for the lifetime of the session.
+    """
+    if GUEST_ID_SESSION_KEY not in session:
+        session[GUEST_ID_SESSION_KEY] = uuid4().hex
+    return session[GUEST_ID_SESSION_KEY]
+
 def create_node(origin, destination, distance: Decimal, duration: Decimal, currency: str,
                 price: Decimal, fuel_refilled: Decimal, station_id: int = None):
     """
@@ -85,42 +109,101 @@ def create_trip(origin: str, destination: str, currency: str, user, guest_id: st
             # Obtain geographic coordinates and create GIS Points.
             origin_coords = get_coordinates(origin)
             destination_coords = get_coordinates(destination)
-            origin_location = Point(*origin_coords)         # (longitude, latitude)
-            destination_location = Point(*destination_coords) # (longitude, latitude)
         except Exception as e:
             logger.debug(f"Error fetching coordinates: {e}")
             return None
     
-        # Use an atomic transaction to ensure database consistency.
-        with transaction.atomic():
-            first_node = TripNode.objects.create(
-                origin=origin_location,
-                destination=destination_location,
-                distance=trip_distance,
-                currency=currency,
-                duration=trip_duration,
-                fuel_refilled=cur_fuel,
-                bought_gas_price=price_of_fuel,
-            )
-    
-            # Lock the vehicle row for update.
-            vehicle = VehicleData.objects.select_for_update().get(pk=vehicle_id)
-    
-            trip = Trip.objects.create(
-                origin_address=corrected_origin,
-                destination_address=corrected_destination,
-                user=user,
-                guest_session_id=guest_id,
-                first_trip_node=first_node,
-                vehicle=vehicle,
-            )
-    
-        return trip.id
+        return _save_trip(
+            corrected_origin, corrected_destination, origin_coords, destination_coords, trip_distance,
+            trip_duration, currency, user, guest_id, vehicle_id, cur_fuel, price_of_fuel
+        )
     
     except (AddressError, ValidationError) as e:
         raise e
 
 
+async def create_trip_async(origin: str, destination: str, currency: str, user, guest_id: str,
+                            vehicle_id: int, cur_fuel: Decimal, price_of_fuel: Decimal) -> int:
+    """
+    Async variant of create_trip. Address validation and both geocoding requests are issued
+    concurrently with asyncio.gather on one HTTP client; the database writes then run in a worker thread.
+
+    Args:
+        Same as create_trip.
+
+    Returns:
+        int: The ID of the created Trip, or None if the coordinates could not be fetched.
+
+    Raises:
+        AddressError: If address validation fails or external APIs cannot calculate trip details.
+        ValidationError: If model validation fails.
+        ValueError: If trip details cannot be determined (e.g., no distance or duration).
+    """
+    # The client is closed before returning: under WSGI each call runs on its own event loop.
+    async with async_client_scope():
+        validation, origin_coords, destination_coords = await asyncio.gather(
+            address_validation_and_distance_async(origin, destination),
+            get_coordinates_async(origin),
+            get_coordinates_async(destination),
+            return_exceptions=True,
+        )
+    # Address validation errors take precedence, as in create_trip.
+    if isinstance(validation, BaseException):
+        raise validation
+    trip_distance, trip_duration, corrected_origin, corrected_destination = validation
+    if trip_distance is None or trip_duration is None:
+        raise ValueError("Failed to calculate trip details.")
+    for coords in (origin_coords, destination_coords):
+        if isinstance(coords, BaseException):
+            logger.debug(f"Error fetching coordinates: {coords}")
+            return None
+
+    return await sync_to_async(_save_trip)(
+        corrected_origin, corrected_destination, origin_coords, destination_coords, trip_distance,
+        trip_duration, currency, user, guest_id, vehicle_id, cur_fuel, price_of_fuel
+    )
+
+
+def _save_trip(corrected_origin: str, corrected_destination: str, origin_coords: tuple, destination_coords: tuple,
+               trip_distance: float, trip_duration: float, currency: str, user, guest_id: str,
+               vehicle_id: int, cur_fuel: Decimal, price_of_fuel: Decimal) -> int:
+    """
+    Stores a validated trip and its first TripNode in one atomic transaction.
+
+    Returns:
+        int: The ID of the created Trip.
+    """
+    origin_location = Point(*origin_coords)         # (longitude, latitude)
+    destination_location = Point(*destination_coords) # (longitude, latitude)
+
+    # Use an atomic transaction to ensure database consistency.
+    with transaction.atomic():
+        first_node = TripNode.objects.create(
+            origin=origin_location,
+            destination=destination_location,
+            distance=trip_distance,
+            currency=currency,
+            duration=trip_duration,
+            fuel_refilled=cur_fuel,
+            bought_gas_price=price_of_fuel,
+        )
+
+        # Lock the vehicle row for update.
+        vehicle = VehicleData.objects.select_for_update().get(pk=vehicle_id)
+
+        trip = Trip.objects.create(
+            origin_address=corrected_origin,
+            destination_address=corrected_destination,
+            user=user,
+            guest_session_id=guest_id,
+            first_trip_node=first_node,
+            vehicle=vehicle,
+        )
+    invalidate_trip_history(trip.user_id)
+
+    return trip.id
+
+
 def create_vehicle(tank_size: float, fuel_type: str, driving_conditions: str, form_fuel_consumption: Decimal) -> int:
     """
     Create a new VehicleData instance with the given parameters.
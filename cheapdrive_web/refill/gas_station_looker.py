@@ -1,52 +1,16 @@
-from typing import List, Optional, Tuple, Union,Set
-import time
+from typing import List, Optional, Tuple, Set
 import math
-from concurrent.futures import ThreadPoolExecutor
-from django.contrib.gis.measure import D
-from django.contrib.gis.geos import Point
-from api_calls.api_calculations import get_coordinates
+from django.conf import settings
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.geos import LineString, Point
 from entry.models import Station
+from .planning_spans import span
 import logging
 
 logger = logging.getLogger("my_logger")
 
-
-def calculate_perpendicular_distance(
-    lat1: float, lon1: float,
-    lat2: float, lon2: float,
-    lat3: float, lon3: float
-) -> float:
-    """
-    Calculates the perpendicular distance (in kilometers) from a point (lat3, lon3)
-    to the line defined by two points (lat1, lon1) and (lat2, lon2).
-
-    The function converts all coordinates to radians, computes the cross product
-    of the vectors defined by the line and the vector from the first point to the third,
-    and then scales the result by Earth's radius (6371 km).
-
-    Args:
-        lat1, lon1: Coordinates of the first point defining the line.
-        lat2, lon2: Coordinates of the second point defining the line.
-        lat3, lon3: Coordinates of the point to which the perpendicular distance is calculated.
-
-    Returns:
-        float: The perpendicular distance in kilometers.
-    """
-    # Convert all coordinates from degrees to radians.
-    lat1, lon1, lat2, lon2, lat3, lon3 = map(math.radians, [lat1, lon1, lat2, lon2, lat3, lon3])
-    
-    # Compute vector differences.
-    dx12 = lon2 - lon1
-    dy12 = lat2 - lat1
-    dx13 = lon3 - lon1
-    dy13 = lat3 - lat1
-
-    # Compute the magnitude of the cross product (area of parallelogram formed).
-    cross_product = abs(dx12 * dy13 - dy12 * dx13)
-    denominator = math.sqrt(dx12**2 + dy12**2)
-
-    # Return the perpendicular distance (scaled by Earth's radius: 6371 km).
-    return (cross_product / denominator) * 6371
+# Number of stations kept for the relaxation branch of find_best_gas_stations.
+RELAXATION_CANDIDATES = 20
 
 
 def calculate_distance(
@@ -76,162 +40,174 @@ def calculate_distance(
     return 6371.0 * c
 
 
-def find_gas_within_range(
-    origin_point: Tuple[float, float],
-    destination_point: Tuple[float, float],
+def _as_point(coords: Tuple[float, float]) -> Point:
+    """
+    Builds a WGS84 point from a (longitude, latitude) pair, the order used by the station search.
+    """
+    return Point(coords[0], coords[1], srid=4326)
+
+
+def detour_radius_km(origin: Tuple[float, float], destination: Tuple[float, float]) -> float:
+    """
+    Returns the acceptable detour radius around the straight origin-destination line:
+    the larger of one-quarter of the straight-line distance or 10 kilometers.
+
+    Args:
+        origin: Tuple (longitude, latitude) for the route's origin.
+        destination: Tuple (longitude, latitude) for the route's destination.
+
+    Returns:
+        float: The radius in kilometers.
+    """
+    return max(calculate_distance(origin[1], origin[0], destination[1], destination[0]) / 4, 10)
+
+
+def stations_in_range(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
     estimated_range: float,
     full_tank_range: float
-) -> Union[List[Tuple[int, any]], List]:
+):
     """
-    Finds gas stations within an estimated range from the origin that are also within the 
-    full-tank range from the destination.
-
-    The function queries for stations whose location is within the estimated range of the origin.
-    Then it filters those stations by checking that the distance from the destination does not
-    exceed the full_tank_range. If no stations qualify, it returns a failure signal along with
-    all stations found within the estimated range.
+    Returns a queryset of the gas stations within the estimated range from the origin that are also within
+    the full-tank range from the destination. Both predicates are ST_DWithin calls served by the GiST
+    index on Station.location (distances on the geography column are in meters).
 
     Args:
-        origin_point: Tuple containing (latitude, longitude) for the origin.
-        destination_point: Tuple containing (latitude, longitude) for the destination.
+        origin: Tuple (longitude, latitude) for the origin.
+        destination: Tuple (longitude, latitude) for the destination.
         estimated_range: Search range in kilometers from the origin.
         full_tank_range: Maximum distance in kilometers the vehicle can travel on a full tank.
 
     Returns:
-        List of station tuples (station_id, station_obj) if criteria are met;
-        otherwise, returns a list where the first element is the string "failure" and the second
-        is the list of stations found within the estimated range.
+        QuerySet: The matching stations.
     """
-    origin_lat, origin_lon = origin_point
-    dest_lat, dest_lon = destination_point
-
-    # Build a Point object for the origin.
-    origin = Point(origin_lat, origin_lon)
-    
-    # Query stations within the estimated range (in km) from the origin.
-    stations_within_range = list(
-        Station.objects.filter(
-            location__distance_lte=(origin, D(km=estimated_range))
-        ).values_list("id", "location")
+    return Station.objects.filter(
+        location__dwithin=(_as_point(origin), estimated_range * 1000)
+    ).filter(
+        location__dwithin=(_as_point(destination), full_tank_range * 1000)
     )
-    
-    # Filter stations by checking if their distance to the destination is within full_tank_range.
-    qualified_stations = [
-        station for station in stations_within_range
-        if calculate_distance(dest_lat, dest_lon, station[1].x, station[1].y) <= full_tank_range
-    ]
-    
-    if not qualified_stations:
-        # Return a failure signal along with all stations found if no station qualifies.
-        return ["failure", stations_within_range]
-    
-    return qualified_stations
 
 
-def find_gas_near_route(
-    stations: List[Tuple[int, any]],
+def near_route_queryset(
     origin: Tuple[float, float],
-    destination: Tuple[float, float]
-) -> List[Tuple[int, any]]:
+    destination: Tuple[float, float],
+    estimated_range: float,
+    full_tank_range: float,
+    excluded_ids: Set[int],
+    corridor: Optional[LineString] = None
+):
     """
-    Filters a list of gas stations to those located near the straight-line route between
-    the origin and destination.
-
-    A station is considered "near the route" if its perpendicular distance from the straight-line
-    path is less than or equal to an acceptable detour radius, defined as the larger of one-quarter
-    of the total route distance or 10 kilometers.
+    Builds the query behind find_gas_near_route: stations in range and near the route, annotated with
+    their detour distance and ordered by it.
 
     Args:
-        stations: List of station tuples (station_id, station_obj).
-        origin: Tuple (latitude, longitude) for the route's origin.
-        destination: Tuple (latitude, longitude) for the route's destination.
+        See find_gas_near_route.
 
     Returns:
-        List of station tuples that are near the route.
+        QuerySet: The candidate stations.
     """
-    origin_lat, origin_lon = origin
-    dest_lat, dest_lon = destination
-
-    # Compute the acceptable detour radius.
-    route_distance = calculate_distance(origin_lat, origin_lon, dest_lat, dest_lon)
-    detour_radius_km = max(route_distance / 4, 10)
-
-    near_route = []
-    for station in stations:
-        # Calculate the perpendicular distance from the station to the route.
-        perp_distance = calculate_perpendicular_distance(
-            origin_lat, origin_lon, dest_lat, dest_lon,
-            station[1].x, station[1].y
-        )
-        if perp_distance <= detour_radius_km:
-            near_route.append(station)
-    return near_route
+    origin_point = _as_point(origin)
+    destination_point = _as_point(destination)
+    if corridor is not None:
+        route_line, radius_km = corridor, settings.ROUTE_CORRIDOR_WIDTH_KM
+    else:
+        route_line, radius_km = LineString(origin_point, destination_point, srid=4326), detour_radius_km(origin, destination)
+
+    return (
+        stations_in_range(origin, destination, estimated_range, full_tank_range)
+        .filter(location__dwithin=(route_line, radius_km * 1000))
+        .exclude(id__in=excluded_ids)
+        .annotate(detour=Distance("location", origin_point) + Distance("location", destination_point))
+        .order_by("detour")
+    )
 
 
-def sort_stations_by_distance(
-    dest_lat: float,
-    dest_lon: float,
-    stations_within_range: List[Tuple[int, any]]
-) -> List[Tuple[int, any]]:
+def find_gas_near_route(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    estimated_range: float,
+    full_tank_range: float,
+    excluded_ids: Set[int],
+    limit: int,
+    corridor: Optional[LineString] = None
+) -> List[Tuple[Tuple[int, Point], float]]:
     """
-    Sorts a list of gas stations in ascending order based on their distance to the destination.
+    Finds the stations in range (see stations_in_range) that lie near the route, ordered by the total
+    distance of the detour through them, with a single query.
 
-    This function computes the distance from each station to the destination in parallel
-    and then sorts the stations accordingly.
+    A station is near the route if it lies within the detour radius (see detour_radius_km) of the straight
+    origin-destination line, or within ROUTE_CORRIDOR_WIDTH_KM of the driving route if a corridor is given.
 
     Args:
-        dest_lat: Latitude of the destination.
-        dest_lon: Longitude of the destination.
-        stations_within_range: List of station tuples (station_id, station_obj).
+        origin: Tuple (longitude, latitude) for the route's origin.
+        destination: Tuple (longitude, latitude) for the route's destination.
+        estimated_range: Search range in kilometers from the origin.
+        full_tank_range: Maximum distance in kilometers the vehicle can travel on a full tank.
+        excluded_ids: IDs of stations that must not be returned.
+        limit: Maximum number of stations to return.
+        corridor: Optional route line returned by get_route_corridor.
 
     Returns:
-        List of station tuples sorted by increasing distance from the destination.
+        List of ((station_id, location), detour_km) pairs, shortest detour first.
     """
-    if not stations_within_range:
-        return []
+    with span("station_query"):
+        candidates = list(near_route_queryset(
+            origin, destination, estimated_range, full_tank_range, excluded_ids, corridor
+        ).values_list("id", "location", "detour")[:limit])
+    return [((station_id, location), detour.km) for station_id, location, detour in candidates]
 
-    # Use a thread pool to calculate distances concurrently.
-    with ThreadPoolExecutor() as executor:
-        distances = list(executor.map(
-            lambda station: calculate_distance(dest_lat, dest_lon, station[1].x, station[1].y),
-            stations_within_range
-        ))
-    # Pair each station with its computed distance.
-    stations_with_distance = list(zip(stations_within_range, distances))
-    
-    # Sort stations based on the computed distance.
-    sorted_stations = sorted(stations_with_distance, key=lambda x: x[1])
-    
-    # Return only the station tuples.
-    return [station for station, _ in sorted_stations]
 
-from typing import List, Optional, Tuple, Union, Set
-from concurrent.futures import ThreadPoolExecutor
-import logging
+def reachable_stations_queryset(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    estimated_range: float,
+    excluded_ids: Set[int]
+):
+    """
+    Builds the query behind find_reachable_stations: stations in range of the origin, closest to the
+    destination first.
 
-logger = logging.getLogger("my_logger")
+    Args:
+        See find_reachable_stations.
+
+    Returns:
+        QuerySet: The reachable stations.
+    """
+    return (
+        Station.objects.filter(location__dwithin=(_as_point(origin), estimated_range * 1000))
+        .exclude(id__in=excluded_ids)
+        .order_by(Distance("location", _as_point(destination)))
+    )
 
-# Assume that these helper functions are already defined:
-# - find_gas_within_range(origin, destination, estimated_range, full_tank_range)
-# - sort_stations_by_distance(dest_lat, dest_lon, stations_list)
-# - find_gas_near_route(stations, origin, destination)
-# - calculate_distance(lat1, lon1, lat2, lon2)
 
-def filter_bad_start_stations(
-    stations: List[Tuple[int, any]], 
-    stations_not_to_start_with: Set[int]
-) -> List[Tuple[int, any]]:
+def find_reachable_stations(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    estimated_range: float,
+    excluded_ids: Set[int],
+    limit: int
+) -> List[Tuple[int, Point]]:
     """
-    Filters out stations whose ID is in the set stations_not_to_start_with.
-    
+    Finds the stations within the estimated range from the origin that are closest to the destination,
+    used when no station in range can reach the destination on a full tank.
+    The ordering is a distance to a constant point, which PostGIS serves with a KNN (<->) index scan.
+
     Args:
-        stations: A list of station tuples (station_id, station_obj).
-        stations_not_to_start_with: A set of station IDs that should not be used as the starting station.
-        
+        origin: Tuple (longitude, latitude) for the origin.
+        destination: Tuple (longitude, latitude) for the destination.
+        estimated_range: Search range in kilometers from the origin.
+        excluded_ids: IDs of stations that must not be returned.
+        limit: Maximum number of stations to return.
+
     Returns:
-        A list of station tuples that are not in the exclusion set.
+        List of station tuples (station_id, location) sorted by increasing distance from the destination.
     """
-    return [station for station in stations if station[0] not in stations_not_to_start_with]
+    with span("station_query"):
+        return list(
+            reachable_stations_queryset(origin, destination, estimated_range, excluded_ids)
+            .values_list("id", "location")[:limit]
+        )
 
 
 def find_best_gas_stations(
@@ -245,15 +221,16 @@ def find_best_gas_stations(
     stations_along: Optional[List[int]] = None,
     top_n: int = 3,
     max_stations: int = 6,
+    corridor: Optional[LineString] = None,
 ) -> Optional[List[List[int]]]:
     """
     Determines candidate routes (lists of station IDs) along the path from the origin to the destination.
     
     The function first searches for gas stations that are within the estimated range from the origin and
-    within the full tank range from the destination. If no station has been selected yet (i.e. stations_along
-    is empty), it filters out any station whose ID is in stations_not_to_start_with. This prevents reusing 
-    stations that previously failed as a starting station. If no stations meet the criteria (i.e. a failure 
-    signal is returned), the function relaxes the search criteria recursively by selecting the closest available
+    within the full tank range from the destination, near the route (see find_gas_near_route). If no station has
+    been selected yet (i.e. stations_along is empty), it filters out any station whose ID is in
+    stations_not_to_start_with. This prevents reusing stations that previously failed as a starting station.
+    If no stations are within both ranges, the function relaxes the search criteria recursively by selecting the closest available
     station and updating the origin accordingly. The recursion stops when either enough candidate routes (up to top_n)
     are found or when the number of accumulated stations reaches max_stations.
     
@@ -269,6 +246,8 @@ def find_best_gas_stations(
         stations_along: Optional list of station IDs used so far in the current route.
         top_n: The number of top routes to return (default is 5).
         max_stations: The maximum number of stations to consider before stopping the search (default is 100).
+        corridor: Optional driving route line; when given, stations are filtered against it instead of the
+            straight origin-destination line.
 
     Returns:
         A list of lists, where each inner list contains station IDs representing a successful route. 
@@ -292,87 +271,63 @@ def find_best_gas_stations(
         logger.debug("Invalid origin or destination provided.")
         return []
 
-    # Query for gas stations within the estimated range.
-    range_results = find_gas_within_range(origin, destination, estimated_range, full_tank_range)
-    
-    # Failure branch: handle when no stations meet the criteria.
-    if range_results and range_results[0] == "failure":
+    # If no station has been selected yet, stations that failed as the first station are excluded.
+    first_call = len(stations_along) == 0
+    excluded_ids = stations_not_to_start_with if first_call else set()
+
+    # Query for the best gas stations within range and near the route.
+    station_by_distances = find_gas_near_route(
+        origin, destination, estimated_range, full_tank_range, excluded_ids, top_n, corridor
+    )
+    logger.debug("Number of candidate stations: %d", len(station_by_distances))
+
+    if not station_by_distances:
+        with span("station_query"):
+            any_in_range = stations_in_range(origin, destination, estimated_range, full_tank_range).exists()
+        if any_in_range:
+            # Stations are in range, but none of them is near the route or allowed as the first station.
+            logger.debug("Excluding bad or off-route stations made this search unfruitful.")
+            return None
+
+        # Failure branch: no station within range can reach the destination on a full tank.
         logger.debug("No stations met the criteria in the current search.")
         if len(stations_along) >= max_stations:
             logger.info("Maximum station count (%s) reached. Aborting search.", max_stations)
             return None
-        
-        # Sort the stations from the failure branch by their distance to the destination.
-        sorted_reachable_stations = sort_stations_by_distance(destination[0], destination[1], range_results[1])
-        logger.debug("Sorted reachable stations (failure branch):")
-        logger.debug([i[0] for i in sorted_reachable_stations ])
-        
-        logger.debug(stations_along)
-        # If no station has been selected yet, filter out stations that are in the exclusion set.
-        first_call = len(stations_along) == 0
-        if first_call:
-            reachable_stations = filter_bad_start_stations(sorted_reachable_stations, stations_not_to_start_with)
-            if not reachable_stations:
-                logger.debug("Excluding bad stations made this search unfruitful.")
-                return None
-        else:
-            reachable_stations = sorted_reachable_stations
-        
-        logger.debug("Reachable stations after filtering: %s")
-        logger.debug([i[0] for i in reachable_stations])
+
+        # Take the reachable stations closest to the destination.
+        reachable_stations = find_reachable_stations(
+            origin, destination, estimated_range, excluded_ids, RELAXATION_CANDIDATES
+        )
+        if not reachable_stations:
+            logger.debug("No reachable stations left for this search.")
+            return None
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Reachable stations after filtering: %s", [i[0] for i in reachable_stations])
         closest_station = reachable_stations[0]
         logger.debug("Closest station (failure branch): %s", closest_station)
 
         # Save other candidate stations (excluding the closest one) for later use.
         other_stops = [s for s in reachable_stations if s != closest_station]
         stations_along.append(closest_station[0])
-        
+
         # Recurse: update the origin to the coordinates of the closest station and relax search ranges.
         return find_best_gas_stations(
             (closest_station[1].x, closest_station[1].y),
             destination,
             full_tank_range,  # The starting fuel is now full tank, therefore estimated range is full tank range
-            full_tank_range,  
+            full_tank_range,
             stations_not_to_start_with,
             successful_routes,
             other_stops,
             stations_along,
             top_n,
             max_stations,
+            corridor,
         )
-    else:
-        logger.debug("Range results (success branch): %s")
-                     
-        logger.debug([i[0] for i in range_results ])
-        # If no station has been selected yet, filter out bad starting stations.
-        first_call = len(stations_along) == 0
-        logger.debug(stations_along)
-        if first_call:
-            available_stations = filter_bad_start_stations(range_results, stations_not_to_start_with)
-            if not available_stations:
-                logger.debug("Excluding bad stations made this search unfruitful.")
-                return None
-        else:
-            available_stations = range_results
-        logger.debug("Available stations after filtering")
-        logger.debug([i[0] for i in available_stations ])
-        # Retrieve stations near the straight-line route.
-        stations_near_route = find_gas_near_route(available_stations, origin, destination)
-    
-    # Helper: compute total detour distance if a station is selected.
-    def compute_total_distance(station: Tuple[int, any]) -> Tuple[Tuple[int, any], float]:
-        d_origin_station = calculate_distance(origin[0], origin[1], station[1].x, station[1].y)
-        d_station_destination = calculate_distance(station[1].x, station[1].y, destination[0], destination[1])
-        return station, d_origin_station + d_station_destination
-
-    # Compute detour distances for candidate stations in parallel.
-    with ThreadPoolExecutor() as executor:
-        candidate_results = list(executor.map(compute_total_distance, stations_near_route))
-    station_by_distances = sorted(candidate_results, key=lambda x: x[1])
-    logger.debug("Number of candidate stations: %d", len(station_by_distances))
 
     # Append candidate routes (each route is a combination of accumulated stations and the candidate station).
-    for candidate, _ in station_by_distances[:top_n]:
+    for candidate, _ in station_by_distances:
         if len(successful_routes) == top_n:
             logger.debug("Desired number (%d) of candidate routes reached.", top_n)
             break
@@ -398,6 +353,7 @@ def find_best_gas_stations(
                 stations_along,
                 top_n,
                 max_stations,
+                corridor,
             )
 
     # If no candidate stations were found at all, return None.
@@ -0,0 +1,68 @@
+import logging
+import os
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+from django.core.management.base import BaseCommand
+
+# A candidate route list the size find_best_gas_stations logs on every recursion.
+SAMPLE_STATIONS = [(station_id, (19.0 + station_id / 100, 51.0)) for station_id in range(50)]
+
+
+def eager_hot_path(logger: logging.Logger, route_index: int) -> None:
+    """
+    The logging style the planner used: messages and lists are built even when DEBUG is off.
+    """
+    logger.debug(f"Evaluating route {route_index}: {SAMPLE_STATIONS[:3]}")
+    logger.debug([station[0] for station in SAMPLE_STATIONS])
+
+
+def lazy_hot_path(logger: logging.Logger, route_index: int) -> None:
+    """
+    The current style: %-arguments, and expensive arguments guarded by isEnabledFor.
+    """
+    logger.debug("Evaluating route %d: %s", route_index, SAMPLE_STATIONS[:3])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Stations: %s", [station[0] for station in SAMPLE_STATIONS])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the caller-side cost of hot-path debug logging with DEBUG enabled and disabled, "
+        "for eager and lazy message building, through a blocking file handler and through a queue."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=5000, help="Hot-path calls per measurement.")
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        with tempfile.TemporaryDirectory() as log_dir:
+            file_handler = logging.FileHandler(os.path.join(log_dir, "benchmark.log"))
+            file_handler.setFormatter(logging.Formatter("{asctime} - {name} - {levelname} - {message}", style="{"))
+            queue: SimpleQueue = SimpleQueue()
+            listener = QueueListener(queue, file_handler)
+            listener.start()
+            pipelines = {"blocking": file_handler, "queued": QueueHandler(queue)}
+
+            self.stdout.write(f"{'pipeline':<10}{'level':<8}{'style':<7}{'us/call':>10}")
+            try:
+                for pipeline, handler in pipelines.items():
+                    logger = logging.getLogger(f"logging_benchmark.{pipeline}")
+                    logger.propagate = False
+                    logger.handlers = [handler]
+                    for level in (logging.DEBUG, logging.INFO):
+                        logger.setLevel(level)
+                        for style, hot_path in (("eager", eager_hot_path), ("lazy", lazy_hot_path)):
+                            start = time.perf_counter()
+                            for route_index in range(iterations):
+                                hot_path(logger, route_index)
+                            per_call_us = (time.perf_counter() - start) / iterations * 1e6
+                            self.stdout.write(
+                                f"{pipeline:<10}{logging.getLevelName(level):<8}{style:<7}{per_call_us:>10.2f}"
+                            )
+            finally:
+                listener.stop()
+                file_handler.close()
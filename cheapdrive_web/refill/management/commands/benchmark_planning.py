@@ -0,0 +1,98 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+
+from refill.benchmark import (
+    BASELINE_PATH,
+    FIXTURES_PATH,
+    ReplayAPI,
+    benchmark_scenario,
+    compare_with_baseline,
+    load_corpus,
+    seed_stations,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks trip creation and route planning over the corpus of city pairs and vehicle profiles. "
+        "Runs in a throwaway test database seeded with a station grid; Google and Nominatim responses are "
+        "replayed from recorded fixtures (--record fills in missing ones from the real APIs)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Timed runs per scenario.")
+        parser.add_argument("--route", action="append", default=[],
+                            help="Only run this city pair, as Origin:Destination (repeatable).")
+        parser.add_argument("--vehicle", action="append", default=[],
+                            help="Only run this vehicle profile (repeatable).")
+        parser.add_argument("--fixtures", default=FIXTURES_PATH, help="Recorded API responses file.")
+        parser.add_argument("--record", action="store_true",
+                            help="Call the real APIs for responses missing from the fixtures and save them.")
+        parser.add_argument("--save-baseline", metavar="PATH", nargs="?", const=BASELINE_PATH,
+                            help="Write the results as a JSON baseline (default: refill/benchmark_data/baseline.json).")
+        parser.add_argument("--compare", metavar="PATH", nargs="?", const=BASELINE_PATH,
+                            help="Fail on regressions against a JSON baseline (default: refill/benchmark_data/baseline.json).")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="Allowed relative growth of latency and memory when comparing.")
+        parser.add_argument("--keepdb", action="store_true", help="Keep the test database between runs.")
+
+    def handle(self, *args, **options):
+        corpus = load_corpus()
+        routes = [tuple(route) for route in corpus["routes"]]
+        if options["route"]:
+            routes = [tuple(route.split(":", 1)) for route in options["route"]]
+        vehicles = {
+            name: profile for name, profile in corpus["vehicles"].items()
+            if not options["vehicle"] or name in options["vehicle"]
+        }
+        unknown = {city for route in routes for city in route} - set(corpus["cities"])
+        if unknown or not vehicles:
+            raise CommandError(f"Unknown cities {sorted(unknown)} or no matching vehicle profile.")
+        if options["compare"] and not os.path.exists(options["compare"]):
+            raise CommandError(f"No baseline at {options['compare']}; run with --save-baseline first.")
+        if not options["record"] and not os.path.exists(options["fixtures"]):
+            self.stdout.write(self.style.WARNING(
+                f"No recorded responses at {options['fixtures']}; every API response is synthesized. "
+                "Run with --record to record them."
+            ))
+
+        runner = DiscoverRunner(keepdb=options["keepdb"], verbosity=0)
+        old_config = runner.setup_databases()
+        try:
+            self.stdout.write(f"Seeded {seed_stations(corpus['stations'])} stations.")
+            api = ReplayAPI(corpus["cities"], options["fixtures"], record=options["record"])
+            results = {}
+            with api.patched():
+                for origin, destination in routes:
+                    for vehicle_name, vehicle in vehicles.items():
+                        name = f"{origin}-{destination}/{vehicle_name}"
+                        results[name] = benchmark_scenario(api, origin, destination, vehicle, options["repeat"])
+                        self.stdout.write(
+                            "{name}: p50 {p50_ms} ms, p95 {p95_ms} ms, {queries} queries, "
+                            "{external_calls} external calls, peak {peak_kib} KiB, routes found: {routes_found}".format(
+                                name=name, **results[name]
+                            )
+                        )
+            if options["record"]:
+                api.save()
+            elif api.synthesized:
+                self.stdout.write(self.style.WARNING(
+                    f"{api.synthesized} API responses were missing from the fixtures and were synthesized."
+                ))
+        finally:
+            runner.teardown_databases(old_config)
+
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w", encoding="utf-8") as baseline_file:
+                json.dump(results, baseline_file, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['save_baseline']}."))
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as baseline_file:
+                regressions = compare_with_baseline(results, json.load(baseline_file), options["tolerance"])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n" + "\n".join(regressions))
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
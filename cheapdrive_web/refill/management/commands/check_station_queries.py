@@ -0,0 +1,77 @@
+from typing import Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from refill.gas_station_looker import (
+    RELAXATION_CANDIDATES,
+    near_route_queryset,
+    reachable_stations_queryset,
+    stations_in_range,
+)
+
+
+def parse_coords(value: str) -> Tuple[float, float]:
+    """
+    Parses a "longitude,latitude" command line argument.
+    """
+    try:
+        lon, lat = (float(part) for part in value.split(","))
+    except ValueError:
+        raise CommandError(f"Expected 'longitude,latitude', got '{value}'.")
+    return lon, lat
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs EXPLAIN ANALYZE on the station queries of the route planner and flags sequential scans "
+        "on the station table. Small tables are legitimately scanned sequentially; use --disable-seqscan "
+        "to check that the spatial index can serve every query."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--origin", type=parse_coords, default=(21.0122, 52.2297),
+                            help="Origin as longitude,latitude (default: Warsaw).")
+        parser.add_argument("--destination", type=parse_coords, default=(19.9450, 50.0647),
+                            help="Destination as longitude,latitude (default: Krakow).")
+        parser.add_argument("--range", type=float, default=150.0,
+                            help="Estimated drive range from the origin in km.")
+        parser.add_argument("--full-tank-range", type=float, default=600.0,
+                            help="Drive range on a full tank in km.")
+        parser.add_argument("--top", type=int, default=3, help="Number of candidate stations fetched.")
+        parser.add_argument("--disable-seqscan", action="store_true",
+                            help="Run with enable_seqscan off to force index paths where they exist.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Query plans can only be checked on PostgreSQL/PostGIS.")
+
+        origin, destination = options["origin"], options["destination"]
+        queries = {
+            "stations_in_range": stations_in_range(
+                origin, destination, options["range"], options["full_tank_range"]
+            ),
+            "near_route": near_route_queryset(
+                origin, destination, options["range"], options["full_tank_range"], set()
+            )[: options["top"]],
+            "reachable_stations": reachable_stations_queryset(
+                origin, destination, options["range"], set()
+            )[:RELAXATION_CANDIDATES],
+        }
+
+        flagged = []
+        with transaction.atomic():
+            if options["disable_seqscan"]:
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            for name, queryset in queries.items():
+                plan = queryset.explain(analyze=True)
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.stdout.write(plan)
+                if "Seq Scan on entry_station" in plan:
+                    flagged.append(name)
+                    self.stdout.write(self.style.WARNING(f"{name}: sequential scan on entry_station"))
+
+        if flagged:
+            raise CommandError(f"Sequential scans on the station table in: {', '.join(flagged)}")
+        self.stdout.write(self.style.SUCCESS("All station queries use an index."))
@@ -0,0 +1,77 @@
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# "import time:      self [us] |  cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+DEFAULT_MODULES = [
+    # The URLconf imports every view and, through them, the planner and API clients.
+    "cheapdrive_website.urls",
+]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Parses the report of `python -X importtime`.
+
+    Returns:
+        list: (module, self microseconds, cumulative microseconds, nesting depth) per imported module.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures import time in a fresh interpreter with `python -X importtime`: Django setup followed "
+        "by importing the given modules (default: the URLconf, i.e. every view). Lists the slowest "
+        "imports and their total per top-level package."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import after setup.")
+        parser.add_argument("--top", type=int, default=25, help="Number of slowest imports listed.")
+        parser.add_argument("--max-ms", type=float,
+                            help="Fail if the total import time exceeds this many milliseconds.")
+
+    def handle(self, *args, **options):
+        imports_code = "".join(f"import {module}; " for module in options["modules"])
+        code = f"import django; django.setup(); {imports_code}"
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", settings.SETTINGS_MODULE)}
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        imports = parse_importtime(result.stderr)
+        if result.returncode != 0:
+            errors = "\n".join(line for line in result.stderr.splitlines() if not line.startswith("import time:"))
+            raise CommandError(f"Importing failed:\n{errors}")
+
+        total_us = sum(self_us for _, self_us, _, _ in imports)
+        self.stdout.write(f"{len(imports)} modules imported in {total_us / 1000:.1f} ms.\n")
+
+        self.stdout.write(f"{'cumulative ms':>14}{'self ms':>10}  module")
+        for module, self_us, cumulative_us, depth in sorted(imports, key=lambda item: -item[2])[:options["top"]]:
+            self.stdout.write(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {module}")
+
+        packages: Dict[str, int] = {}
+        for module, self_us, _, _ in imports:
+            package = module.split(".")[0]
+            packages[package] = packages.get(package, 0) + self_us
+        self.stdout.write(f"\n{'total ms':>14}  package")
+        for package, package_us in sorted(packages.items(), key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"{package_us / 1000:>14.1f}  {package}")
+
+        if options["max_ms"] is not None and total_us / 1000 > options["max_ms"]:
+            raise CommandError(f"Import time {total_us / 1000:.1f} ms exceeds {options['max_ms']} ms.")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from cache.cache_utils import purge_expired_cache
+from refill.route_store import purge_expired_route_candidates
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired cache entries, which are otherwise only removed when read again. By default "
+        "purges stored route candidates of abandoned plans; --all purges every expired entry."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true", help="Purge every expired entry, not only route candidates.")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired_cache() if options["all"] else purge_expired_route_candidates()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired cache entries."))
@@ -0,0 +1,33 @@
+from typing import Any, Dict, List, Sequence
+
+from db_updates.batch import RefreshCommand
+from db_updates.entry_models_updates import (
+    PriceChange,
+    apply_price_changes,
+    diff_brand_prices,
+    fetch_brand_prices,
+)
+
+
+class Command(RefreshCommand):
+    help = (
+        "Scrapes the fuel prices of every tracked brand and stores the ones that changed, in short "
+        "chunked transactions. Safe to schedule every 15 minutes: overlapping runs exit, interrupted "
+        "runs resume from their checkpoint. Use --dry-run to only report the diff."
+    )
+    job = "refresh_prices"
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        return sorted(fetch_brand_prices(), key=lambda item: item["brand_name"])
+
+    def item_key(self, item: Dict[str, Any]) -> List[Any]:
+        return [item["brand_name"]]
+
+    def diff(self, items: List[Dict[str, Any]]) -> List[PriceChange]:
+        return diff_brand_prices(items)
+
+    def change_key(self, change: PriceChange) -> List[Any]:
+        return [change.brand_name]
+
+    def apply(self, changes: Sequence[PriceChange], prepared: Any) -> None:
+        apply_price_changes(list(changes))
@@ -0,0 +1,45 @@
+from typing import Any, Dict, List, Sequence, Tuple
+
+from db_updates.batch import RefreshCommand
+from db_updates.entry_models_updates import (
+    StationChange,
+    apply_station_changes,
+    diff_stations,
+    fetch_stations,
+    geocode_new_stations,
+)
+
+
+class Command(RefreshCommand):
+    help = (
+        "Retrieves the fuel stations of every tracked brand from the Overpass API and stores new and "
+        "rebranded stations, in short chunked transactions. New stations are reverse geocoded before "
+        "their chunk's transaction opens. Safe to schedule every 15 minutes: overlapping runs exit, "
+        "interrupted runs resume from their checkpoint. Use --dry-run to only report the diff."
+    )
+    job = "refresh_stations"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        # Reverse geocoding is rate limited; smaller chunks commit (and checkpoint) more often.
+        parser.set_defaults(chunk_size=25)
+
+    def fetch(self) -> List[Dict[str, Any]]:
+        return fetch_stations()
+
+    def item_key(self, item: Dict[str, Any]) -> List[Any]:
+        return [item["lon"], item["lat"], item["brand_name"]]
+
+    def diff(self, items: List[Dict[str, Any]]) -> List[StationChange]:
+        return diff_stations(items)
+
+    def change_key(self, change: StationChange) -> List[Any]:
+        return [change.lon, change.lat, change.brand_name]
+
+    def prepare(self, changes: Sequence[StationChange]) -> Dict[Tuple[float, float], str]:
+        return geocode_new_stations(list(changes))
+
+    def apply(self, changes: Sequence[StationChange], prepared: Dict[Tuple[float, float], str]) -> None:
+        skipped = apply_station_changes(list(changes), prepared)
+        if skipped:
+            self.stdout.write(f"Skipped {skipped} stations of brands without prices.")
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('refill', '0017_alter_tripnode_fuel_refilled'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanningJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='pending', help_text='Current state of the job.', max_length=7)),
+                ('attempt', models.PositiveSmallIntegerField(default=0, help_text='The planning attempt currently running (progress indicator).')),
+                ('route_token', models.CharField(blank=True, help_text='Token of the stored route candidates once the job is done.', max_length=32, null=True)),
+                ('error', models.CharField(blank=True, default='', help_text='Error message shown to the user if the job failed.', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('trip', models.ForeignKey(help_text='The trip being planned.', on_delete=django.db.models.deletion.CASCADE, related_name='planning_jobs', to='refill.trip')),
+                ('vehicle', models.ForeignKey(help_text='The vehicle used for planning.', on_delete=django.db.models.deletion.CASCADE, related_name='planning_jobs', to='refill.vehicledata')),
+            ],
+        ),
+    ]
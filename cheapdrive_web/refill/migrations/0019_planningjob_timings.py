@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('refill', '0018_planningjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='planningjob',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict, help_text='Time spent per planning stage, as {span: {"count", "ms"}}.'),
+        ),
+    ]
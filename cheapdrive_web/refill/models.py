@@ -4,15 +4,44 @@ from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.contrib.gis.db import models as gis_models
 
-from entry.models import User,StationPrices
-from refill.route_choice import estimate_fuel_consumption
+from entry.models import User
+from entry.prices import average_fuel_prices
+from refill.calculate_consumption import ConsumptionCurve, estimate_fuel_consumption, get_consumption_curve
 
-from django.db.models import Avg
 
 import logging
 logger=logging.getLogger("my_logger")
 
 
+def estimate_fuel_left(total_refilled: Decimal, total_distance: Decimal, total_duration: Decimal,
+                       fuel_consumption_per_100km: Decimal) -> Decimal:
+    """
+    Estimates the fuel remaining after a chain of TripNodes from its running totals.
+
+    This is the arithmetic behind Trip.fuel_left, exposed so that callers which build a chain
+    in memory (e.g. bulk trip updates) can compute the same value without re-walking the chain.
+
+    Args:
+        total_refilled: Sum of fuel_refilled over the chain (in liters).
+        total_distance: Sum of distances over the chain (in km).
+        total_duration: Sum of durations over the chain (in minutes).
+        fuel_consumption_per_100km: The vehicle's optimal fuel consumption.
+
+    Returns:
+        Decimal: The remaining fuel rounded to 2 decimal places.
+    """
+    try:
+        average_speed = (total_distance / total_duration) * 60
+    except (InvalidOperation, ZeroDivisionError):
+        average_speed = 0
+    fuel_used = (
+        estimate_fuel_consumption(average_speed) *
+        fuel_consumption_per_100km *
+        total_distance / Decimal("100")
+    )
+    return round(total_refilled - fuel_used, 2)
+
+
 class VehicleData(models.Model):
     """
     Represents a user's vehicle including details such as fuel type, tank size, fuel consumption,
@@ -71,6 +100,14 @@ class VehicleData(models.Model):
         help_text="The typical driving conditions in which the fuel usage is given "
     )
 
+    @property
+    def consumption_curve(self) -> ConsumptionCurve:
+        """
+        Returns the shared speed to consumption factor curve of this vehicle's profile.
+        No per-vehicle coefficients are stored yet, so every vehicle uses the default profile.
+        """
+        return get_consumption_curve()
+
     def get_fuel_price_for_station(self, station) -> Decimal:
         """
         Returns the fuel price (as a Decimal) for this vehicle's fuel type at the given station.
@@ -98,11 +135,8 @@ class VehicleData(models.Model):
         if station_price:
             return station_price
 
-        # Compute the average price for the fuel type across all stations.
-        average_price = StationPrices.objects.all().aggregate(avg_price=Avg(price_field))["avg_price"]
-        if average_price is not None:
-            return round(average_price, 2)
-        return None
+        # Fall back to the average price for the fuel type across all stations.
+        return average_fuel_prices().get(price_field)
 
     def __str__(self) -> str:
         return f"{self.user} - {self.fuel_type}"
@@ -311,20 +345,46 @@ class Trip(models.Model):
         from the total fuel refilled.
         """
         total_refilled = Decimal("0")
+        total_distance = Decimal("0")
+        total_duration = Decimal("0")
         current_node = self.first_trip_node
         while current_node:
             total_refilled += current_node.fuel_refilled
+            total_distance += current_node.distance
+            total_duration += current_node.duration
             current_node = current_node.next_trip
 
-        fuel_used = (
-            estimate_fuel_consumption(self.get_average_speed()) *
-            self.vehicle.fuel_consumption_per_100km *
-            self.total_distance() / Decimal("100")
-        )
-        logger.debug(self.total_distance())
+        logger.debug(total_distance)
         logger.debug(self.first_trip_node.id)
-        fuel_remaining = total_refilled - fuel_used
-        return round(fuel_remaining, 2)
+        return estimate_fuel_left(
+            total_refilled, total_distance, total_duration, self.vehicle.fuel_consumption_per_100km
+        )
+
+    def prefetch_trip_nodes(self) -> list:
+        """
+        Loads the whole TripNode chain with a single recursive query and links the nodes in memory,
+        so that subsequent traversals (total_distance, fuel_left, ...) do not hit the database per node.
+
+        Returns:
+            list: The TripNodes of the trip, in chain order.
+        """
+        node_table = TripNode._meta.db_table
+        nodes = list(TripNode.objects.raw(
+            f"""
+            WITH RECURSIVE chain AS (
+                SELECT n.*, 0 AS depth FROM {node_table} n WHERE n.id = %s
+              UNION ALL
+                SELECT n.*, c.depth + 1 FROM {node_table} n JOIN chain c ON n.id = c.next_trip_id
+            )
+            SELECT * FROM chain ORDER BY depth
+            """,
+            [self.first_trip_node_id],
+        ))
+        for node, next_node in zip(nodes, nodes[1:]):
+            node.next_trip = next_node
+        if nodes:
+            self.first_trip_node = nodes[0]
+        return nodes
 
     def last_trip_node(self) -> TripNode:
         """
@@ -354,4 +414,68 @@ class Trip(models.Model):
 
     def __str__(self) -> str:
         owner = self.user if self.user else "Guest"
-        return f"Trip by {owner}: {self.origin_address} -> {self.destination_address}"
\ No newline at end of file
+        return f"Trip by {owner}: {self.origin_address} -> {self.destination_address}"
+
+class PlanningJob(models.Model):
+    """
+    A background route planning run for a trip. The job is created as soon as planning is
+    requested; a worker updates its status and progress, and stores the token of the found
+    route candidates (see refill.route_store) once it succeeds.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    trip = models.ForeignKey(
+        Trip,
+        on_delete=models.CASCADE,
+        related_name="planning_jobs",
+        help_text="The trip being planned."
+    )
+    vehicle = models.ForeignKey(
+        VehicleData,
+        on_delete=models.CASCADE,
+        related_name="planning_jobs",
+        help_text="The vehicle used for planning."
+    )
+    status = models.CharField(
+        max_length=7,
+        choices=Status.choices,
+        default=Status.PENDING,
+        help_text="Current state of the job."
+    )
+    attempt = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="The planning attempt currently running (progress indicator)."
+    )
+    route_token = models.CharField(
+        max_length=32,
+        null=True,
+        blank=True,
+        help_text="Token of the stored route candidates once the job is done."
+    )
+    error = models.CharField(
+        max_length=255,
+        blank=True,
+        default="",
+        help_text="Error message shown to the user if the job failed."
+    )
+    timings = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text='Time spent per planning stage, as {span: {"count", "ms"}}.'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def is_finished(self) -> bool:
+        """
+        Returns True if the job is done or failed.
+        """
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    def __str__(self) -> str:
+        return f"PlanningJob {self.id} for trip {self.trip_id}: {self.status}"
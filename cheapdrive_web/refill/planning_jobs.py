@@ -0,0 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from cheapdrive_website.db_connections import releasing_connections
+
+from .models import PlanningJob, Trip, VehicleData
+from .planning_spans import propagate, recording
+from .route_store import load_route_candidates, save_route_candidates
+from .trip_planner import plan_routes
+
+logger = logging.getLogger("my_logger")
+
+NO_ROUTE_MESSAGE = "Invalid data given: The app could not find a reasonable route for this trip"
+LOST_JOB_MESSAGE = "Route planning stopped responding and was restarted"
+
+# Planning runs in a small in-process worker pool, so that the request submitting it returns immediately.
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, "PLANNING_WORKERS", 2),
+    thread_name_prefix="planning",
+)
+
+
+def _is_reusable(job: PlanningJob) -> bool:
+    """
+    Checks whether an existing job can serve a new planning request for the same trip:
+    unfinished jobs that are still alive, or finished jobs whose route candidates are still stored.
+    """
+    if job.status == PlanningJob.Status.DONE:
+        return load_route_candidates(job.route_token) is not None
+    if job.status == PlanningJob.Status.FAILED:
+        return False
+    # A pending/running job that has not progressed for too long was lost (e.g. worker restart).
+    timeout = getattr(settings, "PLANNING_JOB_TIMEOUT", 300)
+    return job.updated_at >= timezone.now() - timedelta(seconds=timeout)
+
+
+def submit_planning_job(trip: Trip, vehicle: VehicleData) -> PlanningJob:
+    """
+    Returns a planning job for the trip, reusing the latest one if it is still usable,
+    otherwise creating a new job and queueing it on the worker pool.
+
+    Args:
+        trip: The trip to plan.
+        vehicle: The vehicle used on the trip.
+
+    Returns:
+        PlanningJob: The job tracking the planning run.
+    """
+    latest = PlanningJob.objects.filter(trip=trip, vehicle=vehicle).order_by("-id").first()
+    if latest and _is_reusable(latest):
+        logger.debug("Reusing planning job %s for trip %s", latest.id, trip.id)
+        return latest
+
+    job = PlanningJob.objects.create(trip=trip, vehicle=vehicle)
+    # The job runs in the submitting request's context, so a session pinned to the primary
+    # (read-your-writes, see cheapdrive_website.db_router) also plans from the primary.
+    task = propagate(run_planning_job)
+    transaction.on_commit(lambda: _executor.submit(task, job.id))
+    return job
+
+
+def resubmit_if_lost(job: PlanningJob) -> PlanningJob:
+    """
+    Returns the job, or a new job for the same trip if it is unfinished and has not progressed for
+    PLANNING_JOB_TIMEOUT seconds (e.g. its worker restarted). The lost job is marked as failed.
+
+    Args:
+        job: The polled planning job, with its trip and vehicle.
+
+    Returns:
+        PlanningJob: The job to keep polling.
+    """
+    if job.is_finished() or _is_reusable(job):
+        return job
+    logger.warning("Planning job %s stopped progressing; resubmitting trip %s", job.id, job.trip_id)
+    PlanningJob.objects.filter(id=job.id).update(
+        status=PlanningJob.Status.FAILED, error=LOST_JOB_MESSAGE, updated_at=timezone.now()
+    )
+    return submit_planning_job(job.trip, job.vehicle)
+
+
+@releasing_connections
+def run_planning_job(job_id: int) -> None:
+    """
+    Executes a planning job and records its outcome. Runs on a worker thread, which owns
+    its own database connection; the connection is released when the job ends.
+
+    Args:
+        job_id: The ID of the PlanningJob to run.
+    """
+    job = PlanningJob.objects.select_related("trip__first_trip_node", "vehicle").get(id=job_id)
+
+    def report_attempt(attempt: int) -> None:
+        PlanningJob.objects.filter(id=job_id).update(
+            status=PlanningJob.Status.RUNNING, attempt=attempt, updated_at=timezone.now()
+        )
+
+    start = time.perf_counter()
+    with recording() as spans:
+        try:
+            routes = plan_routes(job.trip, job.vehicle, on_attempt=report_attempt)
+        except Exception as e:
+            logger.exception("Planning job %s failed:", job_id)
+            routes, error = None, f"An unexpected error occurred: {e}"[:255]
+        else:
+            error = NO_ROUTE_MESSAGE if routes is None else ""
+    timings = spans.as_dict()
+    timings["plan"] = {"count": 1, "ms": round((time.perf_counter() - start) * 1000, 1)}
+    # One structured line per plan, so slow plans can be broken down without DEBUG logging.
+    logger.info(json.dumps({
+        "event": "plan_timing", "job_id": job_id, "trip_id": job.trip_id,
+        "status": "failed" if error else "done", "spans": timings,
+    }))
+
+    if error:
+        PlanningJob.objects.filter(id=job_id).update(
+            status=PlanningJob.Status.FAILED, error=error, timings=timings, updated_at=timezone.now()
+        )
+        return
+
+    best_route_by_time, best_route_by_efficiency, improvement = routes
+    token = save_route_candidates(best_route_by_time, best_route_by_efficiency, improvement)
+    PlanningJob.objects.filter(id=job_id).update(
+        status=PlanningJob.Status.DONE, route_token=token, timings=timings, updated_at=timezone.now()
+    )
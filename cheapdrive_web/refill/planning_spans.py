@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from functools import partial
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional
+
+
+class SpanRecorder:
+    """
+    Accumulates the total duration and the number of occurrences of named spans.
+    A recorder is shared by every thread working on the same plan.
+    """
+
+    def __init__(self) -> None:
+        self._spans: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._spans.setdefault(name, {"count": 0, "ms": 0.0})
+            entry["count"] += 1
+            entry["ms"] += seconds * 1000
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """
+        Returns the spans as {name: {"count": int, "ms": float}}, durations rounded to 0.1 ms.
+        """
+        with self._lock:
+            return {name: {"count": int(entry["count"]), "ms": round(entry["ms"], 1)} for name, entry in self._spans.items()}
+
+
+_recorder: ContextVar[Optional[SpanRecorder]] = ContextVar("planning_span_recorder", default=None)
+
+
+@contextmanager
+def recording() -> Iterator[SpanRecorder]:
+    """
+    Collects the spans recorded in the enclosed block (and in work propagated to other threads).
+    """
+    recorder = SpanRecorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Times the enclosed block under `name`; does nothing unless a recording is active.
+    """
+    recorder = _recorder.get()
+    if recorder is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add(name, time.perf_counter() - start)
+
+
+def propagate(function: Callable) -> Callable:
+    """
+    Binds `function` to a copy of the current context, so that spans it records on a pool thread
+    reach the active recording. Call it on the submitting thread, once per submitted task.
+    """
+    return partial(copy_context().run, function)
+
+
+def server_timing_header(spans: Dict[str, Dict[str, float]]) -> str:
+    """
+    Formats recorded spans as a Server-Timing header value.
+
+    Args:
+        spans: Spans as returned by SpanRecorder.as_dict.
+
+    Returns:
+        str: e.g. 'station_search;dur=12.5;desc="2 calls", google_distance;dur=310.0;desc="6 calls"'.
+    """
+    return ", ".join(
+        f'{name};dur={entry["ms"]};desc="{entry["count"]} calls"' for name, entry in spans.items()
+    )
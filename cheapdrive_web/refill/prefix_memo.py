@@ -0,0 +1,80 @@
+import hashlib
+from typing import Dict, List
+
+from django.conf import settings
+
+from cache.cache_utils import get_many_from_cache, set_many_cache
+
+PREFIX_KEY_PREFIX = "prefix_"
+
+
+def prefix_memo_scope(origin: str, tank_size: float, fuel_consumption: float, starting_fuel: float) -> str:
+    """
+    Builds the part of a prefix memo key shared by all prefixes of one planning context.
+    The first segment of every prefix starts at the origin, so the origin is part of the scope.
+    The vehicle parameters are used as stored (two decimals): an outcome computed for one value
+    does not hold for a nearby one, e.g. less starting fuel can fail a first segment that passed.
+
+    Args:
+        origin: The origin address of the trip.
+        tank_size: The vehicle's fuel tank capacity.
+        fuel_consumption: The vehicle's optimal fuel consumption (liters/100km).
+        starting_fuel: The fuel available at the start of the trip.
+
+    Returns:
+        str: The scope string.
+    """
+    origin_hash = hashlib.md5(origin.encode("utf-8")).hexdigest()[:12]
+    return "_".join([
+        origin_hash,
+        f"{float(tank_size):.2f}",
+        f"{float(fuel_consumption):.2f}",
+        f"{float(starting_fuel):.2f}",
+    ])
+
+
+def _route_prefix_keys(routes: List[List[int]]) -> List[str]:
+    """
+    Returns the memo keys (joined station IDs, as used by determine_best_route) of every prefix of every route.
+    """
+    keys = set()
+    for route in routes:
+        for node_index in range(len(route)):
+            keys.add("_".join(str(i) for i in route[: node_index + 1]))
+    return list(keys)
+
+
+def load_prefix_memo(scope: str, routes: List[List[int]]) -> Dict[str, bool]:
+    """
+    Loads the known validation outcomes of all prefixes of the candidate routes with one query.
+
+    Args:
+        scope: The scope returned by prefix_memo_scope.
+        routes: The candidate routes (lists of station IDs).
+
+    Returns:
+        dict: Maps prefix keys to True (the prefix failed validation) or False (it passed).
+    """
+    if not getattr(settings, "PREFIX_MEMO_TIMEOUT", 0):
+        return {}
+    full_prefix = f"{PREFIX_KEY_PREFIX}{scope}_"
+    cached = get_many_from_cache([full_prefix + key for key in _route_prefix_keys(routes)])
+    return {key[len(full_prefix):]: value["failed"] for key, value in cached.items()}
+
+
+def save_prefix_memo(scope: str, memo: Dict[str, bool]) -> None:
+    """
+    Persists prefix validation outcomes so that later plans with the same vehicle can prune
+    candidate routes before requesting any segment distance.
+
+    Args:
+        scope: The scope returned by prefix_memo_scope.
+        memo: Maps prefix keys to their validation outcome.
+    """
+    timeout = getattr(settings, "PREFIX_MEMO_TIMEOUT", 0)
+    if not timeout or not memo:
+        return
+    set_many_cache(
+        {f"{PREFIX_KEY_PREFIX}{scope}_{key}": {"failed": failed} for key, failed in memo.items()},
+        timeout=timeout,
+    )
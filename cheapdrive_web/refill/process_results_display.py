@@ -1,4 +1,4 @@
-from django.shortcuts import get_object_or_404
+from django.http import Http404
 from formatters.string_format import format_address, format_duration
 from api_calls.other_api_calls import get_address_from_coords
 from typing import Any, Dict, List, Optional, Tuple
@@ -30,25 +30,29 @@ def process_route_display(trip: Any) -> Tuple[List[Dict[str, Any]], str]:
 
     Notes:
         - The function processes the linked list of `TripNodes`, each representing a segment of the trip.
-        - For each station node, it fetches station details like the brand name and address from the `Station` model.
+        - The TripNode chain is loaded with one query and all stations with another, so the query count does not
+          depend on the number of stops.
         - The Google Maps URL is constructed by combining the origin, destination, and waypoints, allowing the user to view the entire route with stations as stops.
         - The function will treat the first node as the starting point and all subsequent nodes as stations.
     """
-    current_node = trip.first_trip_node
+    trip_nodes = trip.prefetch_trip_nodes()
+    # Resolve every station of the trip (with its prices) in one query; the first node is the origin.
+    station_ids = [node.station_id for node in trip_nodes[1:]]
+    stations = Station.objects.select_related("station_prices").in_bulk(station_ids)
     trip_segments: List[Dict[str, Any]] = []
-    index = 0  # To track the node position
     waypoint_coords: List[str] = []  # To store station coordinates for waypoints
 
     # Traverse the linked list of TripNodes.
-    while current_node:
+    for index, current_node in enumerate(trip_nodes):
         # For nodes other than the first, treat them as stations.
         is_station = (index != 0)
         station = None
         # If it's a station, add its coordinates for the route's waypoint.
         if is_station:
             waypoint_coords.append(f"{current_node.origin.y},{current_node.origin.x}")
-        if is_station:
-            station = get_object_or_404(Station, id=current_node.station_id)
+            station = stations.get(current_node.station_id)
+            if station is None:
+                raise Http404(f"Station {current_node.station_id} not found.")
             
         # Build the segment dictionary.
         segment = {
@@ -64,10 +68,6 @@ def process_route_display(trip: Any) -> Tuple[List[Dict[str, Any]], str]:
         }
         trip_segments.append(segment)
 
-        # Move to the next node.
-        current_node = current_node.next_trip
-        index += 1
-
     # Construct coordinates for origin and destination.
     origin = trip.origin_address
     destination = trip.destination_address
@@ -1,13 +1,15 @@
-from decimal import Decimal
 from cache.cache_utils import get_from_cache, set_cache
-from django.shortcuts import get_object_or_404
-from geopy.distance import geodesic
+from cheapdrive_website.db_connections import releasing_executor
+from cheapdrive_website.metrics import SEGMENT_CACHE_REQUESTS
+from django.conf import settings
 import time
 from api_calls.api_calculations import get_coordinates
 from api_calls.google_api_calls import distance_gmaps
 from entry.models import Station
-from concurrent.futures import ThreadPoolExecutor
-from .calculate_consumption import estimate_fuel_consumption
+import threading
+from .calculate_consumption import ConsumptionCurve, get_consumption_curve
+from .planning_spans import propagate, span
+import numpy as np
 import logging
 from django.core.exceptions import ObjectDoesNotExist
 from datetime import timedelta
@@ -17,7 +19,8 @@ logger = logging.getLogger("my_logger")
 
 
 def parallel_distance_calculations(
-    orig_dest_pairs: List[Tuple[Any, ...]], station_ids: List[int]
+    orig_dest_pairs: List[Tuple[Any, ...]], station_ids: List[int],
+    segment_cache: Optional[Dict[str, Tuple[float, float]]] = None,
 ) -> List[Any]:
     """
     Computes distances in parallel for a list of origin-destination parameter tuples.
@@ -25,6 +28,7 @@ def parallel_distance_calculations(
     Args:
         orig_dest_pairs: A list of tuples; each tuple contains parameters for get_ptp_distance.
         station_ids: A list of station IDs corresponding to the route segments.
+        segment_cache: Optional in-memory cache of segment results shared between callers.
 
     Returns:
         List: A list of results from get_ptp_distance for each parameter tuple.
@@ -43,22 +47,44 @@ def parallel_distance_calculations(
         + [str(station_ids[-1]) + destination]
     )
 
-    # Associate each route parameter tuple with its corresponding cache key.
-    tasks = [(orig_dest_pairs[i], route_keys[i]) for i in range(len(orig_dest_pairs))]
-
-    # Use a ThreadPoolExecutor to compute distances concurrently.
-    with ThreadPoolExecutor() as executor:
-        results = executor.map(
-            lambda task: get_ptp_distance(
-                task[0][0],  # Origin address (or None if not provided)
-                task[0][1],  # Destination address (or None if not provided)
-                task[0][2],  # Origin coordinates
-                task[0][3],  # Destination coordinates
-                task[1]      # Cache key for this route segment
-            ),
-            tasks,
-        )
-    return list(results)
+    results = fetch_segments(dict(zip(route_keys, orig_dest_pairs)), segment_cache)
+    return [results[key] for key in route_keys]
+
+
+def fetch_segments(
+    segments: Dict[str, Tuple[Any, ...]],
+    segment_cache: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Fetches the distance and duration of several segments concurrently, each segment once.
+
+    Args:
+        segments: Maps the cache key of each segment to its get_ptp_distance parameters
+            (origin address, destination address, origin coordinates, destination coordinates).
+        segment_cache: Optional in-memory cache of segment results shared between callers.
+
+    Returns:
+        dict: Maps each cache key to its (distance, duration).
+    """
+    if not segments:
+        return {}
+    # Compute distances concurrently on at most DISTANCE_WORKERS threads. Each thread reuses one
+    # database connection for all its segments and releases it when the pool shuts down.
+    max_workers = max(1, min(len(segments), getattr(settings, "DISTANCE_WORKERS", 4)))
+    with releasing_executor(max_workers, thread_name_prefix="segment-distance") as executor:
+        futures = {
+            key: executor.submit(
+                propagate(get_ptp_distance),
+                pair[0],  # Origin address (or None if not provided)
+                pair[1],  # Destination address (or None if not provided)
+                pair[2],  # Origin coordinates
+                pair[3],  # Destination coordinates
+                key,      # Cache key for this route segment
+                segment_cache,
+            )
+            for key, pair in segments.items()
+        }
+    return {key: future.result() for key, future in futures.items()}
 
 
 def get_ptp_distance(
@@ -67,10 +93,11 @@ def get_ptp_distance(
     origin_coords: Any,
     destination_coords: Any,
     cache_key: Optional[str],
+    segment_cache: Optional[Dict[str, Tuple[float, float]]] = None,
 ) -> Any:
     """
     Calculates the point-to-point distance and duration between two points using the Google Maps API.
-    It first checks a cache for a previously computed result.
+    It first checks the in-memory segment cache (if given) and then the database cache for a previously computed result.
 
     Args:
         origin: The origin address (or None if coordinates are used).
@@ -78,78 +105,78 @@ def get_ptp_distance(
         origin_coords: Coordinates for the origin.
         destination_coords: Coordinates for the destination.
         cache_key: Key used to check for a cached distance/duration result.
+        segment_cache: Optional in-memory cache shared between concurrent planning attempts.
 
     Returns:
         Tuple: (distance, duration) as computed by the Google Maps API.
     """
+    if segment_cache is not None and cache_key in segment_cache:
+        SEGMENT_CACHE_REQUESTS.inc(layer="memory", result="hit")
+        return segment_cache[cache_key]
+    if segment_cache is not None:
+        SEGMENT_CACHE_REQUESTS.inc(layer="memory", result="miss")
+
     # Check if the result is cached.
-    cached_result = get_from_cache(cache_key)
+    with span("cache_lookup"):
+        cached_result = get_from_cache(cache_key)
     if cached_result:
-        logger.debug(f"Cache hit for {cache_key}")
-        logger.debug(f"Using cached route: {origin_coords}, {destination_coords}")
-        return cached_result["distance"], cached_result["duration"]
+        SEGMENT_CACHE_REQUESTS.inc(layer="db", result="hit")
+        logger.debug("Cache hit for %s", cache_key)
+        logger.debug("Using cached route: %s, %s", origin_coords, destination_coords)
+        result = cached_result["distance"], cached_result["duration"]
+        if segment_cache is not None:
+            segment_cache[cache_key] = result
+        return result
 
     # Cache miss: compute using the Google Maps API.
-    logger.debug(f"Cache miss for {cache_key}. Using Google Maps API for distance calculation.")
-    result = distance_gmaps(origin or origin_coords, destination or destination_coords)
+    SEGMENT_CACHE_REQUESTS.inc(layer="db", result="miss")
+    logger.debug("Cache miss for %s. Using Google Maps API for distance calculation.", cache_key)
+    with span("google_distance"):
+        result = distance_gmaps(origin or origin_coords, destination or destination_coords)
 
     # Cache the computed result for 2 hours.
     result_json = {"distance": result[0], "duration": result[1]}
-    set_cache(cache_key, result_json, timeout=2 * 3600)
+    with span("cache_write"):
+        set_cache(cache_key, result_json, timeout=2 * 3600)
+    if segment_cache is not None:
+        segment_cache[cache_key] = result
     return result
 
 
-def compute_route_params(
+def route_segment(
+    route: List[int],
+    segment_index: int,
+    station_coords: Dict[int, Tuple[float, float]],
     origin: str,
-    station_ids: List[int],
     destination: str,
     origin_coords: Any,
     destination_coords: Any,
-) -> List[Tuple[float, float]]:
+) -> Tuple[str, Tuple[Any, ...]]:
     """
-    Computes route parameters (distances and durations) for a sequence of segments:
-    origin -> station(s) -> destination.
+    Describes one segment of a candidate route: origin -> station(s) -> destination.
 
     Args:
+        route: The station IDs of the route.
+        segment_index: Index of the segment; segment i ends at route[i], the last one at the destination.
+        station_coords: Maps station IDs to their (latitude, longitude).
         origin: The origin address.
-        station_ids: A list of station IDs representing gas stations along the route.
         destination: The destination address.
         origin_coords: Coordinates for the origin.
         destination_coords: Coordinates for the destination.
 
     Returns:
-        List of tuples, where each tuple contains (distance, duration) for each segment.
+        Tuple (cache key, get_ptp_distance parameters) of the segment.
     """
-    # Retrieve station coordinates based on the provided station IDs.
-    station_coords = [
-        (
-            get_object_or_404(Station, id=station_id).location.y,
-            get_object_or_404(Station, id=station_id).location.x,
-        )
-        for station_id in station_ids
-    ]
-
-    # Build route pairs:
-    #   - First segment: origin to first station.
-    #   - Intermediate segments: station-to-station.
-    #   - Last segment: last station to destination.
-    route_pairs: List[Tuple[Any, ...]] = []
-    route_pairs.append((origin, None, origin_coords, station_coords[0]))
-    if station_coords:
-        route_pairs.extend(
-            [
-                (None, None, station_coords[i], station_coords[i + 1])
-                for i in range(len(station_coords) - 1)
-            ]
-        )
-        route_pairs.append((None, destination, station_coords[-1], destination_coords))
-    else:
-        # If no stations are provided, the route is a single segment.
-        route_pairs.append((origin, destination, origin_coords, destination_coords))
-
-    # Compute the route parameters in parallel.
-    route_params = parallel_distance_calculations(route_pairs, station_ids)
-    return route_params
+    if segment_index == 0:
+        if not route:
+            # Without stations the route is a single segment.
+            return origin + destination, (origin, destination, origin_coords, destination_coords)
+        return origin + str(route[0]), (origin, None, origin_coords, station_coords[route[0]])
+    previous = route[segment_index - 1]
+    if segment_index == len(route):
+        return str(previous) + destination, (None, destination, station_coords[previous], destination_coords)
+    station = route[segment_index]
+    return str(previous) + str(station), (None, None, station_coords[previous], station_coords[station])
 
 
 def determine_best_route(
@@ -161,12 +188,20 @@ def determine_best_route(
     optimal_fuel_consumption: float,
     tank_size: float,
     starting_fuel: float,
+    failed_last_node: Optional[Dict[str, bool]] = None,
+    segment_cache: Optional[Dict[str, Tuple[float, float]]] = None,
+    curve: Optional[ConsumptionCurve] = None,
+    cancelled: Optional[threading.Event] = None,
 ) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Optional[float]]:
     """
     Determines the best route based on duration and fuel efficiency.
 
-    For each candidate route, this function validates segments using a full validation routine.
-    It caches validation results for common segments across candidate routes to avoid redundant computations.
+    Candidates are evaluated in stages, one segment at a time: the next segment of every remaining
+    candidate is fetched (segments shared by several candidates once), then all of them are validated
+    at once with batch_route_validation. Candidates that fail are dropped, together with any candidate
+    whose prefix is known to fail, before the next segments are fetched, so no (billed) distance is
+    requested past a failing segment. The validation outcome of every prefix is recorded so that common
+    segments are not evaluated again.
     This function also keeps track of stations that should not be chosen as first station as they previously failed
     as starting station of a route (could not be reached from origin).
 
@@ -179,6 +214,12 @@ def determine_best_route(
         optimal_fuel_consumption: The vehicle's optimal fuel consumption (liters/100km).
         tank_size: The vehicle's fuel tank capacity.
         starting_fuel: The fuel available at the start of the trip.
+        failed_last_node: Optional prefix validation memo to share between calls with the same vehicle
+            and starting fuel (e.g. concurrent planning attempts); a fresh one is used if omitted.
+        segment_cache: Optional in-memory cache of segment distances shared between calls.
+        curve: The vehicle's consumption curve; the default profile is used if omitted.
+        cancelled: Optional event checked before fetching each stage of segments; once it is set,
+            no more segments are fetched and no routes are returned.
 
     Returns:
         Tuple:
@@ -189,6 +230,7 @@ def determine_best_route(
             should not be used as the first station in a route.
         If no valid routes are found, returns None values.
     """
+    curve = curve or get_consumption_curve()
     best_route_duration: Optional[Dict[str, Any]] = None
     best_route_efficiency: Optional[Dict[str, Any]] = None
     best_duration = float("inf")
@@ -196,72 +238,100 @@ def determine_best_route(
     results: List[Dict[str, Any]] = []
 
     # Dictionary to store validation results for common segments.
-    failed_last_node: Dict[str, bool] = {}
+    if failed_last_node is None:
+        failed_last_node = {}
     failed_first_stations: Set[str] = set()
 
-    # Evaluate each candidate route.
-    for route_index, route in enumerate(routes):
-        start_time = time.time()
-        logger.debug(f"Evaluating route {route_index}: {route}")
-
-        route_checked_up_to = 0
-        route_passed_validation = True
-
-        # Check cached validation results for common segments.
-        for node_index, node in enumerate(route):
-            node_key = "_".join([str(i) for i in route[: node_index + 1]])
-            validation_result = failed_last_node.get(node_key)
-            logger.debug(f"Validation key for segment {node_index}: {node_key}")
-            if validation_result is not None:
-                if validation_result:
-                    logger.debug(
-                        f"Skipping route due to failed validation on common segment {node_key}"
-                    )
-                    route_passed_validation = False
-                    break
-                else:
-                    logger.debug(f"Common segment {node_key} passed validation")
-                    route_checked_up_to += 1
-        if not route_passed_validation:
-            continue
+    def prefix_failed(route: List[int], segment_index: int) -> bool:
+        # Segment i ends at station i; the final segment, to the destination, has no prefix key.
+        if segment_index >= len(route):
+            return False
+        return bool(failed_last_node.get("_".join(str(i) for i in route[: segment_index + 1])))
+
+    # Load the coordinates of every station of every candidate with one query.
+    locations = Station.objects.filter(
+        id__in={station_id for route in routes for station_id in route}
+    ).values_list("id", "location")
+    station_coords = {station_id: (location.y, location.x) for station_id, location in locations}
 
-        # Compute route parameters (distances and durations) for each segment.
-        route_params = compute_route_params(origin, route, destination, origin_coords, destination_coords)
-        if not route_params:
-            logger.debug(f"Route {route_index} returned no parameters.")
+    active: List[Tuple[int, List[int]]] = []
+    for route_index, route in enumerate(routes):
+        logger.debug("Evaluating route %d: %s", route_index, route)
+        if any(station_id not in station_coords for station_id in route):
+            logger.debug("Skipping route %d: a station no longer exists", route_index)
             continue
+        active.append((route_index, route))
+
+    route_params: Dict[int, List[Tuple[float, float]]] = {route_index: [] for route_index, _ in active}
+    valid_routes: List[Tuple[int, List[int], Tuple[float, ...], Tuple[float, ...]]] = []
+    segment_index = 0
+    while active:
+        # Drop candidates whose next segment is known to fail (from earlier stages, plans or attempts).
+        remaining = []
+        for route_index, route in active:
+            if any(prefix_failed(route, index) for index in range(segment_index, len(route))):
+                logger.debug("Skipping route %d due to failed validation on a common segment", route_index)
+            else:
+                remaining.append((route_index, route))
+        active = remaining
+        if not active:
+            break
+        if cancelled is not None and cancelled.is_set():
+            logger.debug("Route evaluation cancelled before segment %d", segment_index)
+            return None, None, None, failed_first_stations
+
+        # Fetch the next segment of every remaining candidate.
+        segment_keys = {}
+        segments = {}
+        for route_index, route in active:
+            key, pair = route_segment(
+                route, segment_index, station_coords, origin, destination, origin_coords, destination_coords
+            )
+            segment_keys[route_index] = key
+            segments[key] = pair
+        fetched = fetch_segments(segments, segment_cache)
+        for route_index, _ in active:
+            route_params[route_index].append(fetched[segment_keys[route_index]])
 
-        # Separate distances and durations.
-        distances, durations = zip(*route_params)
-        logger.debug("Route distances: %s", distances)
-        logger.debug("Route durations: %s", durations)
-
-        # Validate the segments that have not been previously validated.
-        valid, failed_node_index = route_validation(
-            
-            list(distances)[route_checked_up_to:],
-            list(durations)[route_checked_up_to:],
-            optimal_fuel_consumption,
-            tank_size,
-            starting_fuel if route_checked_up_to == 0 else tank_size,
-            route_checked_up_to,
+        # Validate the fetched prefixes of every remaining candidate in one call.
+        start_time = time.time()
+        prefixes = [list(zip(*route_params[route_index])) for route_index, _ in active]
+        distance_matrix, duration_matrix = pad_route_segments(
+            [prefix[0] for prefix in prefixes], [prefix[1] for prefix in prefixes]
+        )
+        with span("validation"):
+            feasible, first_failure = batch_route_validation(
+                distance_matrix, duration_matrix, optimal_fuel_consumption, tank_size, starting_fuel, curve=curve
+            )
+        logger.debug(
+            "Validated segment %d of %d routes in %.4f seconds", segment_index, len(active), time.time() - start_time
         )
 
-        # Record the validation outcome for the segments and return true if the route has failed validation on the first station.
-        first_station_fail = save_failed_route(failed_last_node, route, failed_node_index)
-        if not valid:
-            logger.debug(f"Route {route_index} failed validation at segment {failed_node_index}.")
-            if first_station_fail:
-                logger.debug("First station fail: " + str(route[0]))
-                failed_first_stations.add(route[0])
-            
-            continue
-
+        next_active = []
+        for (route_index, route), valid, failed_node_index in zip(active, feasible, first_failure):
+            if not valid:
+                # Record the validation outcome for the segments and return true if the route has failed validation on the first station.
+                if save_failed_route(failed_last_node, route, int(failed_node_index)):
+                    logger.debug("First station fail: %s", route[0])
+                    failed_first_stations.add(route[0])
+                logger.debug("Route %d failed validation at segment %d.", route_index, failed_node_index)
+            elif segment_index == len(route):
+                save_failed_route(failed_last_node, route, int(failed_node_index))
+                distances, durations = zip(*route_params[route_index])
+                logger.debug("Route distances: %s", distances)
+                logger.debug("Route durations: %s", durations)
+                valid_routes.append((route_index, route, distances, durations))
+            else:
+                next_active.append((route_index, route))
+        active = next_active
+        segment_index += 1
+
+    for route_index, route, distances, durations in sorted(valid_routes, key=lambda valid_route: valid_route[0]):
         # Compute overall metrics for the valid route.
         total_distance = sum(distances)
         total_duration = sum(durations)
         average_speed = total_distance / total_duration if total_duration else 0
-        fuel_consumption = float(estimate_fuel_consumption(average_speed)) * total_distance
+        fuel_consumption = curve.factor(average_speed) * total_distance
 
         # Create a dictionary to store route data.
         route_data = {
@@ -276,21 +346,18 @@ def determine_best_route(
         if total_duration < best_duration:
             best_duration = total_duration
             best_route_duration = route_data
-            logger.debug(f"New best duration route: {route_data['station_ids']} with duration {total_duration}")
+            logger.debug("New best duration route: %s with duration %s", route, total_duration)
         # Update the best (most efficient) route.
         if fuel_consumption < best_efficiency:
             best_efficiency = fuel_consumption
             best_route_efficiency = route_data
 
-        elapsed = time.time() - start_time
-        logger.debug(f"Processed route {route_index} in {elapsed:.2f} seconds")
-
     # Calculate efficiency improvement if more than one valid route exists.
     if len(results) > 1:
         total_other = sum(route["fuel_consumption"] for route in results) - best_efficiency
         avg_other = total_other / (len(results) - 1)
         efficiency_improvement = (1 - best_efficiency / avg_other) * 100
-        logger.debug(f"Efficiency improvement: {efficiency_improvement:.2f}%")
+        logger.debug("Efficiency improvement: %.2f%%", efficiency_improvement)
     else:
         efficiency_improvement = None
         logger.debug("Not enough routes to calculate efficiency improvement.")
@@ -327,12 +394,15 @@ def route_validation(
     tank_size: float,
     starting_fuel: float,
     route_checked_up_to: int, 
-    safety_coeff: Decimal = Decimal("0.1"),
+    safety_coeff: float = 0.1,
+    curve: Optional[ConsumptionCurve] = None,
 ) -> Tuple[bool, int]:
     """
     Fully validates a candidate route by checking fuel consumption across each segment,
-    ensuring that the remaining fuel
+    ensuring that the remaining fuel never drops below a safety margin.
 
+    The check runs on float arrays: a full refuel is assumed before every segment but the
+    first one, so the segments are independent and are evaluated at once.
 
     Args:
         distances: List of distances for each segment.
@@ -342,46 +412,122 @@ def route_validation(
         starting_fuel: The fuel available at the start of the route.
         route_checked_up_to: number of segments that were previously validated in that route
         safety_coeff: Coefficient to compute the safety margin (e.g., 0.1).
+        curve: The vehicle's consumption curve; the default profile is used if omitted.
 
     Returns:
         Tuple:
           - bool: True if the route is valid; otherwise, False.
           - int: The index of the segment where validation failed (or the number of segments if all pass).
     """
-    fuel_left = Decimal(starting_fuel)
-    full_tank = Decimal(tank_size)
-    consumption_rate = Decimal(optimal_fuel_consumption) / Decimal("100")
-
-    # Compute an initial safety margin for the first segment.
-    initial_safety_margin = min(safety_coeff * full_tank / Decimal("2.0"), Decimal(starting_fuel) / Decimal("2"))
-
-    # Evaluate each segment.
-    for segment_index, distance in enumerate(distances):
-        # Calculate fuel consumption for this segment.
-        segment_consumption = consumption_rate * Decimal(distance) * estimate_fuel_consumption(
-            (distance / durations[segment_index] * 60)
-        )
-        if segment_index+route_checked_up_to == 0:
-            safety_margin = initial_safety_margin  # Use lower safety margin for the first segment.
-        else:
-            # Assume a full refuel before subsequent segments.
-            fuel_left = full_tank
-            safety_margin = safety_coeff * full_tank
-
-        fuel_left -= segment_consumption
+    distances = np.asarray(distances, dtype=float)
+    durations = np.asarray(durations, dtype=float)
+    full_tank = float(tank_size)
+    starting_fuel = float(starting_fuel)
+    safety_coeff = float(safety_coeff)
+    consumption_rate = float(optimal_fuel_consumption) / 100
+
+    # Calculate fuel consumption for every segment.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speeds = distances / durations * 60
+    segment_consumption = consumption_rate * distances * (curve or get_consumption_curve()).factors(speeds)
+    # A zero-length segment uses no fuel; other segments without a finite speed (zero duration) get NaN.
+    segment_consumption = np.where(distances == 0, 0.0, segment_consumption)
+
+    # Assume a full refuel before subsequent segments.
+    fuel_left = full_tank - segment_consumption
+    safety_margin = np.full(distances.shape, safety_coeff * full_tank)
+    if route_checked_up_to == 0 and distances.size:
+        # Use lower safety margin for the first segment, which starts with the initial fuel.
+        fuel_left[0] = starting_fuel - segment_consumption[0]
+        safety_margin[0] = min(safety_coeff * full_tank / 2.0, starting_fuel / 2)
+
+    # Fail validation if remaining fuel is below the safety margin, or unknown (NaN consumption).
+    failed = ~(fuel_left >= safety_margin)
+    if failed.any():
+        segment_index = int(np.argmax(failed))
         logger.debug(
-            f"Segment {segment_index+route_checked_up_to}: distance={distance}, consumption={float(segment_consumption):.2f}, "
-            f"fuel_left={float(fuel_left):.2f}, safety_margin={float(safety_margin):.2f}"
+            "Route fails validation at segment %d: fuel_left (%.2f) is below safety threshold (%.2f).",
+            segment_index + route_checked_up_to, fuel_left[segment_index], safety_margin[segment_index]
         )
-
-        # Fail validation if remaining fuel is below the safety margin.
-        if fuel_left < safety_margin:
-            logger.debug(
-                f"Route fails validation at segment {segment_index+route_checked_up_to}: fuel_left ({float(fuel_left):.2f}) "
-                f"is below safety threshold ({float(safety_margin):.2f})."
-            )
-            return False, segment_index+route_checked_up_to
+        return False, segment_index + route_checked_up_to
 
     # If all segments pass, return True and the total number of segments.
-    return True, len(distances)+route_checked_up_to
+    return True, len(distances) + route_checked_up_to
 
+
+def pad_route_segments(
+    distances: List[List[float]], durations: List[List[float]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Packs the per-segment distances and durations of several routes into padded matrices.
+
+    Args:
+        distances: Segment distances of each route.
+        durations: Segment durations of each route.
+
+    Returns:
+        Tuple of two (routes x longest route) float matrices; the cells past the end of a route are NaN.
+    """
+    width = max((len(route) for route in distances), default=0)
+    distance_matrix = np.full((len(distances), width), np.nan)
+    duration_matrix = np.full((len(durations), width), np.nan)
+    for row, (route_distances, route_durations) in enumerate(zip(distances, durations)):
+        distance_matrix[row, : len(route_distances)] = route_distances
+        duration_matrix[row, : len(route_durations)] = route_durations
+    return distance_matrix, duration_matrix
+
+
+def batch_route_validation(
+    distances: np.ndarray,
+    durations: np.ndarray,
+    optimal_fuel_consumption: float,
+    tank_size: float,
+    starting_fuel: float,
+    safety_coeff: float = 0.1,
+    curve: Optional[ConsumptionCurve] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Validates many candidate routes at once, applying the rules of route_validation to every row
+    of the padded segment matrices (see pad_route_segments).
+
+    Args:
+        distances: (routes x segments) matrix of segment distances, NaN-padded.
+        durations: (routes x segments) matrix of segment durations, NaN-padded.
+        optimal_fuel_consumption: The optimal fuel consumption (liters/100km).
+        tank_size: The vehicle's fuel tank capacity.
+        starting_fuel: The fuel available at the start of every route.
+        safety_coeff: Coefficient to compute the safety margin (e.g., 0.1).
+        curve: The vehicle's consumption curve; the default profile is used if omitted.
+
+    Returns:
+        Tuple:
+          - np.ndarray: Boolean feasibility mask, one entry per route.
+          - np.ndarray: Index of the first failing segment of each route (the number of segments if all pass).
+    """
+    distances = np.asarray(distances, dtype=float)
+    durations = np.asarray(durations, dtype=float)
+    full_tank = float(tank_size)
+    starting_fuel = float(starting_fuel)
+    safety_coeff = float(safety_coeff)
+    consumption_rate = float(optimal_fuel_consumption) / 100
+    padding = np.isnan(distances)
+
+    # Calculate fuel consumption for every segment of every route.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        speeds = distances / durations * 60
+    segment_consumption = consumption_rate * distances * (curve or get_consumption_curve()).factors(speeds)
+    # As in route_validation: zero-length segments use no fuel, NaN consumption fails.
+    segment_consumption = np.where(distances == 0, 0.0, segment_consumption)
+
+    # Assume a full refuel before every segment but the first one.
+    fuel_left = full_tank - segment_consumption
+    safety_margin = np.full(distances.shape, safety_coeff * full_tank)
+    if distances.shape[1]:
+        fuel_left[:, 0] = starting_fuel - segment_consumption[:, 0]
+        safety_margin[:, 0] = min(safety_coeff * full_tank / 2.0, starting_fuel / 2)
+
+    # Padding cells never fail; a route without failures reports its segment count.
+    failed = ~(fuel_left >= safety_margin) & ~padding
+    feasible = ~failed.any(axis=1)
+    first_failure = np.where(feasible, (~padding).sum(axis=1), np.argmax(failed, axis=1))
+    return feasible, first_failure
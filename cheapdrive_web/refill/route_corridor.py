@@ -0,0 +1,47 @@
+import hashlib
+from typing import List, Optional, Tuple
+
+from django.contrib.gis.geos import LineString
+
+from api_calls.google_api_calls import route_polyline
+from cache.cache_utils import get_from_cache, set_cache
+import logging
+
+logger = logging.getLogger("my_logger")
+
+CORRIDOR_KEY_PREFIX = "corridor_"
+# Driving routes change rarely, so fetched polylines are kept for a day.
+CORRIDOR_TIMEOUT = 24 * 3600
+
+
+def get_route_corridor(
+    origin_coords: Tuple[float, float], destination_coords: Tuple[float, float]
+) -> Optional[LineString]:
+    """
+    Returns the driving route between two points as a line, fetching the route polyline from the
+    Directions API once and keeping it in the cache app afterwards.
+
+    Args:
+        origin_coords: (latitude, longitude) of the origin.
+        destination_coords: (latitude, longitude) of the destination.
+
+    Returns:
+        LineString: The route in WGS84 (x = longitude, y = latitude), or None if the route is unavailable.
+    """
+    digest = hashlib.md5(f"{origin_coords}{destination_coords}".encode("utf-8")).hexdigest()
+    cache_key = CORRIDOR_KEY_PREFIX + digest
+    cached = get_from_cache(cache_key)
+    if cached:
+        points: List[Tuple[float, float]] = cached["points"]
+    else:
+        try:
+            points = route_polyline(origin_coords, destination_coords)
+        except Exception as e:
+            logger.warning("Route polyline unavailable, falling back to the straight line filter: %s", e)
+            return None
+        set_cache(cache_key, {"points": points}, timeout=CORRIDOR_TIMEOUT)
+
+    if len(points) < 2:
+        return None
+    return LineString([(lon, lat) for lat, lon in points], srid=4326)
+
@@ -0,0 +1,109 @@
+import secrets
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from cache.cache_utils import get_from_cache, purge_expired_cache, set_cache
+
+ROUTE_KEY_PREFIX = "routes_"
+ROUTE_CHOICES = ("time", "eff")
+
+
+def _pack_route(route: Dict[str, Any]) -> List[Any]:
+    """
+    Packs a route dictionary into a positional record: [station_ids, distances, durations, fuel_consumption].
+    """
+    return [
+        list(route["station_ids"]),
+        list(route["distances"]),
+        list(route["durations"]),
+        route["fuel_consumption"],
+    ]
+
+
+def _unpack_route(record: List[Any]) -> Dict[str, Any]:
+    """
+    Restores the route dictionary shape produced by determine_best_route from a packed record.
+    """
+    station_ids, distances, durations, fuel_consumption = record
+    return {
+        "station_ids": station_ids,
+        "distances": distances,
+        "durations": durations,
+        "fuel_consumption": fuel_consumption,
+    }
+
+
+def save_route_candidates(best_route_by_time: Dict[str, Any], best_route_by_eff: Dict[str, Any],
+                          improvement: Optional[float]) -> str:
+    """
+    Stores the candidate routes of a planning run outside of the session and returns a short token.
+    When both candidates are the same route it is stored only once.
+
+    Args:
+        best_route_by_time: The fastest route as returned by determine_best_route.
+        best_route_by_eff: The most fuel-efficient route as returned by determine_best_route.
+        improvement: The efficiency improvement of the efficient route, if any.
+
+    Returns:
+        str: The token under which the candidates are stored.
+    """
+    records = [_pack_route(best_route_by_time)]
+    eff_index = 0
+    if best_route_by_eff is not best_route_by_time:
+        records.append(_pack_route(best_route_by_eff))
+        eff_index = 1
+
+    token = secrets.token_urlsafe(9)
+    set_cache(
+        ROUTE_KEY_PREFIX + token,
+        {"r": records, "t": 0, "e": eff_index, "i": improvement},
+        timeout=settings.SESSION_COOKIE_AGE,
+    )
+    return token
+
+
+def load_route_candidates(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Loads the candidate routes stored under a token.
+
+    Args:
+        token: The token returned by save_route_candidates.
+
+    Returns:
+        dict: {'time': route, 'eff': route, 'improvement': value}, or None if the token is unknown or expired.
+    """
+    if not token:
+        return None
+    stored = get_from_cache(ROUTE_KEY_PREFIX + token)
+    if not stored:
+        return None
+    return {
+        "time": _unpack_route(stored["r"][stored["t"]]),
+        "eff": _unpack_route(stored["r"][stored["e"]]),
+        "improvement": stored["i"],
+    }
+
+
+def load_selected_route(token: Optional[str], choice: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Loads the route the user chose ('time' or 'eff') among the stored candidates.
+
+    Returns:
+        dict: The chosen route, or None if it cannot be found.
+    """
+    if choice not in ROUTE_CHOICES:
+        return None
+    candidates = load_route_candidates(token)
+    return candidates[choice] if candidates else None
+
+
+def purge_expired_route_candidates() -> int:
+    """
+    Deletes expired route candidates. Tokens of abandoned plans are never read again, so their
+    rows are not removed by the expiry check of load_route_candidates.
+
+    Returns:
+        int: The number of deleted entries.
+    """
+    return purge_expired_cache(ROUTE_KEY_PREFIX)
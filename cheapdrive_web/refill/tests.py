@@ -1,3 +1,362 @@
-from django.test import TestCase
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.gis.geos import Point
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+
+from cache.models import Cache
+from cheapdrive_website.query_budget import assert_max_queries
+from db_updates.entry_models_updates import fetch_stations
+from entry.models import Station, StationPrices
+from .models import PlanningJob, Trip, TripNode, VehicleData
+from .calculate_consumption import estimate_fuel_consumption, estimate_fuel_consumption_array, get_consumption_curve
+from .gas_station_looker import find_gas_near_route
+from .planning_jobs import LOST_JOB_MESSAGE
+from .process_results_display import process_route_display
+from .route_choice import (
+    batch_route_validation, determine_best_route, pad_route_segments, parallel_distance_calculations, route_validation,
+)
+from .route_corridor import get_route_corridor
+from .route_store import ROUTE_KEY_PREFIX, load_route_candidates, save_route_candidates
+
+
+def build_trip(n_stops: int) -> Trip:
+    """
+    Creates a trip whose TripNode chain passes through `n_stops` stations.
+    """
+    prices = StationPrices.objects.create(brand_name="bp", pb95_price=Decimal("6.50"))
+    vehicle = VehicleData.objects.create(tank_size=50, fuel_type="PB95", fuel_consumption_per_100km=Decimal("6.00"))
+    stations = [
+        Station.objects.create(address=f"Station {i}", location=Point(19.0 + i * 0.1, 51.0), station_prices=prices)
+        for i in range(n_stops)
+    ]
+    nodes = [
+        TripNode.objects.create(
+            origin=Point(18.9, 51.0), destination=stations[0].location if stations else Point(20.0, 51.0),
+            distance=Decimal("10.0"), duration=Decimal("10.0"), fuel_refilled=Decimal("20"),
+            bought_gas_price=Decimal("6.00"),
+        )
+    ]
+    for i, station in enumerate(stations):
+        nodes.append(TripNode.objects.create(
+            origin=station.location,
+            destination=stations[i + 1].location if i + 1 < n_stops else Point(20.0, 51.0),
+            distance=Decimal("10.0"), duration=Decimal("10.0"), fuel_refilled=Decimal("5"),
+            bought_gas_price=Decimal("6.50"), station_id=station.id,
+        ))
+    for node, next_node in zip(nodes, nodes[1:]):
+        node.next_trip = next_node
+        node.save()
+    return Trip.objects.create(
+        origin_address="Origin", destination_address="Destination", first_trip_node=nodes[0], vehicle=vehicle
+    )
+
+
+class ProcessRouteDisplayQueryCountTests(TestCase):
+    """
+    The results page builder must not issue queries per stop.
+    """
+
+    def assert_constant_queries(self, n_stops: int) -> None:
+        trip = Trip.objects.get(id=build_trip(n_stops).id)
+        # One query for the TripNode chain and one for the stations with their prices.
+        with self.assertNumQueries(2):
+            segments, _ = process_route_display(trip)
+        self.assertEqual(len(segments), n_stops + 1)
+
+    def test_single_stop(self):
+        self.assert_constant_queries(1)
+
+    def test_many_stops(self):
+        self.assert_constant_queries(8)
+
+    @override_settings(QUERY_BUDGET_MODE='raise')
+    def test_results_page_within_budget_for_long_trips(self):
+        trip = build_trip(8)
+        url = f"{reverse('refill:results')}?vehicle_id={trip.vehicle_id}&trip_id={trip.id}"
+        with assert_max_queries(12, "results page"):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+
+def decimal_route_validation(distances, durations, optimal_fuel_consumption, tank_size, starting_fuel,
+                             route_checked_up_to, safety_coeff=Decimal("0.1")):
+    """
+    Reference implementation: the per-segment Decimal validation the float engine replaced.
+    """
+    fuel_left = Decimal(starting_fuel)
+    full_tank = Decimal(tank_size)
+    consumption_rate = Decimal(optimal_fuel_consumption) / Decimal("100")
+    initial_safety_margin = min(safety_coeff * full_tank / Decimal("2.0"), Decimal(starting_fuel) / Decimal("2"))
+    for segment_index, distance in enumerate(distances):
+        segment_consumption = consumption_rate * Decimal(distance) * estimate_fuel_consumption(
+            distance / durations[segment_index] * 60
+        )
+        if segment_index + route_checked_up_to == 0:
+            safety_margin = initial_safety_margin
+        else:
+            fuel_left = full_tank
+            safety_margin = safety_coeff * full_tank
+        fuel_left -= segment_consumption
+        if fuel_left < safety_margin:
+            return False, segment_index + route_checked_up_to
+    return True, len(distances) + route_checked_up_to
+
+
+class FloatNumericCoreTests(SimpleTestCase):
+    """
+    The float/NumPy planning math must agree with the former Decimal arithmetic.
+    """
+
+    def test_consumption_factors_match_decimal(self):
+        speeds = np.linspace(1, 180, 500)
+        factors = estimate_fuel_consumption_array(speeds)
+        for speed, factor in zip(speeds, factors):
+            self.assertAlmostEqual(float(estimate_fuel_consumption(speed)), factor, places=9)
+
+    def test_route_validation_matches_decimal(self):
+        rng = np.random.default_rng(7)
+        for _ in range(200):
+            n_segments = int(rng.integers(1, 6))
+            distances = list(rng.uniform(5, 700, n_segments))
+            durations = [distance / speed * 60 for distance, speed in zip(distances, rng.uniform(30, 130, n_segments))]
+            args = (
+                distances, durations, Decimal("6.50"), float(rng.uniform(35, 70)),
+                float(rng.uniform(3, 35)), int(rng.integers(0, 2)),
+            )
+            self.assertEqual(route_validation(*args), decimal_route_validation(*args))
+
+    def test_batch_route_validation_matches_per_route(self):
+        rng = np.random.default_rng(11)
+        routes = []
+        for _ in range(300):
+            distances = list(rng.uniform(5, 700, int(rng.integers(1, 7))))
+            routes.append((distances, [distance / speed * 60 for distance, speed in zip(distances, rng.uniform(30, 130, len(distances)))]))
+        feasible, first_failure = batch_route_validation(
+            *pad_route_segments([route[0] for route in routes], [route[1] for route in routes]), Decimal("6.50"), 50, 20
+        )
+        for (distances, durations), valid, failed_at in zip(routes, feasible, first_failure):
+            self.assertEqual((bool(valid), int(failed_at)), route_validation(distances, durations, Decimal("6.50"), 50, 20, 0))
+
+    def test_consumption_curve_lookup_close_to_formula(self):
+        curve = get_consumption_curve()
+        speeds = np.linspace(0, 300, 3001)
+        np.testing.assert_allclose(curve.factors(speeds), curve._formula(speeds), atol=1.2e-4)
+        for speed in (0, 59.5, 60, 65, 70, 70.5, 133.3, 249.99, 260):
+            self.assertAlmostEqual(curve.factor(speed), float(curve._formula(np.array(speed))), delta=1.2e-4)
+        self.assertTrue(np.isnan(curve.factor(float("nan"))))
+        self.assertTrue(np.isnan(curve.factors(np.array([np.inf, np.nan]))).all())
+        self.assertTrue(np.isnan(curve.factor(float("inf"))))
+
+    def test_zero_duration_segments(self):
+        # A segment with distance but no duration has no speed: it fails instead of passing unchecked.
+        self.assertEqual(route_validation([100.0, 10.0], [0.0, 10.0], 6.5, 50, 20, 0), (False, 0))
+        # A zero-length segment (0 / 0 speed) uses no fuel.
+        self.assertEqual(route_validation([0.0, 10.0], [0.0, 10.0], 6.5, 50, 20, 0), (True, 2))
+        feasible, first_failure = batch_route_validation(
+            *pad_route_segments([[100.0, 10.0], [0.0, 10.0]], [[0.0, 10.0], [0.0, 10.0]]), 6.5, 50, 20
+        )
+        self.assertEqual(feasible.tolist(), [False, True])
+        self.assertEqual(first_failure.tolist(), [0, 2])
+        self.assertIs(curve, get_consumption_curve(60, 70, 1.6, 0.9))
+
+
+@override_settings(ROUTE_CORRIDOR_WIDTH_KM=10)
+class RouteCorridorTests(TestCase):
+    """
+    Stations are filtered against the driving route; a fixed polyline stands in for the Directions API.
+    """
+
+    # A route bending north between (51.0, 19.0) and (51.0, 20.0), as (latitude, longitude) pairs.
+    POLYLINE = [(51.0, 19.0), (52.0, 19.5), (51.0, 20.0)]
+
+    def test_corridor_follows_route_geometry(self):
+        near_bend = Station.objects.create(address="Near bend", location=Point(19.5, 51.95))
+        on_straight_line = Station.objects.create(address="On straight line", location=Point(19.5, 51.0))
+
+        with mock.patch("refill.route_corridor.route_polyline", return_value=self.POLYLINE) as polyline:
+            corridor = get_route_corridor((51.0, 19.0), (51.0, 20.0))
+            get_route_corridor((51.0, 19.0), (51.0, 20.0))
+        self.assertEqual(polyline.call_count, 1)
+
+        kept = find_gas_near_route((19.0, 51.0), (20.0, 51.0), 200, 200, set(), 10, corridor)
+        self.assertEqual([station[0] for station, _ in kept], [near_bend.id])
+
+    def test_straight_line_filter_without_corridor(self):
+        near_bend = Station.objects.create(address="Near bend", location=Point(19.5, 51.95))
+        on_straight_line = Station.objects.create(address="On straight line", location=Point(19.5, 51.0))
+
+        kept = find_gas_near_route((19.0, 51.0), (20.0, 51.0), 200, 200, set(), 10)
+        self.assertEqual([station[0] for station, _ in kept], [on_straight_line.id])
+        self.assertEqual(find_gas_near_route((19.0, 51.0), (20.0, 51.0), 200, 200, {on_straight_line.id}, 10), [])
+
+
+class PlannerThreadConnectionTests(TestCase):
+    """
+    Segment distance threads must not keep database connections open after their work.
+    """
+
+    def test_segment_threads_release_connections(self):
+        thread_connections = []
+
+        def fetch_segment(*args):
+            connection = connections["default"]
+            connection.ensure_connection()
+            thread_connections.append(connection)
+            return 10.0, 10.0
+
+        pairs = [("Origin", None, None, None), (None, "Destination", None, None)]
+        with mock.patch("refill.route_choice.get_ptp_distance", side_effect=fetch_segment):
+            results = parallel_distance_calculations(pairs, [1])
+
+        self.assertEqual(results, [(10.0, 10.0), (10.0, 10.0)])
+        self.assertTrue(all(connection.connection is None for connection in thread_connections))
+
+    @override_settings(DISTANCE_WORKERS=1)
+    def test_segment_thread_reuses_its_connection(self):
+        raw_connections = []
+
+        def fetch_segment(*args):
+            connection = connections["default"]
+            connection.ensure_connection()
+            raw_connections.append(connection.connection)
+            return 10.0, 10.0
+
+        pairs = [("Origin", None, None, None), (None, None, None, None), (None, "Destination", None, None)]
+        with mock.patch("refill.route_choice.get_ptp_distance", side_effect=fetch_segment):
+            parallel_distance_calculations(pairs, [1, 2])
+
+        self.assertEqual(len(raw_connections), 3)
+        self.assertEqual(len({id(raw) for raw in raw_connections}), 1)
+
+
+class StagedRouteValidationTests(TestCase):
+    """
+    Segments past a failing one are never fetched, and shared segments are fetched once.
+    """
+
+    def test_candidates_sharing_a_failing_first_segment_stop_there(self):
+        prices = StationPrices.objects.create(brand_name="bp", pb95_price=Decimal("6.50"))
+        first, second, third = (
+            Station.objects.create(address=f"Station {i}", location=Point(19.0 + i, 51.0), station_prices=prices)
+            for i in range(3)
+        )
+        failed_last_node = {}
+
+        # 400 km on 5 liters cannot be driven.
+        with mock.patch("refill.route_choice.get_ptp_distance", return_value=(400.0, 240.0)) as fetch:
+            time_route, eff_route, _, failed_first = determine_best_route(
+                (51.0, 18.0), (51.0, 23.0), "Origin", "Destination",
+                [[first.id, second.id], [first.id, third.id]], 6.0, 50, 5,
+                failed_last_node=failed_last_node,
+            )
+
+        self.assertEqual(fetch.call_count, 1)
+        self.assertIsNone(time_route)
+        self.assertIsNone(eff_route)
+        self.assertEqual(failed_first, {first.id})
+        self.assertTrue(failed_last_node[str(first.id)])
+
+
+class RefreshPricesCommandTests(TestCase):
+    """
+    The price refresh reports its diff in dry-run mode and only writes changed brands.
+    """
+
+    SCRAPED = [
+        {"brand_name": "bp", "pb95_price": Decimal("6.50"), "pb98_price": None, "diesel_price": None, "lpg_price": None},
+        {"brand_name": "moya", "pb95_price": Decimal("6.20"), "pb98_price": None, "diesel_price": None, "lpg_price": None},
+    ]
+
+    def run_command(self, *args) -> str:
+        out = StringIO()
+        with mock.patch("refill.management.commands.refresh_prices.fetch_brand_prices", return_value=self.SCRAPED):
+            call_command("refresh_prices", "--pause", "0", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_then_refresh(self):
+        StationPrices.objects.create(brand_name="bp", pb95_price=Decimal("6.00"))
+
+        output = self.run_command("--dry-run")
+        self.assertIn("2 changes", output)
+        self.assertIn("pb95_price 6.00 -> 6.50", output)
+        self.assertFalse(StationPrices.objects.filter(brand_name="moya").exists())
+
+        self.assertIn("2 changes written", self.run_command())
+        self.assertEqual(StationPrices.objects.get(brand_name="bp").pb95_price, Decimal("6.50"))
+        self.assertEqual(StationPrices.objects.get(brand_name="moya").pb95_price, Decimal("6.20"))
+        self.assertIn("0 changes written", self.run_command())
+
+
+class RefreshStationsBrandTests(SimpleTestCase):
+    """
+    Station brands are matched against StationPrices under the price brand names.
+    """
+
+    def test_station_brands_are_normalized(self):
+        stations = [
+            {"lat": 51.0, "lon": 19.0, "brand_name": "lotos-optima"},
+            {"lat": 51.0, "lon": 19.1, "brand_name": "orlen"},
+        ]
+        with mock.patch("db_updates.entry_models_updates.retrieve_stations_overpass", return_value=stations):
+            fetched = fetch_stations()
+        self.assertEqual([station["brand_name"] for station in fetched], ["lotos optima", "orlen"])
+
+
+class RouteCandidatePurgeTests(TestCase):
+    """
+    Route candidates of abandoned plans are purged once expired; live ones are kept.
+    """
+
+    ROUTE = {"station_ids": [1], "distances": [10.0, 5.0], "durations": [8.0, 4.0], "fuel_consumption": 1.2}
+
+    def test_purge_deletes_only_expired_candidates(self):
+        abandoned = save_route_candidates(self.ROUTE, self.ROUTE, None)
+        live = save_route_candidates(self.ROUTE, self.ROUTE, None)
+        Cache.objects.filter(key=ROUTE_KEY_PREFIX + abandoned).update(
+            updated_at=timezone.now() - timezone.timedelta(hours=1), timeout=60
+        )
+        Cache.objects.create(key="unrelated", value={}, timeout=0)
+
+        out = StringIO()
+        call_command("purge_expired_cache", stdout=out)
+
+        self.assertIn("Deleted 1 ", out.getvalue())
+        self.assertFalse(Cache.objects.filter(key=ROUTE_KEY_PREFIX + abandoned).exists())
+        self.assertIsNotNone(load_route_candidates(live))
+        self.assertTrue(Cache.objects.filter(key="unrelated").exists())
+
+
+class StalePlanningJobTests(TestCase):
+    """
+    A planning job that stopped progressing is resubmitted instead of being polled forever.
+    """
+
+    @override_settings(PLANNING_JOB_TIMEOUT=60)
+    def test_choose_option_resubmits_stale_job(self):
+        trip = build_trip(1)
+        stale = PlanningJob.objects.create(trip=trip, vehicle=trip.vehicle, status=PlanningJob.Status.RUNNING)
+        PlanningJob.objects.filter(id=stale.id).update(updated_at=timezone.now() - timezone.timedelta(minutes=5))
+        session = self.client.session
+        session['planning_job_id'] = stale.id
+        session.save()
+
+        with mock.patch("refill.planning_jobs._executor") as executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(
+                f"{reverse('refill:choose_option')}?vehicle_id={trip.vehicle_id}&trip_id={trip.id}"
+            )
+
+        self.assertTemplateUsed(response, "refill/planning.html")
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, PlanningJob.Status.FAILED)
+        self.assertEqual(stale.error, LOST_JOB_MESSAGE)
+        resubmitted = PlanningJob.objects.get(trip=trip, status=PlanningJob.Status.PENDING)
+        self.assertEqual(self.client.session['planning_job_id'], resubmitted.id)
+        executor.submit.assert_called_once()
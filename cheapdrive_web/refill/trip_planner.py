@@ -0,0 +1,205 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import logging
+
+from django.conf import settings
+from django.contrib.gis.geos import LineString
+
+from cheapdrive_website.db_connections import releasing_connections
+from cheapdrive_website.metrics import PLANNING_ATTEMPTS
+
+from .gas_station_looker import calculate_distance, find_best_gas_stations
+from .models import Trip, VehicleData
+from .planning_spans import propagate, span
+from .prefix_memo import load_prefix_memo, prefix_memo_scope, save_prefix_memo
+from .route_choice import determine_best_route
+from .route_corridor import get_route_corridor
+
+logger = logging.getLogger("my_logger")
+
+MAX_PLANNING_ATTEMPTS = 3
+
+
+def plan_routes(
+    trip: Trip,
+    vehicle: VehicleData,
+    on_attempt: Optional[Callable[[int], None]] = None,
+    parallel: Optional[bool] = None,
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], Optional[float]]]:
+    """
+    Searches for the best refuelling routes of a trip, retrying with a gradually reduced
+    estimated drive range when no valid route is found.
+
+    Args:
+        trip: The trip to plan; its first TripNode holds the origin and destination.
+        vehicle: The vehicle used on the trip.
+        on_attempt: Optional callback invoked with the 1-based number of each attempt, used for progress reporting.
+        parallel: If True, all attempts run concurrently and share the segment cache and the prefix validation
+            memo; defaults to the PARALLEL_PLANNING_ATTEMPTS setting.
+
+    Returns:
+        Tuple (best_route_by_time, best_route_by_efficiency, improvement) on success,
+        or None if no reasonable route could be found after all attempts.
+    """
+    # Extract origin and destination coordinates from the first trip node.
+    origin_coords: Tuple[float, float] = (trip.first_trip_node.origin.y, trip.first_trip_node.origin.x)
+    destination_coords: Tuple[float, float] = (trip.first_trip_node.destination.y, trip.first_trip_node.destination.x)
+
+    # Calculate geographic and road distances.
+    geo_distance: float = calculate_distance(
+        origin_coords[1], origin_coords[0],
+        destination_coords[1], destination_coords[0]
+    )
+    road_distance: float = float(trip.total_distance())
+    # Compute the ratio of the geographic distance to the road distance.
+    est_road_to_geo: float = geo_distance / road_distance if road_distance else 1
+    logger.debug("Estimated road-to-geographic distance ratio: %s", est_road_to_geo)
+
+    # Compute fuel metrics.
+    fuel_at_start: float = float(trip.first_trip_node.fuel_refilled)
+    estimated_fuel_consumption: float = (
+        vehicle.consumption_curve.factor(trip.get_average_speed()) * float(vehicle.fuel_consumption_per_100km)
+    )
+
+    # The driving route line, fetched once and shared by all attempts, replaces the straight line filter.
+    corridor: Optional[LineString] = None
+    if settings.ROUTE_CORRIDOR_FILTER:
+        with span("route_corridor"):
+            corridor = get_route_corridor(origin_coords, destination_coords)
+
+    stations_not_to_start_with: Set[int] = set()
+    # Prefix validation memo and segment distances, shared by all attempts.
+    failed_last_node: Dict[str, bool] = {}
+    segment_cache: Dict[str, Tuple[float, float]] = {}
+    memo_scope: str = prefix_memo_scope(
+        trip.origin_address, vehicle.tank_size, vehicle.fuel_consumption_per_100km, fuel_at_start
+    )
+
+    def run_attempt(
+        attempt: int, cancelled: Optional[threading.Event] = None,
+    ) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], Optional[float]]]:
+        if on_attempt:
+            on_attempt(attempt + 1)
+        # The adjustment factor decreases the estimated drive range gradually.
+        adjustment_factor: float = (7 / 8) ** (attempt)
+        est_drive_range: float = (
+            max(fuel_at_start - 0.1 * vehicle.tank_size, 0.05 * vehicle.tank_size) /
+            estimated_fuel_consumption *
+            est_road_to_geo * 100 * adjustment_factor
+        )
+        logger.debug(
+            "Attempt %d: Looking for a station in range: %.2f with adjustment factor: %.4f",
+            attempt + 1, est_drive_range, adjustment_factor
+        )
+
+        full_tank_range: float = (
+            0.9 * vehicle.tank_size / estimated_fuel_consumption *
+            est_road_to_geo * 100 * adjustment_factor
+        )
+
+        # Search for the best gas station routes based on the computed ranges.
+        with span("station_search"):
+            best_station_routes: Optional[List[List[int]]] = find_best_gas_stations(
+                trip.first_trip_node.origin,
+                trip.first_trip_node.destination,
+                est_drive_range,
+                full_tank_range,
+                set(stations_not_to_start_with),
+                corridor=corridor,
+            )
+        if not best_station_routes or (cancelled is not None and cancelled.is_set()):
+            return None
+
+        # Prefix outcomes known from earlier plans let determine_best_route skip failing candidates up front.
+        with span("prefix_memo"):
+            for key, failed in load_prefix_memo(memo_scope, best_station_routes).items():
+                failed_last_node.setdefault(key, failed)
+        known_outcomes: Dict[str, bool] = dict(failed_last_node)
+
+        # Determine the best routes based on travel time and fuel efficiency.
+        best_route_by_time, best_route_by_efficiency, improvement, new_invalid_start_stations = determine_best_route(
+            origin_coords,
+            destination_coords,
+            trip.origin_address,
+            trip.destination_address,
+            best_station_routes,
+            vehicle.fuel_consumption_per_100km,
+            vehicle.tank_size,
+            fuel_at_start,
+            failed_last_node=failed_last_node,
+            segment_cache=segment_cache,
+            curve=vehicle.consumption_curve,
+            cancelled=cancelled,
+        )
+        stations_not_to_start_with.update(new_invalid_start_stations)
+        # Only the outcomes computed by this attempt are persisted; re-saving loaded ones would extend their lifetime.
+        with span("prefix_memo"):
+            save_prefix_memo(memo_scope, {
+                key: failed for key, failed in list(failed_last_node.items()) if known_outcomes.get(key) != failed
+            })
+        logger.debug("bad start stations: %s", stations_not_to_start_with)
+        # If valid routes are found, log success.
+        if best_route_by_time and best_route_by_efficiency:
+            logger.info("Stations found on attempt %d", attempt + 1)
+            return best_route_by_time, best_route_by_efficiency, improvement
+        return None
+
+    if parallel is None:
+        parallel = getattr(settings, "PARALLEL_PLANNING_ATTEMPTS", False)
+
+    if parallel:
+        attempts_used, routes = _run_attempts_in_parallel(run_attempt)
+    else:
+        # Attempt up to three times to find a valid gas station route by adjusting the estimated drive range.
+        routes = None
+        for attempt in range(MAX_PLANNING_ATTEMPTS):
+            attempts_used = attempt + 1
+            routes = run_attempt(attempt)
+            if routes:
+                break
+
+    if routes is None:
+        logger.info("Invalid data given: The app could not find a reasonable route for this trip")
+        PLANNING_ATTEMPTS.observe(MAX_PLANNING_ATTEMPTS, outcome="not_found")
+    else:
+        PLANNING_ATTEMPTS.observe(attempts_used, outcome="found")
+    return routes
+
+
+def _run_attempts_in_parallel(
+    run_attempt: Callable[
+        [int, threading.Event], Optional[Tuple[Dict[str, Any], Dict[str, Any], Optional[float]]]
+    ],
+) -> Tuple[Optional[int], Optional[Tuple[Dict[str, Any], Dict[str, Any], Optional[float]]]]:
+    """
+    Evaluates all range adjustment factors at once; the first attempt that finishes with a valid
+    result wins. The other attempts are then cancelled: they stop before fetching more segment
+    distances, so they do not keep calling the (billed) Distance Matrix API.
+
+    Args:
+        run_attempt: Callable running a single attempt given its 0-based index and a cancellation
+            event, which it checks between segment fetches.
+
+    Returns:
+        Tuple (1-based number of the winning attempt, its result); (None, None) if every attempt failed.
+    """
+    cancelled = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=MAX_PLANNING_ATTEMPTS, thread_name_prefix="planning-attempt")
+    futures = {
+        executor.submit(propagate(releasing_connections(run_attempt)), attempt, cancelled): attempt
+        for attempt in range(MAX_PLANNING_ATTEMPTS)
+    }
+    try:
+        for future in as_completed(futures):
+            try:
+                routes = future.result()
+            except Exception:
+                logger.exception("Planning attempt failed:")
+                continue
+            if routes:
+                return futures[future] + 1, routes
+        return None, None
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -2,7 +2,8 @@ from decimal import Decimal
 import logging
 import time
 from typing import Tuple, Optional, Any, Dict, List, Set
-from django.http import HttpRequest, HttpResponse
+from asgiref.sync import async_to_sync, sync_to_async
+from django.http import Http404, HttpRequest, HttpResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.core.exceptions import ValidationError
 from django.contrib import messages
@@ -10,16 +11,20 @@ from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
 from api_calls.api_exceptions import AddressError
-from .calculate_consumption import calculate_form_fuel_consumption, calculate_real_fuel_consumption, need_refill, estimate_fuel_consumption
-from .route_choice import determine_best_route
+from .calculate_consumption import calculate_form_fuel_consumption, calculate_real_fuel_consumption, need_refill, estimate_fuel_consumption_factor
 from db_updates.refill_model_updates import finish_updating, update_trip
-from .models import VehicleData, Trip
-from .create_models import create_trip, create_vehicle
+from .models import VehicleData, Trip, PlanningJob
+from .create_models import create_trip_async, create_vehicle, get_guest_id
 from .forms import LoadDataForm
-from .gas_station_looker import calculate_distance, find_best_gas_stations
 from formatters.string_format import format_duration, scrape_query_paramaters
 from entry.models import Station
+from entry.history import invalidate_trip_history
 from .process_results_display import process_route_display
+from .route_store import load_route_candidates, load_selected_route
+from .planning_jobs import resubmit_if_lost, submit_planning_job
+from .planning_spans import server_timing_header
+from cheapdrive_website.query_budget import query_budget
+from .trip_planner import MAX_PLANNING_ATTEMPTS
 
 # Initialize logger for debugging purposes
 logger = logging.getLogger("my_logger")
@@ -44,6 +49,7 @@ def validate_fuel_data(tank_size: float, cur_fuel: float, fuel_input_type: str,
     if fuel_input_type == 'percentage' and not (0 <= cur_fuel_percentage <= 100):
         raise ValidationError("Fuel percentage must be between 0 and 100.")
 
+@query_budget(10)
 @csrf_exempt
 def load_data(request: HttpRequest) -> HttpResponse:
     """
@@ -84,13 +90,14 @@ def _handle_post_request(request: HttpRequest, trip: Optional[Trip], vehicle: Op
 
         # Create vehicle and trip, handling any errors
         user = request.user if request.user.is_authenticated else None
-        guest_id = request.session.session_key if not user else None
+        guest_id = get_guest_id(request.session) if not user else None
         vehicle_id = create_vehicle(form_data['tank_size'], form_data['fuel_type'], form_data['driving_conditions'], form_data['fuel_consumption_per_100km'])
         vehicle = VehicleData.objects.get(id=vehicle_id) if vehicle_id else None
         if not vehicle:
             return _handle_error(request, "Vehicle creation failed", form, vehicle, trip)
 
-        trip_id = create_trip(
+        # Address validation and geocoding are issued concurrently.
+        trip_id = async_to_sync(create_trip_async)(
             form_data['origin_address'],
             form_data['destination_address'],
             form_data['currency'],
@@ -182,154 +189,95 @@ def _handle_error(request: HttpRequest, message: str, form: Optional[LoadDataFor
     messages.error(request, message)
     return _render_form(request, trip, vehicle, form)
 
+@query_budget(12)
 @csrf_exempt
-def refill_management(request: HttpRequest) -> HttpResponse:
+async def refill_management(request: HttpRequest) -> HttpResponse:
     """
-    Handles the refill management view by extracting parameters, computing route metrics, 
-    and determining the optimal gas station route.
+    Handles the refill management view by extracting parameters and submitting the search for
+    the optimal gas station route as a background planning job. This is a native async view: under
+    ASGI it does not hold a thread while waiting on the database, while under WSGI Django runs it
+    with async_to_sync and the worker thread stays busy until it returns.
 
     Args:
         request (HttpRequest): The HTTP request containing query parameters for vehicle_id and trip_id.
 
     Returns:
         HttpResponse: A redirection to either the load data view (in case of an error or invalid data) 
-        or the choose option view after successful route determination.
+        or the choose option view, which polls the planning job.
     """
     try:
         vehicle_id, trip_id = scrape_query_paramaters(request.GET)
     except (KeyError, TypeError) as e:
         messages.error(request, f"Invalid query parameters: {e}")
         logger.exception("Error extracting query parameters")
-        request.session['allowed_to_access_refill_views'] = False
-        return redirect(f"{reverse('refill:load_data')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
+        await request.session.aset('allowed_to_access_refill_views', False)
+        return redirect(f"{reverse('refill:load_data')}?vehicle_id=none&trip_id=none")
 
     # Retrieve the trip and vehicle objects; if either is missing, redirect with an error.
-    trip = get_object_or_404(Trip, id=trip_id) if trip_id else None
-    vehicle = get_object_or_404(VehicleData, id=vehicle_id) if vehicle_id else None
+    trip = await Trip.objects.filter(id=trip_id).afirst() if trip_id else None
+    vehicle = await VehicleData.objects.filter(id=vehicle_id).afirst() if vehicle_id else None
+    if (trip_id and not trip) or (vehicle_id and not vehicle):
+        raise Http404("Trip or vehicle not found.")
     if not trip or not vehicle:
         messages.error(request, "Trip or vehicle not found.")
-        request.session['allowed_to_access_refill_views'] = False
+        await request.session.aset('allowed_to_access_refill_views', False)
         return redirect(f"{reverse('refill:load_data')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
 
-    # Extract origin and destination coordinates from the first trip node.
-    origin_coords: Tuple[float, float] = (trip.first_trip_node.origin.y, trip.first_trip_node.origin.x)
-    destination_coords: Tuple[float, float] = (trip.first_trip_node.destination.y, trip.first_trip_node.destination.x)
-
-    # Calculate geographic and road distances.
-    geo_distance: float = calculate_distance(
-        origin_coords[1], origin_coords[0],
-        destination_coords[1], destination_coords[0]
-    )
-    road_distance: float = float(trip.total_distance())
-    # Compute the ratio of the geographic distance to the road distance.
-    est_road_to_geo: float = geo_distance / road_distance if road_distance else 1
-    logger.debug("Estimated road-to-geographic distance ratio: %s", est_road_to_geo)
-
-    # Compute fuel metrics.
-    fuel_at_start: float = float(trip.first_trip_node.fuel_refilled)
-    estimated_fuel_consumption: float = float(
-        estimate_fuel_consumption(trip.get_average_speed()) * vehicle.fuel_consumption_per_100km
-    )
-
-    best_station_routes: Optional[List[List[Any]]] = None
-    best_route_by_time: Optional[Dict[str, Any]] = None
-    best_route_by_efficiency: Optional[Dict[str, Any]] = None
-    improvement: Optional[Any] = None
-    stations_not_to_start_with: Set(int)=set()
-    # Attempt up to three times to find a valid gas station route by adjusting the estimated drive range.
-    for attempt in range(3):
-        # The adjustment factor decreases the estimated drive range gradually.
-        adjustment_factor: float = (7 / 8) ** (attempt )
-        est_drive_range: float = (
-            max(fuel_at_start - 0.1 * vehicle.tank_size, 0.05 * vehicle.tank_size) /
-            estimated_fuel_consumption *
-            est_road_to_geo * 100 * adjustment_factor
-        )
-        logger.debug(
-            "Attempt %d: Looking for a station in range: %.2f with adjustment factor: %.4f",
-            attempt + 1, est_drive_range, adjustment_factor
-        )
-
-        full_tank_range: float = (
-            0.9 * vehicle.tank_size / estimated_fuel_consumption *
-            est_road_to_geo * 100 * adjustment_factor
-        )
-
-        # Search for the best gas station routes based on the computed ranges.
-        best_station_routes = find_best_gas_stations(
-            trip.first_trip_node.origin,
-            trip.first_trip_node.destination,
-            est_drive_range,
-            full_tank_range,
-            stations_not_to_start_with
-         )
-
-        # If no station routes are found and this is the final attempt, return an error.
-        if not best_station_routes:
-            if attempt == 2:
-                messages.error(
-                    request,
-                    "Invalid data given: The app could not find a reasonable route for this trip"
-                )
-                logger.debug("Unsuccessful after maximum attempts to find station routes.")
-                return redirect(f"{reverse('refill:load_data')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
-            continue
-
-        # Determine the best routes based on travel time and fuel efficiency.
-        best_route_by_time, best_route_by_efficiency, improvement, new_invalid_start_stations = determine_best_route(
-            origin_coords,
-            destination_coords,
-            trip.origin_address,
-            trip.destination_address,
-            best_station_routes,
-            vehicle.fuel_consumption_per_100km,
-            vehicle.tank_size,
-            fuel_at_start
-        )
-        stations_not_to_start_with.update(new_invalid_start_stations)
-        logger.debug("bad start stations:")
-        logger.debug(stations_not_to_start_with)
-        # If valid routes are found, log success and break out of the loop.
-        if best_route_by_time and best_route_by_efficiency:
-            logger.info("Stations found on attempt %d", attempt + 1)
-            break
-        elif attempt == 2:
-            logger.info("Invalid data given: The app could not find a reasonable route for this trip")
-            messages.error(
-                request,
-                "Invalid data given: The app could not find a reasonable route for this trip"
-            )
-            return redirect(f"{reverse('refill:load_data')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
-
-
-      # Save the best route details in the session.
-    request.session['best_route_by_time'] = best_route_by_time
-    request.session['best_route_by_eff'] = best_route_by_efficiency
-    request.session['improvement'] = improvement
+    # Queue the route search (or reuse the job already planning this trip) and let choose_option poll it.
+    job = await sync_to_async(submit_planning_job)(trip, vehicle)
+    await request.session.aset('planning_job_id', job.id)
 
     # Redirect the user to the choose option view with the required parameters.
     choose_option_url: str = reverse('refill:choose_option')
     return redirect(f"{choose_option_url}?vehicle_id={vehicle_id}&trip_id={trip_id}")
 
 
+@query_budget(8)
 def choose_option(request: HttpRequest) -> HttpResponse:
     """
     Renders a page that allows the user to choose between the best time route and best efficiency route.
-    On POST, the chosen route is saved in the session and the user is redirected to the refill amount view.
+    While the planning job submitted by refill_management is still running, a progress page that
+    refreshes itself is rendered instead; a job that stopped progressing is resubmitted. The response that first shows a finished plan carries its
+    timing breakdown in a Server-Timing header.
+    On POST, the chosen option is saved in the session and the user is redirected to the refill amount view.
     
     Returns:
         HttpResponse: The rendered choose option page or a redirect if an error occurs.
     """
     vehicle_id: Optional[str] = request.GET.get('vehicle_id')
     trip_id: Optional[str] = request.GET.get('trip_id')
-    best_route_by_time: Optional[Dict[str, Any]] = request.session.get('best_route_by_time')
-    best_route_by_eff: Optional[Dict[str, Any]] = request.session.get('best_route_by_eff')
-    improvement: Optional[Any] = request.session.get("improvement")
 
-    if not (best_route_by_time and best_route_by_eff):
+    timings: Dict[str, Any] = {}
+    job_id: Optional[int] = request.session.get('planning_job_id')
+    if job_id:
+        job: Optional[PlanningJob] = PlanningJob.objects.filter(id=job_id).select_related("trip", "vehicle").first()
+        if job is not None:
+            # A job whose worker died would otherwise keep this page polling forever.
+            job = resubmit_if_lost(job)
+            request.session['planning_job_id'] = job.id
+        if job is None or job.status == PlanningJob.Status.FAILED:
+            request.session.pop('planning_job_id', None)
+            messages.error(request, job.error if job else "Route planning was lost. Please try again.")
+            return redirect(f"{reverse('refill:load_data')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
+        if not job.is_finished():
+            return render(request, 'refill/planning.html', {
+                "attempt": job.attempt,
+                "max_attempts": MAX_PLANNING_ATTEMPTS,
+            })
+        request.session.pop('planning_job_id', None)
+        request.session['route_token'] = job.route_token
+        timings = job.timings
+
+    candidates: Optional[Dict[str, Any]] = load_route_candidates(request.session.get('route_token'))
+
+    if not candidates:
         messages.error(request, "Route data is missing. Please try again.")
         return redirect(f"{reverse('refill:load_data')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
 
+    best_route_by_time: Dict[str, Any] = candidates['time']
+    best_route_by_eff: Dict[str, Any] = candidates['eff']
+    improvement: Optional[Any] = candidates['improvement']
+
     try:
         routes: Dict[str, Any] = {
             'time': {
@@ -356,14 +304,19 @@ def choose_option(request: HttpRequest) -> HttpResponse:
         if choice not in routes:
             messages.error(request, "Invalid choice. Please select a valid option.")
             return redirect(request.path)
-        request.session['selected_route'] = routes[choice]['data']
+        request.session['route_choice'] = choice
         request.session['trip_status'] = 'not_updated'
         return redirect(f"{reverse('refill:refill_amount')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
 
-    return render(request, 'refill/choose_option.html', {
+    response = render(request, 'refill/choose_option.html', {
         "routes": routes,
         "improvement": improvement,
     })
+    if timings:
+        # The page that first shows a plan also reports where the planning time went.
+        response["Server-Timing"] = server_timing_header(timings)
+    return response
+@query_budget(20)
 def process_fuel_amount(request: HttpRequest) -> HttpResponse:
     """
     Processes the user's input for the amount of fuel to be refilled during a trip.
@@ -391,7 +344,9 @@ def process_fuel_amount(request: HttpRequest) -> HttpResponse:
 
     # Process GET request to calculate fuel refill range
     if request.method == 'GET' and request.session.get('trip_status') != 'updated':
-        selected_route: Optional[Dict[str, Any]] = request.session.get('selected_route')
+        selected_route: Optional[Dict[str, Any]] = load_selected_route(
+            request.session.get('route_token'), request.session.get('route_choice')
+        )
         if not selected_route:
             messages.error(request, "No selected route found. Redirecting to load data.")
             return redirect(reverse('refill:load_data'))
@@ -415,7 +370,7 @@ def process_fuel_amount(request: HttpRequest) -> HttpResponse:
             fuel_left: float = float(trip.fuel_left())
 
             logger.debug(f"Fuel left: {fuel_left}")
-            estimated_consumption: float = float(estimate_fuel_consumption((last_distance / last_duration) * 60) * vehicle.fuel_consumption_per_100km)
+            estimated_consumption: float = estimate_fuel_consumption_factor((last_distance / last_duration) * 60) * float(vehicle.fuel_consumption_per_100km)
             
             # Ensure the fuel range is reasonable
             min_fuel: float = round(max(last_distance * estimated_consumption / 100 - fuel_left, 0.00), 2)
@@ -461,6 +416,8 @@ def process_fuel_amount(request: HttpRequest) -> HttpResponse:
 
                 # Finalize the trip update and redirect to the results view
                 finish_updating(fuel_quantity, request.session['last_node_id'], request.session['last_distance'], request.session['last_duration'])
+                if request.user.is_authenticated:
+                    invalidate_trip_history(request.user.id)
                 return redirect(f"{reverse('refill:results')}?vehicle_id={vehicle_id}&trip_id={trip_id}")
 
             messages.error(request, "Invalid fuel quantity. Please enter a value within range.")
@@ -480,6 +437,7 @@ def process_fuel_amount(request: HttpRequest) -> HttpResponse:
         'max_value': request.session.get('max_fuel', 0),
     })
 
+@query_budget(12)
 def results(request: HttpRequest) -> HttpResponse:
     """
     Displays the final results page showing trip details and statistics.
@@ -519,16 +477,17 @@ def results(request: HttpRequest) -> HttpResponse:
         return redirect(reverse('refill:load_data'))
 
     # Retrieve the Trip and VehicleData objects
-    trip: Trip = get_object_or_404(Trip, id=trip_id) if trip_id else None
+    trip: Trip = get_object_or_404(Trip.objects.select_related("vehicle"), id=trip_id) if trip_id else None
     vehicle: VehicleData = get_object_or_404(VehicleData, id=vehicle_id) if vehicle_id else None
 
+    # Process trip segments and generate Google Maps URL; this also loads the TripNode chain
+    # once, so the totals below are computed in memory.
+    trip_segments, gmaps_url = process_route_display(trip)
+
     # Compute cost details for fuel bought and used during the trip
     cost_bought, cost_used = trip.total_price_bought_and_used()
     logger.debug(f"Total costs: Bought: {cost_bought}, Used: {cost_used}")
 
-    # Process trip segments and generate Google Maps URL
-    trip_segments, gmaps_url = process_route_display(trip)
-
     # Build the context dictionary for rendering
     context: Dict[str, Any] = {
         "trip_id": trip_id,
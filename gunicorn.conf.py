@@ -0,0 +1,51 @@
+"""
+Gunicorn configuration (see the entrypoint in app.yaml).
+
+With preload_app the master imports and warms up the Django application once, then forks the
+workers, so no worker pays the import and warm-up cost on its first request. Startup timings are
+logged by the master (preloaded) or by each worker.
+"""
+import json
+import os
+import time
+
+_started = time.perf_counter()
+
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "60"))
+
+
+def _log_startup(log, scope, timings):
+    log.info(json.dumps({
+        "event": "startup_timing",
+        "scope": scope,
+        "total_ms": round((time.perf_counter() - _started) * 1000, 1),
+        "warm_up_ms": timings,
+    }))
+
+
+def when_ready(server):
+    # Runs in the master after the (preloaded) application was imported and before workers fork.
+    if server.cfg.preload_app:
+        from cheapdrive_website.warmup import warm_up
+
+        _log_startup(server.log, "master", warm_up())
+
+
+def post_fork(server, worker):
+    global _started
+    _started = time.perf_counter()
+    if server.cfg.preload_app:
+        from cheapdrive_website.logging_setup import restart_logging_listeners
+
+        restart_logging_listeners()
+
+
+def post_worker_init(worker):
+    # Without preloading, each worker imports the application itself; warm it up before it serves.
+    if not worker.cfg.preload_app:
+        from cheapdrive_website.warmup import warm_up
+
+        _log_startup(worker.log, f"worker {worker.pid}", warm_up())